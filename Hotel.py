@@ -1,245 +1,49 @@
 import streamlit as st
-import base64
-import requests
-from decouple import config
 from datetime import datetime
-import uuid
 import mysql.connector
-
-# ==== Database Functions ====
-
-def get_db_connection():
-    """Establishes and returns a connection to the MySQL database."""
-    try:
-        conn = mysql.connector.connect(
-    host=config("DB_HOST"),
-    user=config("DB_USER"),
-    password=config("DB_PASSWORD"),
-    database=config("DB_NAME"),
-    port=config("DB_PORT", cast=int)
-)
-        return conn
-    except mysql.connector.Error as err:
-        st.error(f"Database connection error: {err}")
-        return None
-
-def create_user(email, password):
-    """Creates a new user in the database."""
-    conn = get_db_connection()
-    if conn:
-        cursor = conn.cursor()
-        try:
-            # Check if user already exists
-            cursor.execute("SELECT * FROM users WHERE email = %s", (email,))
-            if cursor.fetchone():
-                return False, "User with this email already exists."
-
-            cursor.execute("INSERT INTO users (email, password) VALUES (%s, %s)", (email, password))
-            conn.commit()
-            return True, "User registered successfully!"
-        except mysql.connector.Error as err:
-            st.error(f"Error creating user: {err}")
-            return False, f"Error registering user: {err}"
-        finally:
-            cursor.close()
-            conn.close()
-    return False, "Database connection failed."
-
-def verify_user(email, password):
-    """Verifies user credentials against the database."""
-    conn = get_db_connection()
-    if conn:
-        cursor = conn.cursor()
-        try:
-            cursor.execute("SELECT * FROM users WHERE email = %s AND password = %s", (email, password))
-            user = cursor.fetchone()
-            return user is not None
-        except mysql.connector.Error as err:
-            st.error(f"Error verifying user: {err}")
-            return False
-        finally:
-            cursor.close()
-            conn.close()
-    return False
-
-def save_order(user_email, cart_items, total_amount, personalization_data=None, checkout_request_id=None):
-    """Saves an order and its items to the database."""
-    conn = get_db_connection()
-    if conn:
-        cursor = conn.cursor()
-        try:
-            order_id = str(uuid.uuid4())
-            order_date = datetime.now()
-            status = "Pending Payment Confirmation" # Initial status for orders awaiting payment
-
-            # Save order details
-            cursor.execute(
-                "INSERT INTO orders (order_id, user_email, order_date, total_amount, status, personalization_name, personalization_phone, personalization_message, checkout_request_id) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)",
-                (order_id, user_email, order_date, total_amount, status,
-                 personalization_data.get('name') if personalization_data else None,
-                 personalization_data.get('phone') if personalization_data else None,
-                 personalization_data.get('message') if personalization_data else None,
-                 checkout_request_id) # Add checkout_request_id here
-            )
-
-            # Save order items
-            for item in cart_items:
-                cursor.execute(
-                    "INSERT INTO order_items (order_id, meal_id, meal_name, quantity, price_per_item) VALUES (%s, %s, %s, %s, %s)",
-                    (order_id, item['id'], item['name'], item['quantity'], item['price'])
-                )
-            conn.commit()
-            return True, order_id
-        except mysql.connector.Error as err:
-            st.error(f"Error saving order: {err}")
-            conn.rollback()
-            return False, f"Error saving order: {err}"
-        finally:
-            cursor.close()
-            conn.close()
-    return False, "Database connection failed."
-
-def get_user_orders(user_email):
-    """Retrieves all orders for a given user from the database."""
-    conn = get_db_connection()
-    orders = []
-    if conn:
-        cursor = conn.cursor(dictionary=True) # Return rows as dictionaries
-        try:
-            cursor.execute("SELECT * FROM orders WHERE user_email = %s ORDER BY order_date DESC", (user_email,))
-            orders = cursor.fetchall()
-        except mysql.connector.Error as err:
-            st.error(f"Error fetching user orders: {err}")
-        finally:
-            cursor.close()
-            conn.close()
-    return orders
-
-def get_order_details(order_id):
-    """Retrieves details for a specific order and its items."""
-    conn = get_db_connection()
-    order = None
-    items = []
-    if conn:
-        cursor = conn.cursor(dictionary=True)
-        try:
-            cursor.execute("SELECT * FROM orders WHERE order_id = %s", (order_id,))
-            order = cursor.fetchone()
-            if order:
-                cursor.execute("SELECT * FROM order_items WHERE order_id = %s", (order_id,))
-                items = cursor.fetchall()
-        except mysql.connector.Error as err:
-            st.error(f"Error fetching order details: {err}")
-        finally:
-            cursor.close()
-            conn.close()
-    return order, items
-
-def update_order_status(order_id, new_status):
-    """Updates the status of an order in the database."""
-    conn = get_db_connection()
-    if conn:
-        cursor = conn.cursor()
-        try:
-            cursor.execute("UPDATE orders SET status = %s WHERE order_id = %s", (new_status, order_id))
-            conn.commit()
-            return True
-        except mysql.connector.Error as err:
-            st.error(f"Error updating order status: {err}")
-            conn.rollback()
-            return False
-        finally:
-            cursor.close()
-            conn.close()
-    return False
-
-# ==== Helper Functions (M-Pesa) ====
-
-def get_access_token(consumer_key, consumer_secret):
-    """Fetches the M-Pesa API access token."""
-    auth_string = f"{consumer_key}:{consumer_secret}"
-    encoded = base64.b64encode(auth_string.encode()).decode()
-
-    url = "https://sandbox.safaricom.co.ke/oauth/v1/generate"
-    headers = {"Authorization": f"Basic {encoded}"}
-    params = {"grant_type": "client_credentials"}
-
-    try:
-        response = requests.get(url, headers=headers, params=params)
-        response.raise_for_status() # Raise an HTTPError for bad responses (4xx or 5xx)
-        return response.json().get("access_token")
-    except requests.exceptions.RequestException as e:
-        st.error(f"Error getting access token: {e}")
-        return None
-
-def lipa_na_mpesa_online(phone_number, amount, account_reference, transaction_desc):
-    """Initiates an M-Pesa STK Push transaction."""
-    access_token = get_access_token(
-        config("CONSUMER_KEY"), config("CONSUMER_SECRET")
-    )
-    if not access_token:
-        return {"error": "Failed to get access token"}
-
-    timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-    business_shortcode = config("BUSINESS_SHORTCODE")
-    passkey = config("PASSKEY") # This is the raw passkey, not encoded yet
-    data_to_encode = business_shortcode + passkey + timestamp
-    password = base64.b64encode(data_to_encode.encode()).decode()
-
-    payload = {
-        "BusinessShortCode": business_shortcode,
-        "Password": password,
-        "Timestamp": timestamp,
-        "TransactionType": "CustomerPayBillOnline",
-        "Amount": amount,
-        "PartyA": phone_number,
-        "PartyB": business_shortcode,
-        "PhoneNumber": phone_number,
-        "CallBackURL": config("CALLBACK_URL"),
-        "AccountReference": account_reference, # Use order_id for reference
-        "TransactionDesc": transaction_desc
-    }
-
-    headers = {
-        "Authorization": f"Bearer {access_token}",
-        "Content-Type": "application/json"
-    }
-
-    try:
-        response = requests.post(
-            "https://sandbox.safaricom.co.ke/mpesa/stkpush/v1/processrequest",
-            json=payload,
-            headers=headers
-        )
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        st.error(f"Error during M-Pesa STK Push: {e}")
-        return {"error": f"Network or API error: {e}"}
+import i18n
+import hotel_db
+from hotel_db import create_user, verify_user, save_order, get_user_orders_with_items, get_order_details, update_order_status
+from mpesa import request_order_payment
+from cart import Cart
+from app_resources import get_cart_store, get_menu_catalog, get_image_cache, get_payment_executor
 
 # ==== Streamlit App Logic ====
+# Database and M-Pesa helpers live in hotel_db.py and mpesa.py, and the menu,
+# translations and clients are built once per process (app_resources.py,
+# i18n.py), so a rerun of this script only renders the page.
+
+ORDER_HISTORY_PAGE_SIZE = 10 # Orders shown per page of the order history
+PAYMENT_POLL_INTERVAL = 1.5 # Seconds between checks on a payment request sent in the background
 
 st.set_page_config(page_title="Hotel Kitchen", layout="wide")
 
+hotel_db.set_error_reporter(st.error)
+
+def attach_user_cart(email):
+    """Keeps a signed-in user's cart in the shared store, merged with what they added before signing in."""
+    store = get_cart_store()
+    if store:
+        st.session_state.cart.attach(store, email)
+
 # Session states initialization
-if "cart" not in st.session_state:
-    st.session_state.cart = []
-if "user_authenticated" not in st.session_state:
-    st.session_state.user_authenticated = False
-if "user_data" not in st.session_state:
-    st.session_state.user_data = {}
-if "admin_mode" not in st.session_state:
-    st.session_state.admin_mode = False
-if "show_personalize_page" not in st.session_state:
-    st.session_state.show_personalize_page = False
-if "show_order_history" not in st.session_state:
-    st.session_state.show_order_history = False
-if "show_track_order" not in st.session_state:
-    st.session_state.show_track_order = False
-if "current_order_id" not in st.session_state:
-    st.session_state.current_order_id = None # To store the ID of the last placed order
-if "personalization_details" not in st.session_state:
-    st.session_state.personalization_details = {} # To store personalization details
+SESSION_DEFAULTS = {
+    "cart": Cart,
+    "user_authenticated": lambda: False,
+    "user_data": dict,
+    "admin_mode": lambda: False,
+    "show_personalize_page": lambda: False,
+    "show_order_history": lambda: False,
+    "history_cursors": lambda: [None], # Keyset cursors of the order history pages visited so far
+    "show_track_order": lambda: False,
+    "current_order_id": lambda: None, # To store the ID of the last placed order
+    "personalization_details": dict, # To store personalization details
+    "payment_job": lambda: None, # STK Push being sent in the background: {"order_id", "future"}
+    "payment_result": lambda: None, # Its outcome, shown once on the next full run
+}
+for key, default in SESSION_DEFAULTS.items():
+    if key not in st.session_state:
+        st.session_state[key] = default()
 
 
 # Sidebar
@@ -254,419 +58,126 @@ with st.sidebar:
     st.markdown("---")
 
 # ==== Translations ====
-translations = {
-    "welcome_title": {
-        "English": "🍽️ Welcome to Edgewood",
-        "Chinese": "🍽️ 欢迎来到 Edgewood",
-        "Kiswahili": "🍽️ Karibu Edgewood",
-        "French": "🍽️ Bienvenue à Edgewood"
-    },
-    "select_meal_subheader": {
-        "English": "🍲 Select Your Meal(s)",
-        "Chinese": "🍲 选择你的餐点",
-        "Kiswahili": "🍲 Chagua Chakula Chako",
-        "French": "🍲 Sélectionnez votre repas"
-    },
-    "personalize_button": {
-        "English": "🍴 Personalize Your Meal",
-        "Chinese": "🍴 个性化你的餐点",
-        "Kiswahili": "🍴 Binafsisha Chakula Chako",
-        "French": "🍴 Personnalisez votre repas"
-    },
-    "track_order_button": {
-        "English": "📍 Track My Order",
-        "Chinese": "📍 追踪我的订单",
-        "Kiswahili": "📍 Fuatilia Agizo Langu",
-        "French": "📍 Suivre ma commande"
-    },
-    "view_history_button": {
-        "English": "📖 View Order History",
-        "Chinese": "📖 查看订单历史",
-        "Kiswahili": "📖 Tazama Historia ya Agizo",
-        "French": "📖 Afficher l'historique des commandes"
-    },
-    "no_order_found": {
-        "English": "No order found to track!",
-        "Chinese": "没有找到可追踪的订单！",
-        "Kiswahili": "Hakuna agizo lililopatikana la kufuatilia!",
-        "French": "Aucune commande trouvée à suivre !"
-    },
-    "admin_mode_checkbox": {
-        "English": "🔐 Admin Mode",
-        "Chinese": "🔐 管理员模式",
-        "Kiswahili": "🔐 Hali ya Usimamizi",
-        "French": "🔐 Mode administrateur"
-    },
-    "total_cost_label": {
-        "English": "Total Cost",
-        "Chinese": "总成本",
-        "Kiswahili": "Jumla ya Gharama",
-        "French": "Coût total"
-    },
-    "items_in_cart_label": {
-        "English": "🛒 Items in Cart:",
-        "Chinese": "🛒 购物车中的商品：",
-        "Kiswahili": "🛒 Bidhaa kwenye Rukwama:",
-        "French": "🛒 Articles dans le panier :"
-    },
-    "please_select_dish": {
-        "English": "Please select a dish",
-        "Chinese": "请选择一道菜",
-        "Kiswahili": "Tafadhali chagua chakula",
-        "French": "Veuillez sélectionner un plat"
-    },
-    "login_register_expander": {
-        "English": "🔐 Login / Register to continue",
-        "Chinese": "🔐 登录/注册以继续",
-        "Kiswahili": "🔐 Ingia / Jisajili ili kuendelea",
-        "French": "🔐 Se connecter / S'inscrire pour continuer"
-    },
-    "email_input": {
-        "English": "Email",
-        "Chinese": "电子邮件",
-        "Kiswahili": "Barua pepe",
-        "French": "E-mail"
-    },
-    "password_input": {
-        "English": "Password",
-        "Chinese": "密码",
-        "Kiswahili": "Nenosiri",
-        "French": "Mot de passe"
-    },
-    "login_register_button": {
-        "English": "Login or Register",
-        "Chinese": "登录或注册",
-        "Kiswahili": "Ingia au Jisajili",
-        "French": "Se connecter ou s'inscrire"
-    },
-    "login_success": {
-        "English": "Logged in successfully!",
-        "Chinese": "登录成功！",
-        "Kiswahili": "Umefanikiwa kuingia!",
-        "French": "Connecté avec succès !"
-    },
-    "login_warning": {
-        "English": "Please enter both email and password.",
-        "Chinese": "请输入电子邮件和密码。",
-        "Kiswahili": "Tafadhali weka barua pepe na nenosiri.",
-        "French": "Veuillez entrer l'e-mail et le mot de passe."
-    },
-    "user_exists_warning": {
-        "English": "User with this email already exists. Please login.",
-        "Chinese": "此电子邮件用户已存在。请登录。",
-        "Kiswahili": "Mtumiaji mwenye barua pepe hii tayari yupo. Tafadhali ingia.",
-        "French": "Un utilisateur avec cet e-mail existe déjà. Veuillez vous connecter."
-    },
-    "add_to_cart_button": {
-        "English": "➕ Add {meal_name} to Cart",
-        "Chinese": "➕ 将 {meal_name} 添加到购物车",
-        "Kiswahili": "➕ Ongeza {meal_name} kwenye Rukwama",
-        "French": "➕ Ajouter {meal_name} au panier"
-    },
-    "added_to_cart_success": {
-        "English": "Added {qty} x {meal_name} to cart",
-        "Chinese": "已将 {qty} x {meal_name} 添加到购物车",
-        "Kiswahili": "Imeongeza {qty} x {meal_name} kwenye rukwama",
-        "French": "Ajouté {qty} x {meal_name} au panier"
-    },
-    "select_qty_warning": {
-        "English": "Select at least 1 quantity before adding.",
-        "Chinese": "添加前请至少选择1个数量。",
-        "Kiswahili": "Chagua angalau kiasi 1 kabla ya kuongeza.",
-        "French": "Sélectionnez au moins 1 quantité avant d'ajouter."
-    },
-    "cart_summary_subheader": {
-        "English": "🛒 Cart Summary",
-        "Chinese": "🛒 购物车摘要",
-        "Kiswahili": "🛒 Muhtasari wa Rukwama",
-        "French": "🛒 Récapitulatif du panier"
-    },
-    "total_label": {
-        "English": "Total:",
-        "Chinese": "总计：",
-        "Kiswahili": "Jumla:",
-        "French": "Total :"
-    },
-    "checkout_subheader": {
-        "English": "💳 Checkout",
-        "Chinese": "💳 结账",
-        "Kiswahili": "💳 Malipo",
-        "French": "💳 Commander"
-    },
-    "mpesa_phone_input": {
-        "English": "Enter your M-Pesa phone number (e.g., 254712345678)",
-        "Chinese": "输入您的M-Pesa手机号码（例如，254712345678）",
-        "Kiswahili": "Weka nambari yako ya simu ya M-Pesa (k.m., 254712345678)",
-        "French": "Entrez votre numéro de téléphone M-Pesa (ex: 254712345678)"
-    },
-    "pay_now_button": {
-        "English": "Pay Now",
-        "Chinese": "立即支付",
-        "Kiswahili": "Lipa Sasa",
-        "French": "Payer maintenant"
-    },
-    "sending_payment_request": {
-        "English": "Sending payment request...",
-        "Chinese": "正在发送付款请求...",
-        "Kiswahili": "Inatuma ombi la malipo...",
-        "French": "Envoi de la demande de paiement..."
-    },
-    "payment_success": {
-        "English": "✅ Payment request sent. Complete payment on your phone.",
-        "Chinese": "✅ 付款请求已发送。请在您的手机上完成付款。",
-        "Kiswahili": "✅ Ombi la malipo limetumwa. Kamilisha malipo kwenye simu yako.",
-        "French": "✅ Demande de paiement envoyée. Veuillez compléter le paiement sur votre téléphone."
-    },
-    "payment_failed": {
-        "English": "❌ Payment failed: {error_message}",
-        "Chinese": "❌ 付款失败：{error_message}",
-        "Kiswahili": "❌ Malipo yameshindwa: {error_message}",
-        "French": "❌ Paiement échoué : {error_message}"
-    },
-    "invalid_phone_warning": {
-        "English": "Enter a valid 12-digit Safaricom number.",
-        "Chinese": "请输入有效的12位Safaricom号码。",
-        "Kiswahili": "Weka nambari halali ya Safaricom yenye tarakimu 12.",
-        "French": "Entrez un numéro Safaricom valide à 12 chiffres."
-    },
-    "personalize_header": {
-        "English": "🍴 Personalize Your Meal",
-        "Chinese": "🍴 个性化你的餐点",
-        "Kiswahili": "🍴 Binafsisha Chakula Chako",
-        "French": "🍴 Personnalisez votre repas"
-    },
-    "back_to_meals_button": {
-        "English": "🔙 Back to Meals",
-        "Chinese": "🔙 返回餐点",
-        "Kiswahili": "🔙 Rudi kwenye Chakula",
-        "French": "🔙 Retour aux repas"
-    },
-    "your_name_input": {
-        "English": "Your Name",
-        "Chinese": "你的名字",
-        "Kiswahili": "Jina lako",
-        "French": "Votre nom"
-    },
-    "your_phone_input": {
-        "English": "Your Phone Number",
-        "Chinese": "你的电话号码",
-        "Kiswahili": "Nambari yako ya simu",
-        "French": "Votre numéro de téléphone"
-    },
-    "special_request_textarea": {
-        "English": "Write your special request (e.g. 'No onions, extra spicy')",
-        "Chinese": "写下您的特殊要求（例如“不要洋葱，额外辣”）",
-        "Kiswahili": "Andika ombi lako maalum (k.m. 'Bila vitunguu, pilipili nyingi')",
-        "French": "Écrivez votre demande spéciale (ex: 'Pas d'oignons, très épicé')"
-    },
-    "submit_personalization_button": {
-        "English": "Submit Personalization",
-        "Chinese": "提交个性化",
-        "Kiswahili": "Wasilisha Ubinafsishaji",
-        "French": "Soumettre la personnalisation"
-    },
-    "personalization_success": {
-        "English": "✅ Your personalization request has been saved with your order!",
-        "Chinese": "✅ 您的个性化请求已随订单保存！",
-        "Kiswahili": "✅ Ombi lako la ubinafsishaji limehifadhiwa na agizo lako!",
-        "French": "✅ Votre demande de personnalisation a été enregistrée avec votre commande !"
-    },
-    "personalization_warning": {
-        "English": "Please fill in all fields before submitting.",
-        "Chinese": "提交前请填写所有字段。",
-        "Kiswahili": "Tafadhali jaza sehemu zote kabla ya kuwasilisha.",
-        "French": "Veuillez remplir tous les champs avant de soumettre."
-    },
-    "order_history_header": {
-        "English": "📖 Your Order History",
-        "Chinese": "📖 您的订单历史",
-        "Kiswahili": "📖 Historia ya Agizo Lako",
-        "French": "📖 Votre historique de commandes"
-    },
-    "no_past_orders": {
-        "English": "You have no past orders.",
-        "Chinese": "您没有过去的订单。",
-        "Kiswahili": "Huna maagizo yaliyopita.",
-        "French": "Vous n'avez aucune commande passée."
-    },
-    "order_id_label": {
-        "English": "Order ID:",
-        "Chinese": "订单ID：",
-        "Kiswahili": "Kitambulisho cha Agizo:",
-        "French": "ID de commande :"
-    },
-    "order_date_label": {
-        "English": "Order Date:",
-        "Chinese": "订单日期：",
-        "Kiswahili": "Tarehe ya Agizo:",
-        "French": "Date de commande :"
-    },
-    "total_amount_label_order": {
-        "English": "Total Amount:",
-        "Chinese": "总金额：",
-        "Kiswahili": "Jumla ya Kiasi:",
-        "French": "Montant total :"
-    },
-    "status_label": {
-        "English": "Status:",
-        "Chinese": "状态：",
-        "Kiswahili": "Hali:",
-        "French": "Statut :"
-    },
-    "personalization_details_label": {
-        "English": "Personalization Details:",
-        "Chinese": "个性化详情：",
-        "Kiswahili": "Maelezo ya Ubinafsishaji:",
-        "French": "Détails de personnalisation :"
-    },
-    "items_ordered_label": {
-        "English": "Items Ordered:",
-        "Chinese": "订购商品：",
-        "Kiswahili": "Bidhaa zilizoagizwa:",
-        "French": "Articles commandés :"
-    },
-    "track_order_header": {
-        "English": "📍 Track Your Current Order",
-        "Chinese": "📍 追踪您当前的订单",
-        "Kiswahili": "📍 Fuatilia Agizo Lako la Sasa",
-        "French": "📍 Suivre votre commande actuelle"
-    },
-    "enter_order_id": {
-        "English": "Enter Order ID to track:",
-        "Chinese": "输入订单ID以追踪：",
-        "Kiswahili": "Weka Kitambulisho cha Agizo ili kufuatilia:",
-        "French": "Entrez l'ID de commande à suivre :"
-    },
-    "track_button": {
-        "English": "Track Order",
-        "Chinese": "追踪订单",
-        "Kiswahili": "Fuatilia Agizo",
-        "French": "Suivre la commande"
-    },
-    "order_not_found": {
-        "English": "Order not found or you don't have access.",
-        "Chinese": "订单未找到或您无权访问。",
-        "Kiswahili": "Agizo halikupatikana au huna ufikiaji.",
-        "French": "Commande introuvable ou vous n'avez pas accès."
-    },
-    "update_status_button": {
-        "English": "Update Status",
-        "Chinese": "更新状态",
-        "Kiswahili": "Sasisha Hali",
-        "French": "Mettre à jour le statut"
-    },
-    "status_updated_success": {
-        "English": "Order status updated successfully!",
-        "Chinese": "订单状态更新成功！",
-        "Kiswahili": "Hali ya agizo imesasishwa kwa mafanikio!",
-        "French": "Statut de la commande mis à jour avec succès !"
-    }
-}
-
+# UI texts live in locales/*.json and are loaded once per process (see i18n.py).
 # Fallback to English if selected language is not in translations
 language = st.session_state.get("selected_language", "English")
-if language not in translations["welcome_title"]:
+if language not in i18n.LANGUAGES:
     language = "English"
+t = i18n.translator(language)
 
 
 # Use translated title and subheader
-st.title(translations["welcome_title"][language])
+st.title(t["welcome_title"])
 
 
 with st.sidebar:
-    st.header(translations["total_cost_label"][language])
+    st.header(t["total_cost_label"])
     if st.session_state.cart:
-        total_cost = sum(item["price"] * item["quantity"] for item in st.session_state.cart)
-        st.metric(label=translations["total_cost_label"][language], value=f"KES {total_cost:.2f}")
-        st.write(translations["items_in_cart_label"][language])
+        total_cost = st.session_state.cart.total
+        st.metric(label=t["total_cost_label"], value=f"KES {total_cost:.2f}")
+        st.write(t["items_in_cart_label"])
         # Display cart items with quantity adjustment and remove options
-        for i, item in enumerate(st.session_state.cart):
+        for item in st.session_state.cart:
             col1, col2, col3 = st.columns([0.6, 0.2, 0.2])
             with col1:
-                st.write(f"- {item['name']}")
+                st.write(f"- {item.name}")
             with col2:
                 # Use a unique key for each number_input
                 new_qty = st.number_input(
                     "Qty",
                     min_value=0,
                     max_value=10,
-                    value=item['quantity'],
+                    value=item.quantity,
                     step=1,
-                    key=f"cart_qty_{item['id']}_{i}"
+                    key=f"cart_qty_{item.id}"
                 )
-                if new_qty != item['quantity']:
-                    st.session_state.cart[i]['quantity'] = new_qty
-                    # Remove item if quantity becomes 0
-                    if new_qty == 0:
-                        st.session_state.cart = [
-                            cart_item for idx, cart_item in enumerate(st.session_state.cart) if idx != i
-                        ]
+                if new_qty != item.quantity:
+                    # A quantity of 0 removes the item
+                    st.session_state.cart.set_quantity(item.id, new_qty)
                     st.rerun()
             with col3:
                 # Use a unique key for each button
-                if st.button("🗑️", key=f"remove_item_{item['id']}_{i}"):
-                    st.session_state.cart = [
-                        cart_item for idx, cart_item in enumerate(st.session_state.cart) if idx != i
-                    ]
+                if st.button("🗑️", key=f"remove_item_{item.id}"):
+                    st.session_state.cart.remove(item.id)
                     st.rerun()
     else:
-        st.info(translations["please_select_dish"][language])
+        st.info(t["please_select_dish"])
 
     st.markdown("---")
     if st.session_state.user_authenticated:
-        if st.button(translations["track_order_button"][language], key="sidebar_track_order_btn"):
+        if st.button(t["track_order_button"], key="sidebar_track_order_btn"):
             st.session_state.show_track_order = True
             st.session_state.show_order_history = False # Hide history if tracking
             st.session_state.show_personalize_page = False # Hide personalize if tracking
             st.rerun()
 
-        if st.button(translations["view_history_button"][language], key="sidebar_view_history_btn"):
+        if st.button(t["view_history_button"], key="sidebar_view_history_btn"):
             st.session_state.show_order_history = True
+            st.session_state.history_cursors = [None] # Start from the newest orders
             st.session_state.show_track_order = False # Hide tracking if viewing history
             st.session_state.show_personalize_page = False # Hide personalize if viewing history
             st.rerun()
 
         if st.session_state.user_data.get("email") == "admin@kitchen.com":
-            st.session_state.admin_mode = st.checkbox(translations["admin_mode_checkbox"][language])
-
-# Meals
-meals = [
-    {"id": 1, "name": "Chapati Beans", "description": "Served with steamed vegetables", "price": 90,
-     "image": "https://raw.githubusercontent.com/Mokereri/webpage/refs/heads/main/Assets/images/Chapati_beans.jpeg"},
-    {"id": 2, "name": "Cup of Tea", "description": "Milk tea with sugar", "price": 20,
-     "image": "https://github.com/Mokereri/webpage/blob/main/Assets/images/cup%20of%20chai.jpeg?raw=true"},
-    {"id": 3, "name": "Ugali Omena", "description": "Served with fresh vegetables", "price": 100,
-     "image": "https://github.com/Mokereri/webpage/blob/main/Assets/images/ugali-omena.jpeg?raw=true"},
-    {"id": 4, "name": "Rice Beans", "description": "Steamed rice with seasoned beans", "price": 100,
-     "image": "https://github.com/Mokereri/webpage/blob/main/Assets/images/rice_beans.jpeg?raw=true"},
-    {"id": 5, "name": "Rice Beef", "description": "Spiced rice served with beef stew", "price": 170,
-     "image": "https://github.com/Mokereri/webpage/blob/main/Assets/images/rice_beef.jpeg?raw=true"},
-    {"id": 6, "name": "Ugali Matumbo", "description": "Tender beef tripe served with ugali", "price": 140,
-     "image": "https://github.com/Mokereri/webpage/blob/main/Assets/images/ugali_matumbo.jpeg?raw=true"},
-    {"id": 7, "name": "Chicken Masala", "description": "Deliciously spiced chicken in a creamy masala sauce", "price": 320,
-     "image": "https://github.com/Mokereri/webpage/blob/main/Assets/images/Chicken_masala.jpeg?raw=true"},
-    {"id": 8, "name": "Beef Stew", "description": "Tender beef chunks in a rich stew sauce", "price": 280,
-     "image": "https://github.com/Mokereri/webpage/blob/main/Assets/images/beef_stew.jpeg?raw=true"},
-    {"id": 9, "name": "Chicken Pasta", "description": "Creamy pasta tossed with grilled chicken", "price": 350,
-     "image": "https://github.com/Mokereri/webpage/blob/main/Assets/images/chicken%20pasta.jpeg?raw=true"}
-]
+            st.session_state.admin_mode = st.checkbox(t["admin_mode_checkbox"])
+
+# ==== Checkout ====
+
+@st.fragment(run_every=PAYMENT_POLL_INTERVAL)
+def show_payment_progress():
+    """Polls the background STK Push of the current order; reruns the page once it is answered."""
+    job = st.session_state.payment_job
+    if job is None:
+        return
+    if not job["future"].done():
+        st.info(t["sending_payment_request"])
+        return
+    st.session_state.payment_job = None
+    st.session_state.payment_result = {"order_id": job["order_id"], "response": job["future"].result()}
+    st.rerun()
+
+def show_payment_result():
+    """Shows the answer to the last STK Push once. An accepted request empties the cart."""
+    result = st.session_state.payment_result
+    if result is None:
+        return
+    st.session_state.payment_result = None
+    response = result["response"]
+    if "db_error" in response:
+        st.error(response["db_error"])
+    if "CheckoutRequestID" in response:
+        st.success(t["payment_success"])
+        st.success(f"Order saved successfully! Order ID: {result['order_id']}")
+        st.session_state.cart.clear() # Clear cart after successful order
+        st.session_state.personalization_details = {} # Clear personalization
+    else:
+        error_message = response.get("errorMessage") or response.get("error", "Unknown error")
+        st.error(t.format("payment_failed", error_message=error_message))
+
+# Meals, served from the database-backed catalog cached per process (menu_catalog.py)
+try:
+    meals = get_menu_catalog().meals(language)
+except mysql.connector.Error as err:
+    st.error(f"Error loading the menu: {err}")
+    meals = []
 
 # --- Main Content Area ---
 
 # Login/Register Section
 if not st.session_state.user_authenticated:
-    with st.expander(translations["login_register_expander"][language]):
+    with st.expander(t["login_register_expander"]):
         with st.form("login_register_form"): # Changed form key
-            email = st.text_input(translations["email_input"][language], key="login_email")
-            password = st.text_input(translations["password_input"][language], type="password", key="login_password")
-            login_register_btn = st.form_submit_button(translations["login_register_button"][language])
+            email = st.text_input(t["email_input"], key="login_email")
+            password = st.text_input(t["password_input"], type="password", key="login_password")
+            login_register_btn = st.form_submit_button(t["login_register_button"])
 
             if login_register_btn:
                 if email and password:
                     if verify_user(email, password):
                         st.session_state.user_authenticated = True
                         st.session_state.user_data = {"email": email}
-                        st.success(translations["login_success"][language])
+                        attach_user_cart(email)
+                        st.success(t["login_success"])
                         st.rerun()
                     else:
                         # If login fails, try to register
@@ -674,27 +185,28 @@ if not st.session_state.user_authenticated:
                         if success:
                             st.session_state.user_authenticated = True
                             st.session_state.user_data = {"email": email}
-                            st.success(translations["login_success"][language] + " " + message)
+                            attach_user_cart(email)
+                            st.success(t["login_success"] + " " + message)
                             st.rerun()
                         else:
-                            st.warning(translations["user_exists_warning"][language] if "exists" in message else message)
+                            st.warning(t["user_exists_warning"] if "exists" in message else message)
                 else:
-                    st.warning(translations["login_warning"][language])
+                    st.warning(t["login_warning"])
 
 # Main App View (after authentication)
 if st.session_state.user_authenticated:
     if st.session_state.show_personalize_page:
         # Personalization Page
-        st.header(translations["personalize_header"][language])
-        if st.button(translations["back_to_meals_button"][language], key="back_to_meals_from_personalize"):
+        st.header(t["personalize_header"])
+        if st.button(t["back_to_meals_button"], key="back_to_meals_from_personalize"):
             st.session_state.show_personalize_page = False
             st.rerun()
 
         with st.form("personalize_form"):
-            p_name = st.text_input(translations["your_name_input"][language], key="p_name")
-            p_phone = st.text_input(translations["your_phone_input"][language], key="p_phone")
-            p_message = st.text_area(translations["special_request_textarea"][language], key="p_message")
-            personalize_submit = st.form_submit_button(translations["submit_personalization_button"][language])
+            p_name = st.text_input(t["your_name_input"], key="p_name")
+            p_phone = st.text_input(t["your_phone_input"], key="p_phone")
+            p_message = st.text_area(t["special_request_textarea"], key="p_message")
+            personalize_submit = st.form_submit_button(t["submit_personalization_button"])
 
             if personalize_submit:
                 if p_name and p_phone and p_message:
@@ -703,28 +215,32 @@ if st.session_state.user_authenticated:
                         "phone": p_phone,
                         "message": p_message
                     }
-                    st.success(translations["personalization_success"][language])
+                    st.success(t["personalization_success"])
                 else:
-                    st.warning(translations["personalization_warning"][language])
+                    st.warning(t["personalization_warning"])
 
     elif st.session_state.show_order_history:
         # Order History Page
-        st.header(translations["order_history_header"][language])
-        if st.button(translations["back_to_meals_button"][language], key="back_to_meals_from_history"):
+        st.header(t["order_history_header"])
+        if st.button(t["back_to_meals_button"], key="back_to_meals_from_history"):
             st.session_state.show_order_history = False
             st.rerun()
 
-        user_orders = get_user_orders(st.session_state.user_data["email"])
+        user_orders, next_cursor = get_user_orders_with_items(
+            st.session_state.user_data["email"],
+            limit=ORDER_HISTORY_PAGE_SIZE,
+            before=st.session_state.history_cursors[-1]
+        )
         if user_orders:
             for order in user_orders:
                 with st.expander(f"Order ID: {order['order_id']} - {order['order_date'].strftime('%Y-%m-%d %H:%M')} - Status: {order['status']}"):
-                    st.write(f"**{translations['order_id_label'][language]}** {order['order_id']}")
-                    st.write(f"**{translations['order_date_label'][language]}** {order['order_date'].strftime('%Y-%m-%d %H:%M:%S')}")
-                    st.write(f"**{translations['total_amount_label_order'][language]}** KES {order['total_amount']:.2f}")
-                    st.write(f"**{translations['status_label'][language]}** {order['status']}")
+                    st.write(f"**{t['order_id_label']}** {order['order_id']}")
+                    st.write(f"**{t['order_date_label']}** {order['order_date'].strftime('%Y-%m-%d %H:%M:%S')}")
+                    st.write(f"**{t['total_amount_label_order']}** KES {order['total_amount']:.2f}")
+                    st.write(f"**{t['status_label']}** {order['status']}")
 
                     if order['personalization_name'] or order['personalization_message']:
-                        st.markdown(f"**{translations['personalization_details_label'][language]}**")
+                        st.markdown(f"**{t['personalization_details_label']}**")
                         if order['personalization_name']:
                             st.write(f"Name: {order['personalization_name']}")
                         if order['personalization_phone']:
@@ -732,9 +248,8 @@ if st.session_state.user_authenticated:
                         if order['personalization_message']:
                             st.write(f"Message: {order['personalization_message']}")
 
-                    st.markdown(f"**{translations['items_ordered_label'][language]}**")
-                    _, order_items = get_order_details(order['order_id'])
-                    for item in order_items:
+                    st.markdown(f"**{t['items_ordered_label']}**")
+                    for item in order['items']:
                         st.write(f"- {item['meal_name']} x {item['quantity']} @ KES {item['price_per_item']:.2f}")
 
                     # Admin mode: Update status
@@ -747,24 +262,35 @@ if st.session_state.user_authenticated:
                             index=['Pending', 'Processing', 'Ready', 'Delivered', 'Cancelled'].index(order['status']),
                             key=f"status_select_{order['order_id']}"
                         )
-                        if st.button(translations["update_status_button"][language], key=f"update_status_btn_{order['order_id']}"):
+                        if st.button(t["update_status_button"], key=f"update_status_btn_{order['order_id']}"):
                             if update_order_status(order['order_id'], new_status):
-                                st.success(translations["status_updated_success"][language])
+                                st.success(t["status_updated_success"])
                                 st.rerun()
                             else:
                                 st.error("Failed to update status.")
+
+            # Pagination controls
+            nav_prev, nav_next = st.columns(2)
+            with nav_prev:
+                if len(st.session_state.history_cursors) > 1 and st.button("⬅️ Newer orders", key="history_newer_btn"):
+                    st.session_state.history_cursors.pop()
+                    st.rerun()
+            with nav_next:
+                if next_cursor and st.button("Older orders ➡️", key="history_older_btn"):
+                    st.session_state.history_cursors.append(next_cursor)
+                    st.rerun()
         else:
-            st.info(translations["no_past_orders"][language])
+            st.info(t["no_past_orders"])
 
     elif st.session_state.show_track_order:
         # Track Order Page
-        st.header(translations["track_order_header"][language])
-        if st.button(translations["back_to_meals_button"][language], key="back_to_meals_from_track"):
+        st.header(t["track_order_header"])
+        if st.button(t["back_to_meals_button"], key="back_to_meals_from_track"):
             st.session_state.show_track_order = False
             st.rerun()
 
-        track_order_id = st.text_input(translations["enter_order_id"][language], value=st.session_state.current_order_id or "")
-        if st.button(translations["track_button"][language], key="track_order_btn"):
+        track_order_id = st.text_input(t["enter_order_id"], value=st.session_state.current_order_id or "")
+        if st.button(t["track_button"], key="track_order_btn"):
             if track_order_id:
                 order_details, order_items = get_order_details(track_order_id)
                 if order_details and order_details['user_email'] == st.session_state.user_data['email']:
@@ -774,7 +300,7 @@ if st.session_state.user_authenticated:
                     st.write(f"**Total Amount:** KES {order_details['total_amount']:.2f}")
 
                     if order_details['personalization_name'] or order_details['personalization_message']:
-                        st.markdown(f"**{translations['personalization_details_label'][language]}**")
+                        st.markdown(f"**{t['personalization_details_label']}**")
                         if order_details['personalization_name']:
                             st.write(f"Name: {order_details['personalization_name']}")
                         if order_details['personalization_phone']:
@@ -782,7 +308,7 @@ if st.session_state.user_authenticated:
                         if order_details['personalization_message']:
                             st.write(f"Message: {order_details['personalization_message']}")
 
-                    st.markdown(f"**{translations['items_ordered_label'][language]}**")
+                    st.markdown(f"**{t['items_ordered_label']}**")
                     for item in order_items:
                         st.write(f"- {item['meal_name']} x {item['quantity']} @ KES {item['price_per_item']:.2f}")
 
@@ -796,30 +322,57 @@ if st.session_state.user_authenticated:
                             index=['Pending', 'Processing', 'Ready', 'Delivered', 'Cancelled'].index(order_details['status']),
                             key=f"status_select_track_{order_details['order_id']}"
                         )
-                        if st.button(translations["update_status_button"][language], key=f"update_status_btn_track_{order_details['order_id']}"):
+                        if st.button(t["update_status_button"], key=f"update_status_btn_track_{order_details['order_id']}"):
                             if update_order_status(order_details['order_id'], new_status):
-                                st.success(translations["status_updated_success"][language])
+                                st.success(t["status_updated_success"])
                                 # Re-fetch and re-display to show updated status
                                 st.session_state.current_order_id = track_order_id # Keep the ID for re-display
                                 st.rerun()
                             else:
                                 st.error("Failed to update status.")
                 else:
-                    st.warning(translations["order_not_found"][language])
+                    st.warning(t["order_not_found"])
             else:
                 st.info("Please enter an Order ID to track.")
 
     else:
         # Main meal selection page
-        st.subheader(translations["select_meal_subheader"][language])
+        st.subheader(t["select_meal_subheader"])
 
         # Add "Personalize Your Meal" button at the top of the main menu
-        if st.button(translations["personalize_button"][language], key="personalize_meal_button"):
+        if st.button(t["personalize_button"], key="personalize_meal_button"):
             st.session_state.show_personalize_page = True
             st.session_state.show_order_history = False
             st.session_state.show_track_order = False
             st.rerun()
 
+        # Admin mode: Reprice dishes or mark them sold out, without a redeploy
+        if st.session_state.admin_mode:
+            with st.expander("Admin: Edit Menu"):
+                try:
+                    all_meals = get_menu_catalog().meals(language, include_unavailable=True)
+                except mysql.connector.Error as err:
+                    st.error(f"Error loading the menu: {err}")
+                    all_meals = []
+                for meal in all_meals:
+                    col_name, col_price, col_available, col_save = st.columns([0.4, 0.25, 0.2, 0.15])
+                    with col_name:
+                        st.write(meal['name'])
+                    with col_price:
+                        new_price = st.number_input("Price (KES)", min_value=0.0, value=meal['price'], step=5.0, key=f"menu_price_{meal['id']}")
+                    with col_available:
+                        new_available = st.checkbox("Available", value=meal['available'], key=f"menu_available_{meal['id']}")
+                    with col_save:
+                        if st.button("Save", key=f"menu_save_{meal['id']}"):
+                            try:
+                                if new_price != meal['price']:
+                                    get_menu_catalog().set_price(meal['id'], new_price)
+                                if new_available != meal['available']:
+                                    get_menu_catalog().set_available(meal['id'], new_available)
+                                st.rerun()
+                            except mysql.connector.Error as err:
+                                st.error(f"Error updating the menu: {err}")
+
         st.markdown("---")
 
         cols_per_row = 3
@@ -829,7 +382,7 @@ if st.session_state.user_authenticated:
             cols = st.columns(cols_per_row)
             for col_idx, meal in enumerate(meal_row):
                 with cols[col_idx]:
-                    st.image(meal["image"], use_column_width=True)
+                    st.image(get_image_cache().source_for(meal["image"], 640), use_column_width=True)
                     st.markdown(f"**{meal['name']}**")
                     st.write(f"*{meal['description']}*")
                     st.write(f"**KES {meal['price']:.2f}**")
@@ -844,75 +397,66 @@ if st.session_state.user_authenticated:
                     )
 
                     add_to_cart_btn = st.button(
-                        translations["add_to_cart_button"][language].format(meal_name=meal['name']),
+                        t.format("add_to_cart_button", meal_name=meal['name']),
                         key=f"add_{meal['id']}" # Unique key for each add button
                     )
 
                     if add_to_cart_btn:
                         if qty > 0:
-                            # Check if item already exists in cart, update quantity
-                            found = False
-                            for item_in_cart in st.session_state.cart:
-                                if item_in_cart['id'] == meal['id']:
-                                    item_in_cart['quantity'] += qty
-                                    found = True
-                                    break
-                            if not found:
-                                st.session_state.cart.append(
-                                    {"id": meal['id'], "name": meal['name'], "price": meal['price'], "quantity": qty}
-                                )
-                            st.success(translations["added_to_cart_success"][language].format(qty=qty, meal_name=meal['name']))
+                            # Merges with the meal's existing line, if any
+                            st.session_state.cart.add(meal['id'], meal['canonical_name'], meal['price'], qty)
+                            st.success(t.format("added_to_cart_success", qty=qty, meal_name=meal['name']))
                             st.rerun() # Rerun to update sidebar cart immediately
                         else:
-                            st.warning(translations["select_qty_warning"][language])
+                            st.warning(t["select_qty_warning"])
 
         st.markdown("---")
 
+        show_payment_result()
         if st.session_state.cart:
-            st.subheader(translations["checkout_subheader"][language])
+            st.subheader(t["checkout_subheader"])
             mpesa_phone = st.text_input(
-                translations["mpesa_phone_input"][language],
+                t["mpesa_phone_input"],
                 value=st.session_state.user_data.get("phone_number", ""), # Pre-fill if exists
                 max_chars=12,
                 key="mpesa_phone_input"
             )
 
-            total_amount_for_checkout = sum(item["price"] * item["quantity"] for item in st.session_state.cart)
+            total_amount_for_checkout = st.session_state.cart.total
 
-            if st.button(translations["pay_now_button"][language], key="pay_now_button"):
+            # Only one payment request at a time; the button comes back when it is answered
+            pay_now_btn = st.button(t["pay_now_button"], key="pay_now_button",
+                                    disabled=st.session_state.payment_job is not None)
+            if pay_now_btn:
                 if mpesa_phone and len(mpesa_phone) == 12 and mpesa_phone.startswith('2547'):
-                    with st.spinner(translations["sending_payment_request"][language]):
+                    # Save the order as pending first, then send the STK Push in the
+                    # background; show_payment_progress() polls for the answer.
+                    success, order_id = save_order(
+                        st.session_state.user_data["email"],
+                        st.session_state.cart,
+                        total_amount_for_checkout,
+                        st.session_state.personalization_details
+                    )
+                    if success:
                         transaction_desc = "Hotel Meal Payment"
                         account_reference = f"ORDER-{datetime.now().strftime('%Y%m%d%H%M%S')}-{st.session_state.user_data['email'].split('@')[0]}"
-
                         # M-Pesa API expects amount as an integer for KES
                         mpesa_amount = int(total_amount_for_checkout)
-
-                        response = lipa_na_mpesa_online(mpesa_phone, mpesa_amount, account_reference, transaction_desc)
-
-                        if response and "CheckoutRequestID" in response:
-                            st.success(translations["payment_success"][language])
-                            st.session_state.current_order_id = account_reference # Store for tracking
-                            # Save order to DB regardless of M-Pesa confirmation for now
-                            # In a real app, you'd confirm M-Pesa callback before saving as "Paid"
-                            success, order_id = save_order(
-                                st.session_state.user_data["email"],
-                                st.session_state.cart,
-                                total_amount_for_checkout,
-                                st.session_state.personalization_details
-                            )
-                            if success:
-                                st.success(f"Order saved successfully! Order ID: {order_id}")
-                                st.session_state.cart = [] # Clear cart after successful order
-                                st.session_state.personalization_details = {} # Clear personalization
-                                st.rerun()
-                            else:
-                                st.error(f"Failed to save order to database: {order_id}")
-                        else:
-                            error_message = response.get("errorMessage", "Unknown error") if response else "No response"
-                            st.error(translations["payment_failed"][language].format(error_message=error_message))
+                        st.session_state.current_order_id = order_id # Store for tracking
+                        st.session_state.payment_job = {
+                            "order_id": order_id,
+                            "future": get_payment_executor().submit(
+                                request_order_payment, order_id, mpesa_phone, mpesa_amount, account_reference, transaction_desc
+                            ),
+                        }
+                        st.rerun()
+                    else:
+                        st.error(f"Failed to save order to database: {order_id}")
                 else:
-                    st.warning(translations["invalid_phone_warning"][language])
+                    st.warning(t["invalid_phone_warning"])
+
+            if st.session_state.payment_job is not None:
+                show_payment_progress()
         else:
             st.info("Your cart is empty. Add some delicious meals!")
 
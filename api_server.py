@@ -0,0 +1,630 @@
+# api_server.py
+# Async JSON API for the React front end (app.js).
+#
+# Implements the endpoints app.js calls on port 5000 (/register, /login,
+# /mpesa_stk_push, /save_order, /get_orders, /get_order_details, also as
+# GET /orders/<order_id>, and /update_order_status) with the same queries and
+# M-Pesa request as the Streamlit app (hotel_db.py, mpesa.py). It is an ASGI
+# app: database calls go through a pooled aiomysql connection pool and Daraja
+# calls through one pooled httpx client per process, so a worker serves many
+# customers at once instead of blocking a thread per request.
+#
+# /login and /register return a bearer token signed with API_SECRET_KEY; every
+# other endpoint acts as the user in that token (Authorization: Bearer ...),
+# never as a user named in the request. Only admins may change order statuses
+# or follow the kitchen stream.
+#
+#   uvicorn api_server:app --host 0.0.0.0 --port 5000 --workers 4
+#   python api_server.py
+#
+# mpesa_callback_handler.py also defaults to port 5000; run it on another port
+# (or behind the same reverse proxy) when both are up.
+import asyncio
+import base64
+import datetime
+import decimal
+import functools
+import hashlib
+import hmac
+import json
+import logging
+import time
+import uuid
+from contextlib import asynccontextmanager
+
+import aiomysql
+import httpx
+import mysql.connector
+from decouple import config
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+import mpesa_auth
+import payments
+from mpesa import stk_push_payload
+from order_events import KITCHEN_TOPIC, ORDER_EVENTS_SECRET, SECRET_HEADER, OrderEvents, make_event, order_topic
+from order_read_model import ORDER_DETAILS_SQL, create_order_cache, etag_for, order_from_rows
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+PENDING_STATUS = "Pending Payment Confirmation" # Initial status for orders awaiting payment
+# The statuses an admin may set. Payment statuses are only set by M-Pesa results (payments.py).
+KITCHEN_STATUSES = ("Processing", "Ready", "Delivered", "Cancelled")
+
+# Signs login tokens; must be the same for every worker
+API_SECRET_KEY = config("API_SECRET_KEY", default="")
+API_TOKEN_TTL = config("API_TOKEN_TTL", default=12 * 3600, cast=int) # Seconds a login lasts
+
+SSE_HEARTBEAT_INTERVAL = 15.0 # Seconds between keep-alive comments on idle event streams
+
+# Recently served order responses, keyed by order id (order_read_model.py)
+order_cache = create_order_cache()
+
+# Status changes streamed to browsers (order_events.py). Every event, from any
+# process, also drops this worker's cached copy of the order.
+order_events = OrderEvents()
+order_events.broker.on_event.append(lambda event: order_cache.invalidate(event['order_id']))
+
+
+class ApiJSONResponse(JSONResponse):
+    """JSONResponse that also encodes the DECIMAL and DATETIME values MySQL rows contain."""
+
+    @staticmethod
+    def _default(value):
+        if isinstance(value, decimal.Decimal):
+            return float(value)
+        if isinstance(value, (datetime.datetime, datetime.date)):
+            return value.isoformat()
+        raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+    def render(self, content):
+        return json.dumps(content, default=self._default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def error(message, status_code=400, **extra):
+    return ApiJSONResponse({"success": False, "error": message, **extra}, status_code=status_code)
+
+
+async def read_json(request, *required):
+    """Returns the request's JSON object. Raises ValueError naming what is missing or malformed."""
+    try:
+        data = await request.json()
+    except ValueError:
+        raise ValueError("Request body must be JSON.")
+    if not isinstance(data, dict):
+        raise ValueError("Request body must be a JSON object.")
+    missing = [field for field in required if data.get(field) in (None, "")]
+    if missing:
+        raise ValueError(f"Missing field(s): {', '.join(missing)}")
+    return data
+
+
+# ==== Authentication ====
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _sign(payload):
+    return _b64encode(hmac.new(API_SECRET_KEY.encode(), payload.encode(), hashlib.sha256).digest())
+
+
+def issue_token(email, role):
+    """A signed bearer token for a logged-in user, valid for API_TOKEN_TTL seconds."""
+    payload = _b64encode(json.dumps({"email": email, "role": role, "exp": int(time.time()) + API_TOKEN_TTL}).encode())
+    return f"{payload}.{_sign(payload)}"
+
+
+def user_for_token(token):
+    """Returns {"email", "role"} for a valid, unexpired token, else None."""
+    payload, _, signature = (token or "").partition(".")
+    if not payload or not hmac.compare_digest(signature, _sign(payload)):
+        return None
+    try:
+        claims = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+        if claims["exp"] < time.time():
+            return None
+        return {"email": claims["email"], "role": claims["role"]}
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+def authenticated(admin=False):
+    """Endpoint decorator: answers 401 without a valid token, and 403 to non-admins if `admin`.
+
+    The user is available as request.state.user. EventSource can't send
+    headers, so the token may also be given as ?access_token=.
+    """
+    def decorate(endpoint):
+        @functools.wraps(endpoint)
+        async def wrapper(request):
+            authorization = request.headers.get("authorization", "")
+            if authorization.lower().startswith("bearer "):
+                token = authorization[len("bearer "):].strip()
+            else:
+                token = request.query_params.get("access_token")
+            user = user_for_token(token)
+            if user is None:
+                return error("Please log in.", 401)
+            if admin and user['role'] != "admin":
+                return error("Only admins can do that.", 403)
+            request.state.user = user
+            return await endpoint(request)
+        return wrapper
+    return decorate
+
+
+def can_see(user, owner_email):
+    """True if `user` may see an order placed by `owner_email`."""
+    return user['role'] == "admin" or user['email'] == owner_email
+
+
+# ==== Shared Resources ====
+# Created once per worker process when the app starts and closed when it stops.
+
+@asynccontextmanager
+async def lifespan(app):
+    if not API_SECRET_KEY:
+        raise RuntimeError("Set API_SECRET_KEY (a long random string) to sign login tokens.")
+    app.state.db_pool = await aiomysql.create_pool(
+        host=config("DB_HOST"),
+        user=config("DB_USER"),
+        password=config("DB_PASSWORD"),
+        db=config("DB_NAME"),
+        port=config("DB_PORT", default=3306, cast=int),
+        minsize=1,
+        maxsize=config("API_DB_POOL_SIZE", default=10, cast=int),
+        pool_recycle=config("API_DB_POOL_RECYCLE", default=3600, cast=int),
+        autocommit=True, # Reads see fresh data; writes that must go together use BEGIN
+        charset="utf8mb4",
+    )
+    app.state.daraja = httpx.AsyncClient(
+        base_url=mpesa_auth.DARAJA_BASE_URL,
+        timeout=httpx.Timeout(
+            config("HTTP_DARAJA_READ_TIMEOUT", default=20.0, cast=float),
+            connect=config("HTTP_DARAJA_CONNECT_TIMEOUT", default=3.05, cast=float),
+        ),
+        limits=httpx.Limits(max_connections=config("HTTP_DARAJA_POOL_SIZE", default=10, cast=int)),
+    )
+    await order_events.start()
+    try:
+        yield
+    finally:
+        await order_events.stop()
+        await app.state.daraja.aclose()
+        app.state.db_pool.close()
+        await app.state.db_pool.wait_closed()
+
+
+# ==== Users ====
+
+async def register(request):
+    try:
+        data = await read_json(request, "email", "password")
+    except ValueError as e:
+        return error(str(e))
+    async with request.app.state.db_pool.acquire() as conn:
+        async with conn.cursor() as cursor:
+            try:
+                # users.email is UNIQUE, so one INSERT both checks and creates
+                await cursor.execute("INSERT INTO users (email, password) VALUES (%s, %s)", (data['email'], data['password']))
+            except aiomysql.IntegrityError:
+                return error("User with this email already exists.", 409)
+            except aiomysql.Error as err:
+                logger.error(f"Error creating user: {err}")
+                return error("Error registering user.", 500)
+    return ApiJSONResponse({"success": True, "email": data['email'], "role": "user",
+                            "token": issue_token(data['email'], "user")})
+
+
+async def login(request):
+    try:
+        data = await read_json(request, "email", "password")
+    except ValueError as e:
+        return error(str(e))
+    try:
+        async with request.app.state.db_pool.acquire() as conn:
+            async with conn.cursor(aiomysql.DictCursor) as cursor:
+                await cursor.execute(
+                    "SELECT email, role FROM users WHERE email = %s AND password = %s",
+                    (data['email'], data['password'])
+                )
+                user = await cursor.fetchone()
+    except aiomysql.Error as err:
+        logger.error(f"Error verifying user: {err}")
+        return error("Error verifying user.", 500)
+    if user is None:
+        return error("Invalid email or password.", 401)
+    return ApiJSONResponse({"success": True, "email": user['email'], "role": user['role'],
+                            "token": issue_token(user['email'], user['role'])})
+
+
+# ==== M-Pesa ====
+
+async def get_access_token():
+    """Returns the Daraja token from the process-wide cache (mpesa_auth.py).
+
+    A fetch, at most once an hour, runs in a thread so it doesn't block the event loop.
+    """
+    cache = mpesa_auth.get_token_cache(config("CONSUMER_KEY"), config("CONSUMER_SECRET"))
+    return cache.peek() or await asyncio.to_thread(cache.get)
+
+
+@authenticated()
+async def mpesa_stk_push(request):
+    """Asks the customer to pay for one of their saved, not yet pushed orders.
+
+    The amount is the order's total_amount as saved by save_order, never a
+    figure from the request. Once Daraja accepts, the order is linked to the
+    CheckoutRequestID for the callback. A rejected push leaves the order
+    pending, so it can be pushed again.
+    """
+    try:
+        data = await read_json(request, "order_id", "phone_number")
+    except ValueError as e:
+        return ApiJSONResponse({"errorMessage": str(e)}, status_code=400)
+    try:
+        async with request.app.state.db_pool.acquire() as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute(
+                    "SELECT total_amount FROM orders "
+                    "WHERE order_id = %s AND user_email = %s AND status = %s AND checkout_request_id IS NULL",
+                    (data['order_id'], request.state.user['email'], PENDING_STATUS)
+                )
+                order = await cursor.fetchone()
+    except aiomysql.Error as err:
+        logger.error(f"Error loading order {data['order_id']} for payment: {err}")
+        return ApiJSONResponse({"errorMessage": "Error loading the order."}, status_code=500)
+    if order is None:
+        return ApiJSONResponse({"errorMessage": "No unpaid order with that ID."}, status_code=404)
+    try:
+        access_token = await get_access_token()
+    except Exception as e:
+        logger.error(f"Error getting access token: {e}")
+        return ApiJSONResponse({"errorMessage": "Failed to get access token"}, status_code=502)
+
+    # M-Pesa takes whole shillings
+    payload = stk_push_payload(data['phone_number'], int(order[0]), f"ORDER-{data['order_id'][:8]}", "Hotel Meal Payment")
+    try:
+        # Not retried: re-sending an STK push could prompt the customer twice
+        response = await request.app.state.daraja.post(
+            "/mpesa/stkpush/v1/processrequest",
+            json=payload,
+            headers={"Authorization": f"Bearer {access_token}"}
+        )
+    except httpx.HTTPError as e:
+        logger.error(f"Error during M-Pesa STK Push: {e}")
+        return ApiJSONResponse({"errorMessage": f"Network or API error: {e}"}, status_code=502)
+
+    if response.status_code == 401:
+        # The cached token was revoked early; fetch a fresh one next time. invalidate()
+        # waits for a fetch in progress, so it runs off the event loop.
+        cache = mpesa_auth.get_token_cache(config("CONSUMER_KEY"), config("CONSUMER_SECRET"))
+        await asyncio.to_thread(cache.invalidate)
+    try:
+        body = response.json()
+    except ValueError:
+        body = {"errorMessage": f"Unexpected response from M-Pesa (HTTP {response.status_code})"}
+    if response.is_error:
+        logger.error(f"M-Pesa STK Push failed with HTTP {response.status_code}: {body}")
+    elif body.get("CheckoutRequestID"):
+        try:
+            async with request.app.state.db_pool.acquire() as conn:
+                async with conn.cursor() as cursor:
+                    # Only the first accepted push is linked; the callback settles the order through it
+                    await cursor.execute(
+                        "UPDATE orders SET checkout_request_id = %s WHERE order_id = %s AND checkout_request_id IS NULL",
+                        (body['CheckoutRequestID'], data['order_id'])
+                    )
+        except aiomysql.Error as err:
+            logger.error(f"Error linking order {data['order_id']} to {body['CheckoutRequestID']}: {err}")
+            return ApiJSONResponse({"errorMessage": "Error recording the payment request."}, status_code=500)
+        order_cache.invalidate(data['order_id'])
+        try:
+            # The callback may have beaten the link and been parked (payments.py)
+            await asyncio.to_thread(payments.apply_parked_updates, [body['CheckoutRequestID']])
+        except mysql.connector.Error as err:
+            # The reconciler applies it on its next run
+            logger.error(f"Error applying a parked callback for {body['CheckoutRequestID']}: {err}")
+    # Daraja's own body (CheckoutRequestID, or errorMessage) is what app.js reads
+    return ApiJSONResponse(body, status_code=response.status_code)
+
+
+# ==== Orders ====
+
+@authenticated()
+async def save_order(request):
+    """Saves the user's cart as an order awaiting payment; pay for it with /mpesa_stk_push.
+
+    cart_items are [{id, quantity}]. Names and prices come from the meals
+    table and the total is computed here, whatever the client shows.
+    """
+    try:
+        data = await read_json(request, "cart_items")
+    except ValueError as e:
+        return error(str(e))
+    personalization_data = data.get('personalization_data') or {}
+    order_id = str(uuid.uuid4())
+    try:
+        quantities = {}
+        for item in data['cart_items']:
+            meal_id, quantity = int(item['id']), int(item['quantity'])
+            if quantity < 1:
+                raise ValueError
+            quantities[meal_id] = quantities.get(meal_id, 0) + quantity
+    except (KeyError, TypeError, ValueError):
+        return error("Each cart item needs an id and a quantity of at least 1.")
+    if not quantities:
+        return error("The cart is empty.")
+
+    async with request.app.state.db_pool.acquire() as conn:
+        async with conn.cursor() as cursor:
+            try:
+                placeholders = ", ".join(["%s"] * len(quantities))
+                await cursor.execute(
+                    "SELECT m.id, t.name, m.price FROM meals m "
+                    "JOIN meal_translations t ON t.meal_id = m.id AND t.language = 'English' "
+                    f"WHERE m.id IN ({placeholders}) AND m.available",
+                    tuple(quantities)
+                )
+                meals = {meal_id: (name, price) for meal_id, name, price in await cursor.fetchall()}
+                missing = [str(meal_id) for meal_id in quantities if meal_id not in meals]
+                if missing:
+                    return error(f"Meal(s) not available: {', '.join(missing)}.")
+                rows = [(order_id, meal_id, meals[meal_id][0], quantity, meals[meal_id][1])
+                        for meal_id, quantity in quantities.items()]
+                total_amount = sum(price * quantity for _, _, _, quantity, price in rows)
+
+                # The order and all its items commit together, or not at all
+                await conn.begin()
+                await cursor.execute(
+                    "INSERT INTO orders (order_id, user_email, order_date, total_amount, status, personalization_name, personalization_phone, personalization_message) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)",
+                    (order_id, request.state.user['email'], datetime.datetime.now(), total_amount, PENDING_STATUS,
+                     personalization_data.get('name'),
+                     personalization_data.get('phone'),
+                     personalization_data.get('message'))
+                )
+                # One multi-row INSERT for all the items
+                await cursor.executemany(
+                    "INSERT INTO order_items (order_id, meal_id, meal_name, quantity, price_per_item) VALUES (%s, %s, %s, %s, %s)",
+                    rows
+                )
+                await conn.commit()
+            except aiomysql.Error as err:
+                await conn.rollback()
+                logger.error(f"Error saving order: {err}")
+                return error(f"Error saving order: {err}", 500)
+    return ApiJSONResponse({"success": True, "order_id": order_id, "total_amount": total_amount})
+
+
+@authenticated()
+async def get_orders(request):
+    """Returns the user's orders, newest first, each with its 'items' (two queries in total).
+
+    Admins may ask for another customer's orders with 'user_email'.
+    """
+    try:
+        data = await read_json(request)
+    except ValueError as e:
+        return error(str(e))
+    user = request.state.user
+    user_email = data.get('user_email') if user['role'] == "admin" and data.get('user_email') else user['email']
+    try:
+        async with request.app.state.db_pool.acquire() as conn:
+            async with conn.cursor(aiomysql.DictCursor) as cursor:
+                await cursor.execute(
+                    "SELECT * FROM orders WHERE user_email = %s ORDER BY order_date DESC, order_id DESC",
+                    (user_email,)
+                )
+                orders = await cursor.fetchall()
+                if orders:
+                    items_by_order = {order['order_id']: [] for order in orders}
+                    placeholders = ", ".join(["%s"] * len(items_by_order))
+                    await cursor.execute(
+                        f"SELECT * FROM order_items WHERE order_id IN ({placeholders}) ORDER BY id",
+                        tuple(items_by_order)
+                    )
+                    for item in await cursor.fetchall():
+                        items_by_order[item['order_id']].append(item)
+                    for order in orders:
+                        order['items'] = items_by_order[order['order_id']]
+    except aiomysql.Error as err:
+        logger.error(f"Error fetching user orders: {err}")
+        return error("Error fetching orders.", 500)
+    # app.js expects a bare list here
+    return ApiJSONResponse(list(orders))
+
+
+async def order_details_response(request, order_id):
+    """The {order, items} response for one order, from order_cache when possible.
+
+    Only the customer who placed the order, or an admin, gets it; anyone else
+    gets the same 404 as for a missing order. Carries an ETag; a request whose
+    If-None-Match matches gets 304 Not Modified.
+    """
+    cached = order_cache.get(order_id)
+    if cached is None:
+        try:
+            async with request.app.state.db_pool.acquire() as conn:
+                async with conn.cursor(aiomysql.DictCursor) as cursor:
+                    await cursor.execute(ORDER_DETAILS_SQL, (order_id,))
+                    order, items = order_from_rows(await cursor.fetchall())
+        except aiomysql.Error as err:
+            logger.error(f"Error fetching order details: {err}")
+            return error("Error fetching order details.", 500)
+        if order is None:
+            return error("Order not found.", 404, order=None, items=[])
+        body = ApiJSONResponse({"success": True, "order": order, "items": items}).body
+        etag, owner = etag_for(body), order['user_email']
+        order_cache.put(order_id, order['status'], etag, (owner, body))
+    else:
+        etag, (owner, body) = cached
+    if not can_see(request.state.user, owner):
+        return error("Order not found.", 404, order=None, items=[])
+
+    # no-cache: browsers may keep the receipt, but must revalidate it every time
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(",")):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
+
+@authenticated()
+async def get_order_details(request):
+    try:
+        data = await read_json(request, "order_id")
+    except ValueError as e:
+        return error(str(e))
+    return await order_details_response(request, data['order_id'])
+
+
+@authenticated()
+async def get_order(request):
+    """GET /orders/<order_id>: the same response as /get_order_details, cacheable by browsers."""
+    return await order_details_response(request, request.path_params['order_id'])
+
+
+@authenticated(admin=True)
+async def update_order_status(request):
+    try:
+        data = await read_json(request, "order_id", "new_status")
+    except ValueError as e:
+        return error(str(e))
+    if data['new_status'] not in KITCHEN_STATUSES:
+        return error(f"Status must be one of: {', '.join(KITCHEN_STATUSES)}.")
+    async with request.app.state.db_pool.acquire() as conn:
+        async with conn.cursor() as cursor:
+            try:
+                # rowcount can't tell a missing order apart from an unchanged status
+                # (MySQL reports rows changed, not rows matched), so look it up first
+                await conn.begin()
+                await cursor.execute("SELECT status FROM orders WHERE order_id = %s FOR UPDATE", (data['order_id'],))
+                if await cursor.fetchone() is None:
+                    await conn.rollback()
+                    return error("Order not found.", 404)
+                await cursor.execute(
+                    "UPDATE orders SET status = %s WHERE order_id = %s",
+                    (data['new_status'], data['order_id'])
+                )
+                await conn.commit()
+            except aiomysql.Error as err:
+                await conn.rollback()
+                logger.error(f"Error updating order status: {err}")
+                return error(f"Error updating order status: {err}", 500)
+            order_cache.invalidate(data['order_id'])
+    await order_events.publish(make_event(data['order_id'], data['new_status']))
+    return ApiJSONResponse({"success": True})
+
+
+# ==== Order Events ====
+
+def event_stream(topic):
+    """A server-sent event stream of the order events published to `topic`."""
+    broker = order_events.broker
+    queue = broker.subscribe(topic)
+
+    async def stream():
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), SSE_HEARTBEAT_INTERVAL)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if event is None:
+                    break # Fell too far behind; the browser reconnects
+                yield f"event: order_status\ndata: {json.dumps(event)}\n\n"
+        finally:
+            broker.unsubscribe(topic, queue)
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@authenticated()
+async def order_event_stream(request):
+    """GET /orders/<order_id>/events: status changes of one order, for its customer or an admin."""
+    order_id = request.path_params['order_id']
+    try:
+        async with request.app.state.db_pool.acquire() as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute("SELECT user_email FROM orders WHERE order_id = %s", (order_id,))
+                row = await cursor.fetchone()
+    except aiomysql.Error as err:
+        logger.error(f"Error looking up order {order_id}: {err}")
+        return error("Error fetching order details.", 500)
+    if row is None or not can_see(request.state.user, row[0]):
+        return error("Order not found.", 404)
+    return event_stream(order_topic(order_id))
+
+
+@authenticated(admin=True)
+async def kitchen_event_stream(request):
+    """GET /kitchen/events: status changes of every order."""
+    return event_stream(KITCHEN_TOPIC)
+
+
+async def receive_order_events(request):
+    """POST /order_events: events from the callback handler and the Streamlit app (without Redis)."""
+    if not ORDER_EVENTS_SECRET or request.headers.get(SECRET_HEADER) != ORDER_EVENTS_SECRET:
+        return error("Forbidden.", 403)
+    try:
+        data = await read_json(request, "events")
+        events = [make_event(event['order_id'], event['status']) for event in data['events']]
+    except (ValueError, KeyError, TypeError):
+        return error("Expected {\"events\": [{\"order_id\": ..., \"status\": ...}]}.")
+    for event in events:
+        await order_events.publish(event)
+    return ApiJSONResponse({"success": True, "received": len(events)})
+
+
+# ==== Metrics Route ====
+
+async def metrics(request):
+    pool = request.app.state.db_pool
+    return ApiJSONResponse({
+        "db_pool": {"size": pool.size, "free": pool.freesize, "max_size": pool.maxsize},
+        "order_cache": order_cache.stats(),
+        "order_events": order_events.broker.stats(),
+    })
+
+
+routes = [
+    Route('/register', register, methods=['POST']),
+    Route('/login', login, methods=['POST']),
+    Route('/mpesa_stk_push', mpesa_stk_push, methods=['POST']),
+    Route('/save_order', save_order, methods=['POST']),
+    Route('/get_orders', get_orders, methods=['POST']),
+    Route('/get_order_details', get_order_details, methods=['POST']),
+    Route('/update_order_status', update_order_status, methods=['POST']),
+    Route('/orders/{order_id}', get_order, methods=['GET']),
+    Route('/orders/{order_id}/events', order_event_stream, methods=['GET']),
+    Route('/kitchen/events', kitchen_event_stream, methods=['GET']),
+    Route('/order_events', receive_order_events, methods=['POST']),
+    Route('/metrics', metrics, methods=['GET']),
+]
+
+# The React dev server and the built front end are served from other origins
+middleware = [
+    Middleware(
+        CORSMiddleware,
+        allow_origins=[origin.strip() for origin in config("API_CORS_ORIGINS", default="*").split(",")],
+        allow_methods=["GET", "POST"],
+        allow_headers=["Authorization", "Content-Type", "If-None-Match"],
+        expose_headers=["ETag"],
+    ),
+]
+
+app = Starlette(routes=routes, middleware=middleware, lifespan=lifespan)
+
+if __name__ == '__main__':
+    import uvicorn
+
+    uvicorn.run("api_server:app", host='0.0.0.0', port=config("API_PORT", default=5000, cast=int),
+                workers=config("API_WORKERS", default=1, cast=int))
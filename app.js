@@ -8,7 +8,17 @@ const AppContext = createContext(null);
 // --- Backend API Service (api.js equivalent) ---
 const API_BASE_URL = process.env.REACT_APP_API_BASE_URL || 'http://localhost:5000'; // Default for local dev
 
+// The statuses an admin can set; payment statuses only change with M-Pesa results
+const KITCHEN_STATUSES = ['Processing', 'Ready', 'Delivered', 'Cancelled'];
+
+// Bearer token from /login or /register, sent with every other request
+let authToken = null;
+const authHeaders = (headers = {}) => (authToken ? { ...headers, Authorization: `Bearer ${authToken}` } : headers);
+
 const api = {
+    setAuthToken: (token) => {
+        authToken = token;
+    },
     register: async (email, password) => {
         const response = await fetch(`${API_BASE_URL}/register`, {
             method: 'POST',
@@ -25,53 +35,54 @@ const api = {
         });
         return response.json();
     },
-    initiateMpesaStkPush: async (phoneNumber, amount, accountReference, transactionDesc) => {
+    // Asks the customer to pay for a saved order; the server charges the order's own total
+    initiateMpesaStkPush: async (orderId, phoneNumber) => {
         const response = await fetch(`${API_BASE_URL}/mpesa_stk_push`, {
             method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({
-                phone_number: phoneNumber,
-                amount: amount,
-                account_reference: accountReference,
-                transaction_desc: transactionDesc,
-            }),
+            headers: authHeaders({ 'Content-Type': 'application/json' }),
+            body: JSON.stringify({ order_id: orderId, phone_number: phoneNumber }),
         });
         return response.json();
     },
-    saveOrder: async (userEmail, cartItems, totalAmount, personalizationData, checkoutRequestId) => {
+    // cartItems are [{ id, quantity }]; the server prices them and returns the order's total_amount
+    saveOrder: async (cartItems, personalizationData) => {
         const response = await fetch(`${API_BASE_URL}/save_order`, {
             method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
+            headers: authHeaders({ 'Content-Type': 'application/json' }),
             body: JSON.stringify({
-                user_email: userEmail,
                 cart_items: cartItems,
-                total_amount: totalAmount,
                 personalization_data: personalizationData,
-                checkout_request_id: checkoutRequestId,
             }),
         });
         return response.json();
     },
-    getUserOrders: async (userEmail) => {
+    // The logged-in user's orders
+    getUserOrders: async () => {
         const response = await fetch(`${API_BASE_URL}/get_orders`, {
             method: 'POST', // Using POST for consistency with other data-sending calls
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ user_email: userEmail }),
+            headers: authHeaders({ 'Content-Type': 'application/json' }),
+            body: JSON.stringify({}),
         });
         return response.json();
     },
     getOrderDetails: async (orderId) => {
-        const response = await fetch(`${API_BASE_URL}/get_order_details`, {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ order_id: orderId }),
-        });
+        // GET so the browser can cache the response and revalidate it with its ETag
+        const response = await fetch(`${API_BASE_URL}/orders/${encodeURIComponent(orderId)}`, { headers: authHeaders() });
         return response.json();
     },
+    // Server-sent status changes: of one order, or (for the kitchen) of every order.
+    // Calls onEvent({ order_id, status, at }) for each; returns a function that stops listening.
+    subscribeToOrderEvents: (orderId, onEvent) => {
+        const path = orderId ? `/orders/${encodeURIComponent(orderId)}/events` : '/kitchen/events';
+        // EventSource can't send headers, so the token goes in the query string
+        const source = new EventSource(`${API_BASE_URL}${path}?access_token=${encodeURIComponent(authToken || '')}`);
+        source.addEventListener('order_status', (message) => onEvent(JSON.parse(message.data)));
+        return () => source.close();
+    },
     updateOrderStatus: async (orderId, newStatus) => {
         const response = await fetch(`${API_BASE_URL}/update_order_status`, {
             method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
+            headers: authHeaders({ 'Content-Type': 'application/json' }),
             body: JSON.stringify({ order_id: orderId, new_status: newStatus }),
         });
         return response.json();
@@ -700,45 +711,28 @@ const CartSidebar = () => {
             return;
         }
 
-        showNotification(translations["sending_payment_request"][language], 'info');
+        try {
+            // Save the order first: the server prices it, and the STK push charges that saved total
+            const orderItemsForDb = cart.map(item => ({ id: item.id, quantity: item.quantity }));
+            const saveOrderResponse = await api.saveOrder(
+                orderItemsForDb,
+                null // Personalization details are handled separately if submitted
+            );
+
+            if (saveOrderResponse.success) {
+                const orderIdDb = saveOrderResponse.order_id;
+                setLastOrderId(orderIdDb); // Store for immediate receipt viewing
+                setCurrentOrderId(orderIdDb); // Update global current order ID
+                showNotification(`Order saved successfully! Order ID: ${orderIdDb}`, 'success');
 
-        const accountReference = `HOTELPAYMENT-${Date.now()}`; // Unique reference for M-Pesa
-        const transactionDesc = `Payment for Hotel Kitchen Order ${accountReference}`;
-        const amount = parseInt(totalCost, 10);
+                showNotification(translations["sending_payment_request"][language], 'info');
+                const mpesaResponse = await api.initiateMpesaStkPush(orderIdDb, mpesaPhone);
 
-        try {
-            const mpesaResponse = await api.initiateMpesaStkPush(mpesaPhone, amount, accountReference, transactionDesc);
-
-            if (mpesaResponse && mpesaResponse.CheckoutRequestID) {
-                const checkoutRequestId = mpesaResponse.CheckoutRequestID;
-                showNotification(translations["payment_success"][language], 'success');
-
-                const orderItemsForDb = cart.map(item => ({
-                    id: item.id,
-                    name: item.name,
-                    quantity: item.quantity,
-                    price: item.price,
-                }));
-
-                const saveOrderResponse = await api.saveOrder(
-                    user.email,
-                    orderItemsForDb,
-                    totalCost,
-                    null, // Personalization details are handled separately if submitted
-                    checkoutRequestId
-                );
-
-                if (saveOrderResponse.success) {
-                    const orderIdDb = saveOrderResponse.order_id;
-                    setLastOrderId(orderIdDb); // Store for immediate receipt viewing
-                    setCurrentOrderId(orderIdDb); // Update global current order ID
-                    showNotification(`Order saved successfully! Order ID: ${orderIdDb}`, 'success');
-
-                    // Fetch order details for receipt generation
-                    const [orderDetailsForReceipt, orderItemsForReceipt] = await Promise.all([
-                        api.getOrderDetails(orderIdDb).then(res => res.order),
-                        api.getOrderDetails(orderIdDb).then(res => res.items)
-                    ]);
+                if (mpesaResponse && mpesaResponse.CheckoutRequestID) {
+                    showNotification(translations["payment_success"][language], 'success');
+
+                    // Fetch order details for receipt generation (order and items in one request)
+                    const { order: orderDetailsForReceipt, items: orderItemsForReceipt } = await api.getOrderDetails(orderIdDb);
 
                     if (orderDetailsForReceipt) {
                         setReceiptContent(generateReceiptContent(orderDetailsForReceipt, orderItemsForReceipt));
@@ -750,22 +744,22 @@ const CartSidebar = () => {
                     // and might be used for subsequent orders if not explicitly reset.
                     // If you want to clear them, add: setPersonalizationDetails({});
                 } else {
-                    showNotification(`Failed to save order to database: ${saveOrderResponse.error}`, 'error');
-                    // Revert stock if order saving failed
-                    const revertedMealsData = [...mealsData];
-                    cart.forEach(cartItem => {
-                        const mealIndex = revertedMealsData.findIndex(meal => meal.id === cartItem.id);
-                        if (mealIndex !== -1) {
-                            revertedMealsData[mealIndex].stock += cartItem.quantity;
-                        }
-                    });
-                    setMealsData(revertedMealsData);
-                    showNotification("Stock reverted due to failed order save.", 'warning');
+                    const errorMessage = mpesaResponse.errorMessage || "Unknown error";
+                    showNotification(translations["payment_failed"][language].replace('{error_message}', errorMessage), 'error');
+                    showNotification("Please check your M-Pesa phone for prompts or try again.", 'info');
                 }
             } else {
-                const errorMessage = mpesaResponse.errorMessage || "Unknown error";
-                showNotification(translations["payment_failed"][language].replace('{error_message}', errorMessage), 'error');
-                showNotification("Please check your M-Pesa phone for prompts or try again.", 'info');
+                showNotification(`Failed to save order to database: ${saveOrderResponse.error}`, 'error');
+                // Revert stock if order saving failed
+                const revertedMealsData = [...mealsData];
+                cart.forEach(cartItem => {
+                    const mealIndex = revertedMealsData.findIndex(meal => meal.id === cartItem.id);
+                    if (mealIndex !== -1) {
+                        revertedMealsData[mealIndex].stock += cartItem.quantity;
+                    }
+                });
+                setMealsData(revertedMealsData);
+                showNotification("Stock reverted due to failed order save.", 'warning');
             }
         } catch (error) {
             console.error("Checkout error:", error);
@@ -959,7 +953,7 @@ const OrderHistory = () => {
             if (user && user.email) {
                 setLoading(true);
                 try {
-                    const data = await api.getUserOrders(user.email);
+                    const data = await api.getUserOrders();
                     setOrders(data || []);
                 } catch (error) {
                     console.error("Error fetching orders:", error);
@@ -973,13 +967,25 @@ const OrderHistory = () => {
         fetchOrders();
     }, [user, showNotification]);
 
+    // The kitchen sees status changes as they happen, without re-fetching
+    useEffect(() => {
+        if (!user || user.role !== "admin") {
+            return undefined;
+        }
+        return api.subscribeToOrderEvents(null, (event) => {
+            setOrders(previous => previous.map(order =>
+                order.order_id === event.order_id ? { ...order, status: event.status } : order
+            ));
+        });
+    }, [user]);
+
     const handleUpdateStatus = async (orderId, newStatus) => {
         try {
             const response = await api.updateOrderStatus(orderId, newStatus);
             if (response.success) {
                 showNotification(translations["status_updated_success"][language], 'success');
                 // Re-fetch orders to update the list
-                const data = await api.getUserOrders(user.email);
+                const data = await api.getUserOrders();
                 setOrders(data || []);
             } else {
                 showNotification(`Failed to update status: ${response.error}`, 'error');
@@ -1066,7 +1072,10 @@ const OrderHistory = () => {
                                                 onChange={(e) => handleUpdateStatus(order.order_id, e.target.value)}
                                                 className="w-full p-2 border border-gray-300 rounded-md mb-2"
                                             >
-                                                {['Pending Payment Confirmation', 'Paid', 'Processing', 'Ready', 'Delivered', 'Cancelled', 'Payment Failed'].map(status => (
+                                                {!KITCHEN_STATUSES.includes(order.status) && (
+                                                    <option value={order.status} disabled>{order.status}</option>
+                                                )}
+                                                {KITCHEN_STATUSES.map(status => (
                                                     <option key={status} value={status}>{status}</option>
                                                 ))}
                                             </select>
@@ -1135,6 +1144,19 @@ const TrackOrder = () => {
     const [showReceiptModal, setShowReceiptModal] = useState(false);
 
 
+    // Push status changes of the tracked order instead of waiting for another "Track"
+    const trackedOrderId = trackedOrderDetails ? trackedOrderDetails.order_id : null;
+    useEffect(() => {
+        if (!trackedOrderId) {
+            return undefined;
+        }
+        return api.subscribeToOrderEvents(trackedOrderId, (event) => {
+            setTrackedOrderDetails(previous => previous && previous.order_id === event.order_id
+                ? { ...previous, status: event.status }
+                : previous);
+        });
+    }, [trackedOrderId]);
+
     const handleTrackOrder = async () => {
         if (!trackOrderIdInput) {
             showNotification("Please enter an Order ID to track.", 'warning');
@@ -1270,7 +1292,10 @@ const TrackOrder = () => {
                                 onChange={(e) => handleUpdateStatus(trackedOrderDetails.order_id, e.target.value)}
                                 className="w-full p-2 border border-gray-300 rounded-md mb-2"
                             >
-                                {['Pending Payment Confirmation', 'Paid', 'Processing', 'Ready', 'Delivered', 'Cancelled', 'Payment Failed'].map(status => (
+                                {!KITCHEN_STATUSES.includes(trackedOrderDetails.status) && (
+                                    <option value={trackedOrderDetails.status} disabled>{trackedOrderDetails.status}</option>
+                                )}
+                                {KITCHEN_STATUSES.map(status => (
                                     <option key={status} value={status}>{status}</option>
                                 ))}
                             </select>
@@ -1382,12 +1407,14 @@ const App = () => {
         try {
             const data = await api.login(email, password);
             if (data.success) {
+                api.setAuthToken(data.token);
                 setUser({ email: data.email, role: data.role });
                 return true;
             } else {
                 // If login fails, try to register
                 const registerData = await api.register(email, password);
                 if (registerData.success) {
+                    api.setAuthToken(registerData.token);
                     setUser({ email: registerData.email, role: registerData.role });
                     return true;
                 } else {
@@ -1402,6 +1429,7 @@ const App = () => {
     };
 
     const logout = () => {
+        api.setAuthToken(null);
         setUser(null);
         setCart([]);
         setMealsData(initialMealsData); // Reset meals data on logout
@@ -0,0 +1,41 @@
+# app_resources.py
+# Process-wide objects shared by Hotel.py and prototype.py.
+#
+# Streamlit re-runs the app script on every interaction, but imported modules
+# stay loaded, and st.cache_resource getters build their object once per
+# process. Anything slow to build (catalogs, stores, connection pools, HTTP
+# sessions) is created here, so a rerun of the app script only renders.
+from concurrent.futures import ThreadPoolExecutor
+
+import streamlit as st
+from decouple import config
+
+import db
+from cart import CartStore
+from image_cache import ImageCache
+from menu_catalog import MenuCatalog
+
+
+@st.cache_resource
+def get_cart_store():
+    """Returns the cart store shared by all sessions, or None if CART_STORE_PATH is not set."""
+    path = config("CART_STORE_PATH", default="")
+    return CartStore(path) if path else None
+
+
+@st.cache_resource
+def get_menu_catalog():
+    """Returns the database-backed menu, cached per process (menu_catalog.py)."""
+    return MenuCatalog(db.get_connection, check_interval=config("MENU_CHECK_INTERVAL", default=5.0, cast=float))
+
+
+@st.cache_resource
+def get_image_cache():
+    """Returns the local WebP thumbnails of the menu photos, if `python image_cache.py prefetch` has been run."""
+    return ImageCache()
+
+
+@st.cache_resource
+def get_payment_executor():
+    """Returns the thread pool that sends STK Push requests in the background (mpesa.request_order_payment)."""
+    return ThreadPoolExecutor(max_workers=config("PAYMENT_WORKERS", default=4, cast=int), thread_name_prefix="stk-push")
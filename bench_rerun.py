@@ -0,0 +1,74 @@
+# bench_rerun.py
+# Times how long one rerun of a Streamlit app script takes.
+#
+# Runs the script headless with streamlit.testing.v1.AppTest, once to warm up
+# process-wide caches, then `--runs` more times, and prints the wall time per
+# rerun. Pass a git revision to compare the same script as it was then:
+#
+#   python bench_rerun.py Hotel.py
+#   python bench_rerun.py Hotel.py --rev HEAD~1
+#
+# Only the script is taken from the revision; it imports the modules of the
+# working tree. Without a reachable database the menu fails to load and the
+# page renders without it, so only compare revisions that load the menu the
+# same way (from user-017 on, the database-backed catalog).
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from streamlit.testing.v1 import AppTest
+
+
+def script_at(path, rev):
+    """Writes `path` as of git revision `rev` next to the original and returns the copy's path."""
+    source = subprocess.run(["git", "show", f"{rev}:{path}"], check=True, capture_output=True, text=True).stdout
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, copy_path = tempfile.mkstemp(prefix=".bench_", suffix=".py", dir=directory)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(source)
+    return copy_path
+
+
+def time_reruns(path, runs, timeout):
+    """Returns the wall time in seconds of each of `runs` reruns, after one warm-up run."""
+    app = AppTest.from_file(path, default_timeout=timeout)
+    app.run()
+    if app.exception:
+        raise RuntimeError(f"{path} raised: {app.exception[0].message}")
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        app.run()
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time the reruns of a Streamlit app script.")
+    parser.add_argument("script", nargs="?", default="Hotel.py")
+    parser.add_argument("--rev", help="benchmark the script as of this git revision instead of the working tree")
+    parser.add_argument("--runs", type=int, default=50)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    args = parser.parse_args(argv)
+
+    path = script_at(args.script, args.rev) if args.rev else args.script
+    try:
+        timings = time_reruns(path, args.runs, args.timeout)
+    finally:
+        if args.rev:
+            os.remove(path)
+
+    label = f"{args.script}@{args.rev}" if args.rev else args.script
+    print(f"{label}: {len(timings)} reruns, "
+          f"median {statistics.median(timings) * 1000:.1f} ms, "
+          f"p90 {statistics.quantiles(timings, n=10)[-1] * 1000:.1f} ms, "
+          f"max {max(timings) * 1000:.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,226 @@
+# callback_queue.py
+# A small durable work queue backed by a local SQLite file, plus a pool of
+# worker threads that drain it in batches.
+#
+# The callback handler uses it to acknowledge M-Pesa callbacks as soon as they
+# are safely on disk, and apply them to MySQL in the background.
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class CallbackQueue:
+    """A durable FIFO of JSON payloads stored in SQLite.
+
+    Claimed items are leased for `lease_seconds`; if the worker holding them
+    dies before acknowledging, they become available again. Items that fail
+    `max_attempts` times are moved to the dead_letters table. Safe to use from
+    several threads and processes.
+    """
+
+    def __init__(self, path, lease_seconds=60, max_attempts=5):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS queue ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " payload TEXT NOT NULL,"
+            " enqueued_at REAL NOT NULL,"
+            " available_at REAL NOT NULL,"
+            " attempts INTEGER NOT NULL DEFAULT 0)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_queue_available ON queue (available_at, id)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS dead_letters ("
+            " id INTEGER PRIMARY KEY,"
+            " payload TEXT NOT NULL,"
+            " enqueued_at REAL NOT NULL,"
+            " failed_at REAL NOT NULL,"
+            " attempts INTEGER NOT NULL)"
+        )
+        conn.commit()
+
+    def _conn(self):
+        """Returns this thread's SQLite connection."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            # FULL makes every committed enqueue survive a power cut, which is
+            # what lets us acknowledge the callback before it is processed.
+            conn.execute("PRAGMA synchronous=FULL")
+            self._local.conn = conn
+        return conn
+
+    def enqueue(self, payload):
+        """Durably stores a payload. Returns its queue id."""
+        now = time.time()
+        cursor = self._conn().execute(
+            "INSERT INTO queue (payload, enqueued_at, available_at) VALUES (?, ?, ?)",
+            (json.dumps(payload), now, now)
+        )
+        return cursor.lastrowid
+
+    def claim(self, limit):
+        """Leases up to `limit` available items. Returns [(id, payload)] oldest first."""
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(
+                "SELECT id, payload FROM queue WHERE available_at <= ? ORDER BY id LIMIT ?", (now, limit)
+            ).fetchall()
+            if rows:
+                conn.executemany(
+                    "UPDATE queue SET available_at = ?, attempts = attempts + 1 WHERE id = ?",
+                    [(now + self.lease_seconds, row[0]) for row in rows]
+                )
+            conn.execute("COMMIT")
+        except sqlite3.Error:
+            conn.execute("ROLLBACK")
+            raise
+        return [(row[0], json.loads(row[1])) for row in rows]
+
+    def ack(self, ids):
+        """Removes processed items."""
+        self._conn().executemany("DELETE FROM queue WHERE id = ?", [(i,) for i in ids])
+
+    def retry(self, ids, delay):
+        """Makes failed items available again after an exponential backoff starting at `delay` seconds.
+
+        Items that have used up their attempts are moved to dead_letters instead.
+        """
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for item_id in ids:
+                conn.execute(
+                    "INSERT INTO dead_letters (id, payload, enqueued_at, failed_at, attempts) "
+                    "SELECT id, payload, enqueued_at, ?, attempts FROM queue WHERE id = ? AND attempts >= ?",
+                    (now, item_id, self.max_attempts)
+                )
+                conn.execute("DELETE FROM queue WHERE id = ? AND attempts >= ?", (item_id, self.max_attempts))
+                conn.execute(
+                    "UPDATE queue SET available_at = ? + ? * (1 << MIN(attempts - 1, 6)) WHERE id = ?",
+                    (now, delay, item_id)
+                )
+            conn.execute("COMMIT")
+        except sqlite3.Error:
+            conn.execute("ROLLBACK")
+            raise
+
+    def depth(self):
+        """Returns (items waiting, dead letters)."""
+        conn = self._conn()
+        waiting = conn.execute("SELECT COUNT(*) FROM queue").fetchone()[0]
+        dead = conn.execute("SELECT COUNT(*) FROM dead_letters").fetchone()[0]
+        return waiting, dead
+
+
+class QueueWorkerPool:
+    """Threads that drain a CallbackQueue in batches.
+
+    `handle_batch` receives a list of payloads and must either process all of
+    them or raise. It may return the positions of payloads it could not
+    process yet; those are put back in the queue with backoff, like failed
+    ones. When a batch fails it is split in halves and each half is
+    handled again, so one bad item only sends itself back to the queue (and,
+    eventually, to the dead letters); the rest of the batch is acknowledged.
+    Exceptions of the `transient_errors` types (e.g. the database being down)
+    are not worth splitting over: the whole batch is retried with backoff.
+    """
+
+    def __init__(self, queue, handle_batch, workers=2, batch_size=50, poll_interval=0.2, retry_delay=2.0,
+                 transient_errors=()):
+        self.queue = queue
+        self.handle_batch = handle_batch
+        self.transient_errors = tuple(transient_errors)
+        self.workers = workers
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.retry_delay = retry_delay
+        self._stop = threading.Event()
+        self._threads = []
+        self.processed = 0
+        self.deferred = 0
+        self.failed_batches = 0
+        self.failed_items = 0
+        self._stats_lock = threading.Lock()
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"callback-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                batch = self.queue.claim(self.batch_size)
+            except sqlite3.Error as err:
+                logger.error(f"Error claiming from callback queue: {err}")
+                self._stop.wait(self.retry_delay)
+                continue
+            if not batch:
+                self._stop.wait(self.poll_interval)
+                continue
+
+            done, deferred, failed = self._handle(batch)
+            try:
+                if done:
+                    self.queue.ack(done)
+                if deferred or failed:
+                    self.queue.retry(deferred + failed, self.retry_delay)
+            except sqlite3.Error as err:
+                # Unacknowledged items become available again when their lease expires
+                logger.error(f"Error acknowledging or rescheduling queued callbacks: {err}")
+            with self._stats_lock:
+                self.processed += len(done)
+                self.deferred += len(deferred)
+                self.failed_items += len(failed)
+                if failed:
+                    self.failed_batches += 1
+
+    def _handle(self, batch):
+        """Handles [(id, payload)], bisecting on failure. Returns (processed ids, deferred ids, failed ids)."""
+        ids = [item_id for item_id, _ in batch]
+        try:
+            deferred = {ids[i] for i in self.handle_batch([payload for _, payload in batch]) or ()}
+            return [i for i in ids if i not in deferred], [i for i in ids if i in deferred], []
+        except self.transient_errors as e:
+            logger.error(f"Error processing {len(ids)} queued callback(s), retrying later: {e}")
+            return [], [], ids
+        except Exception as e:
+            if len(batch) == 1:
+                logger.error(f"Error processing queued callback {ids[0]}: {e}", exc_info=True)
+                return [], [], ids
+            logger.warning(f"Error processing {len(ids)} queued callback(s), retrying them in halves: {e}")
+        middle = len(batch) // 2
+        first, second = self._handle(batch[:middle]), self._handle(batch[middle:])
+        return tuple(a + b for a, b in zip(first, second))
+
+    def stats(self):
+        waiting, dead = self.queue.depth()
+        with self._stats_lock:
+            return {
+                "workers": self.workers,
+                "processed": self.processed,
+                "deferred": self.deferred,
+                "failed_batches": self.failed_batches,
+                "failed_items": self.failed_items,
+                "waiting": waiting,
+                "dead_letters": dead,
+            }
@@ -0,0 +1,151 @@
+# cart.py
+# The shopping cart used by the Streamlit app.
+#
+# Lines are kept in a dict keyed by meal id, so adding, changing or removing a
+# meal is a single lookup, and the cart total is updated as lines change
+# instead of being re-summed on every render. A cart can be attached to a
+# CartStore (a local SQLite file shared by all app workers), which keeps a
+# signed-in customer's cart across worker restarts and browser sessions.
+import json
+import sqlite3
+import threading
+import time
+
+
+class CartLine:
+    """One meal in the cart. Supports item['key'] access, like the dicts save_order() takes."""
+
+    __slots__ = ("id", "name", "price", "quantity")
+
+    def __init__(self, id, name, price, quantity):
+        self.id = id
+        self.name = name
+        self.price = price
+        self.quantity = quantity
+
+    def __getitem__(self, key):
+        return getattr(self, key)
+
+    @property
+    def subtotal(self):
+        return self.price * self.quantity
+
+
+class Cart:
+    """Cart lines keyed by meal id, in the order they were first added, with a running total."""
+
+    def __init__(self):
+        self._lines = {}
+        self._total = 0.0
+        self._store = None
+        self._cart_id = None
+
+    def __len__(self):
+        return len(self._lines)
+
+    def __iter__(self):
+        return iter(list(self._lines.values()))
+
+    @property
+    def total(self):
+        return round(self._total, 2)
+
+    def add(self, meal_id, name, price, quantity):
+        """Adds `quantity` of a meal, merging with an existing line."""
+        line = self._lines.get(meal_id)
+        if line is None:
+            self._lines[meal_id] = CartLine(meal_id, name, price, quantity)
+        else:
+            line.quantity += quantity
+        self._total += price * quantity
+        self._persist()
+
+    def set_quantity(self, meal_id, quantity):
+        """Changes a line's quantity; 0 removes it."""
+        line = self._lines.get(meal_id)
+        if line is None:
+            return
+        if quantity <= 0:
+            self.remove(meal_id)
+            return
+        self._total += line.price * (quantity - line.quantity)
+        line.quantity = quantity
+        self._persist()
+
+    def remove(self, meal_id):
+        line = self._lines.pop(meal_id, None)
+        if line is not None:
+            self._total -= line.subtotal
+            if not self._lines:
+                self._total = 0.0  # Drop accumulated float rounding
+            self._persist()
+
+    def clear(self):
+        self._lines.clear()
+        self._total = 0.0
+        self._persist()
+
+    def attach(self, store, cart_id):
+        """Binds the cart to `cart_id` in `store` (e.g. after sign-in).
+
+        Lines saved under that id earlier are merged with the ones already in
+        this cart, and every later change is saved to the store.
+        """
+        current = list(self._lines.values())
+        self._store, self._cart_id = None, None
+        self._lines.clear()
+        self._total = 0.0
+        for row in store.load(cart_id):
+            self.add(row['id'], row['name'], row['price'], row['quantity'])
+        for line in current:
+            self.add(line.id, line.name, line.price, line.quantity)
+        self._store, self._cart_id = store, cart_id
+        self._persist()
+
+    def _persist(self):
+        if self._store is not None:
+            self._store.save(self._cart_id, [
+                {"id": line.id, "name": line.name, "price": line.price, "quantity": line.quantity}
+                for line in self._lines.values()
+            ])
+
+
+class CartStore:
+    """Carts saved as JSON rows in a SQLite file, shared between app workers on this machine."""
+
+    def __init__(self, path, max_age_days=30):
+        self.path = path
+        self.max_age_days = max_age_days
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS carts ("
+            " cart_id TEXT PRIMARY KEY,"
+            " lines TEXT NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        # Forget carts abandoned long ago
+        conn.execute("DELETE FROM carts WHERE updated_at < ?", (time.time() - max_age_days * 86400,))
+
+    def _conn(self):
+        """Returns this thread's SQLite connection."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            self._local.conn = conn
+        return conn
+
+    def load(self, cart_id):
+        """Returns the saved lines of a cart as a list of dicts (empty if there is none)."""
+        row = self._conn().execute("SELECT lines FROM carts WHERE cart_id = ?", (cart_id,)).fetchone()
+        return json.loads(row[0]) if row else []
+
+    def save(self, cart_id, lines):
+        if lines:
+            self._conn().execute(
+                "INSERT OR REPLACE INTO carts (cart_id, lines, updated_at) VALUES (?, ?, ?)",
+                (cart_id, json.dumps(lines), time.time())
+            )
+        else:
+            self._conn().execute("DELETE FROM carts WHERE cart_id = ?", (cart_id,))
@@ -0,0 +1,161 @@
+# daraja_stub.py
+# A local stand-in for the parts of Safaricom's Daraja API this app calls:
+# OAuth, STK Push and STK Push Query. Point DARAJA_BASE_URL at it to run the
+# checkout, the callback handler and the reconciler (reconciler.py) offline.
+#
+# An STK push is "processing" for --processing-seconds, then paid or
+# cancelled (--paid-ratio, decided from the CheckoutRequestID so it is the
+# same answer every time). Its callback is POSTed to the request's
+# CallBackURL, except for a --drop-callbacks share of them, which are the
+# lost callbacks the reconciler has to settle. Query IDs the stub has never
+# seen are answered the same way, as if pushed long ago.
+#
+# Access tokens last --token-lifetime seconds; pushes and queries with an
+# unknown or expired token get Daraja's 401. Two stub-only routes help tests:
+# GET /stub/stats counts the calls per API, and POST /stub/revoke_tokens
+# invalidates every token issued so far.
+#
+#   python daraja_stub.py --port 5055 --drop-callbacks 0.3
+#   DARAJA_BASE_URL=http://localhost:5055 python reconciler.py
+import argparse
+import hashlib
+import logging
+import threading
+import time
+import uuid
+from datetime import datetime
+
+import requests
+from flask import Flask, jsonify, request
+
+logger = logging.getLogger(__name__)
+
+PROCESSING = {"errorCode": "500.001.1001", "errorMessage": "The transaction is being processed"}
+INVALID_TOKEN = {"errorCode": "404.001.03", "errorMessage": "Invalid Access Token"}
+
+
+def create_app(processing_seconds=10.0, paid_ratio=0.8, drop_callbacks=0.0, token_lifetime=3599):
+    app = Flask(__name__)
+    pushed_at = {}  # CheckoutRequestID -> time of the STK push
+    tokens = {}  # access token -> time.monotonic() it expires at
+    calls = {"oauth": 0, "stk_push": 0, "stk_push_query": 0}
+    lock = threading.Lock()
+
+    def count(api):
+        with lock:
+            calls[api] += 1
+
+    def authorized():
+        token = request.headers.get("Authorization", "").removeprefix("Bearer ")
+        with lock:
+            return tokens.get(token, 0) > time.monotonic()
+
+    def fraction(checkout_request_id, salt):
+        digest = hashlib.sha256(f"{salt}:{checkout_request_id}".encode()).digest()
+        return int.from_bytes(digest[:4], "big") / 2 ** 32
+
+    def outcome(checkout_request_id):
+        """Returns None while processing, else (result_code, result_desc)."""
+        started = pushed_at.get(checkout_request_id)
+        if started is not None and time.monotonic() - started < processing_seconds:
+            return None
+        if fraction(checkout_request_id, "paid") < paid_ratio:
+            return 0, "The service request is processed successfully."
+        return 1032, "Request cancelled by user"
+
+    def send_callback(callback_url, checkout_request_id, amount, phone_number):
+        time.sleep(processing_seconds)
+        if fraction(checkout_request_id, "drop") < drop_callbacks:
+            logger.info(f"Dropping the callback for {checkout_request_id}")
+            return
+        result_code, result_desc = outcome(checkout_request_id)
+        callback = {"MerchantRequestID": f"stub-{checkout_request_id}", "CheckoutRequestID": checkout_request_id,
+                    "ResultCode": result_code, "ResultDesc": result_desc}
+        if result_code == 0:
+            callback["CallbackMetadata"] = {"Item": [
+                {"Name": "Amount", "Value": amount},
+                {"Name": "MpesaReceiptNumber", "Value": "STUB" + checkout_request_id[-8:].upper()},
+                {"Name": "TransactionDate", "Value": int(datetime.now().strftime("%Y%m%d%H%M%S"))},
+                {"Name": "PhoneNumber", "Value": phone_number},
+            ]}
+        try:
+            requests.post(callback_url, json={"Body": {"stkCallback": callback}}, timeout=10)
+        except requests.exceptions.RequestException as e:
+            logger.warning(f"Callback for {checkout_request_id} failed: {e}")
+
+    @app.route('/oauth/v1/generate', methods=['GET'])
+    def generate_token():
+        count("oauth")
+        token = "stub-" + uuid.uuid4().hex
+        with lock:
+            tokens[token] = time.monotonic() + token_lifetime
+        return jsonify({"access_token": token, "expires_in": str(token_lifetime)})
+
+    @app.route('/mpesa/stkpush/v1/processrequest', methods=['POST'])
+    def stk_push():
+        count("stk_push")
+        if not authorized():
+            return jsonify(INVALID_TOKEN), 401
+        data = request.get_json(silent=True) or {}
+        checkout_request_id = "ws_CO_stub_" + uuid.uuid4().hex[:16]
+        pushed_at[checkout_request_id] = time.monotonic()
+        if data.get("CallBackURL"):
+            threading.Thread(
+                target=send_callback,
+                args=(data["CallBackURL"], checkout_request_id, data.get("Amount"), data.get("PhoneNumber")),
+                daemon=True
+            ).start()
+        return jsonify({
+            "MerchantRequestID": f"stub-{checkout_request_id}",
+            "CheckoutRequestID": checkout_request_id,
+            "ResponseCode": "0",
+            "ResponseDescription": "Success. Request accepted for processing",
+            "CustomerMessage": "Success. Request accepted for processing",
+        })
+
+    @app.route('/mpesa/stkpushquery/v1/query', methods=['POST'])
+    def stk_push_query():
+        count("stk_push_query")
+        if not authorized():
+            return jsonify(INVALID_TOKEN), 401
+        checkout_request_id = (request.get_json(silent=True) or {}).get("CheckoutRequestID")
+        if not checkout_request_id:
+            return jsonify({"errorCode": "400.002.02", "errorMessage": "Bad Request - Invalid CheckoutRequestID"}), 400
+        result = outcome(checkout_request_id)
+        if result is None:
+            return jsonify(PROCESSING), 500
+        return jsonify({
+            "ResponseCode": "0",
+            "ResponseDescription": "The service request has been accepted successsfully",
+            "MerchantRequestID": f"stub-{checkout_request_id}",
+            "CheckoutRequestID": checkout_request_id,
+            "ResultCode": str(result[0]),
+            "ResultDesc": result[1],
+        })
+
+    @app.route('/stub/stats', methods=['GET'])
+    def stats():
+        with lock:
+            return jsonify(dict(calls))
+
+    @app.route('/stub/revoke_tokens', methods=['POST'])
+    def revoke_tokens():
+        with lock:
+            tokens.clear()
+        return jsonify({"revoked": True})
+
+    return app
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Serve a local stand-in for the Daraja API.")
+    parser.add_argument("--port", type=int, default=5055)
+    parser.add_argument("--processing-seconds", type=float, default=10.0, help="how long a push stays unanswered")
+    parser.add_argument("--paid-ratio", type=float, default=0.8, help="share of pushes that end up paid")
+    parser.add_argument("--drop-callbacks", type=float, default=0.0, help="share of callbacks never sent")
+    parser.add_argument("--token-lifetime", type=int, default=3599, help="seconds an access token is valid")
+    args = parser.parse_args()
+    create_app(args.processing_seconds, args.paid_ratio, args.drop_callbacks, args.token_lifetime).run(
+        host='0.0.0.0', port=args.port, threaded=True
+    )
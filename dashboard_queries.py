@@ -0,0 +1,183 @@
+# dashboard_queries.py
+# Builds the parameterized, pre-aggregated SQL behind the dashboard charts, so
+# only the aggregates a chart needs leave MySQL.
+#
+# Selections without a product or customer filter are answered from the hourly
+# rollup tables (see rollups.py); product/customer drill-downs aggregate the
+# raw orders and order_items tables.
+from datetime import timedelta
+
+import pandas as pd
+
+# SQL expressions truncating a DATETIME column to the start of its period.
+# Weeks start on Monday, like pandas' weekly periods.
+GRANULARITY_BUCKETS = {
+    "hour": "TIMESTAMP(DATE({col}), MAKETIME(HOUR({col}), 0, 0))",
+    "day": "DATE({col})",
+    "week": "DATE_SUB(DATE({col}), INTERVAL WEEKDAY({col}) DAY)",
+    "month": "DATE_SUB(DATE({col}), INTERVAL DAYOFMONTH({col}) - 1 DAY)",
+    "year": "MAKEDATE(YEAR({col}), 1)",
+}
+
+
+def where(clauses):
+    return ("WHERE " + " AND ".join(clauses)) if clauses else ""
+
+
+class DashboardQuery:
+    """The dashboard's current filter selection, turned into SQL.
+
+    `product` is a meal name and `customer` a user email (None means all);
+    `start_date`/`end_date` are inclusive dates (None means unbounded). Pass
+    `allow_rollups=False` when the rollup tables are not up to date. Each
+    query method returns (sql, params); pass them to `run()`.
+    """
+
+    def __init__(self, product=None, customer=None, start_date=None, end_date=None, allow_rollups=True):
+        self.product = product
+        self.customer = customer
+        self.start_date = start_date
+        self.end_date = end_date
+        self.allow_rollups = allow_rollups
+
+    @property
+    def uses_rollups(self):
+        """True if the selection can be answered from the hourly rollups."""
+        return self.allow_rollups and self.product is None and self.customer is None
+
+    def with_dates(self, start_date, end_date):
+        """Returns the same product/customer selection over a different date range."""
+        return DashboardQuery(self.product, self.customer, start_date, end_date, self.allow_rollups)
+
+    def _date_filters(self, column):
+        clauses, params = [], []
+        if self.start_date is not None:
+            clauses.append(f"{column} >= %s")
+            params.append(self.start_date)
+        if self.end_date is not None:
+            clauses.append(f"{column} < %s")
+            params.append(self.end_date + timedelta(days=1))
+        return clauses, params
+
+    def _order_filters(self):
+        """Filters on orders aliased as `o`: orders of the customer that contain the product."""
+        clauses, params = self._date_filters("o.order_date")
+        if self.customer is not None:
+            clauses.append("o.user_email = %s")
+            params.append(self.customer)
+        if self.product is not None:
+            clauses.append("EXISTS (SELECT 1 FROM order_items pf WHERE pf.order_id = o.order_id AND pf.meal_name = %s)")
+            params.append(self.product)
+        return clauses, params
+
+    def _item_filters(self):
+        """Filters on order_items `oi` joined to orders `o`: only the selected product's lines."""
+        clauses, params = self._date_filters("o.order_date")
+        if self.customer is not None:
+            clauses.append("o.user_email = %s")
+            params.append(self.customer)
+        if self.product is not None:
+            clauses.append("oi.meal_name = %s")
+            params.append(self.product)
+        return clauses, params
+
+    def totals(self):
+        """One row: revenue, order_count, customer_count."""
+        if self.uses_rollups:
+            clauses, params = self._date_filters("hour_start")
+            sql = (
+                f"SELECT "
+                f"(SELECT COALESCE(SUM(revenue), 0) FROM sales_rollup_hourly {where(clauses)}) AS revenue, "
+                f"(SELECT COALESCE(SUM(order_count), 0) FROM sales_rollup_hourly {where(clauses)}) AS order_count, "
+                f"(SELECT COUNT(DISTINCT user_email) FROM customer_rollup_hourly {where(clauses)}) AS customer_count"
+            )
+            return sql, tuple(params * 3)
+        clauses, params = self._order_filters()
+        sql = (
+            f"SELECT COALESCE(SUM(o.total_amount), 0) AS revenue, COUNT(*) AS order_count, "
+            f"COUNT(DISTINCT o.user_email) AS customer_count FROM orders o {where(clauses)}"
+        )
+        return sql, tuple(params)
+
+    def revenue_trend(self, granularity):
+        """Rows of (period, revenue) at the given granularity, oldest first."""
+        bucket_template = GRANULARITY_BUCKETS.get(granularity, GRANULARITY_BUCKETS["day"])
+        if self.uses_rollups:
+            clauses, params = self._date_filters("hour_start")
+            bucket = bucket_template.format(col="hour_start")
+            sql = f"SELECT {bucket} AS period, SUM(revenue) AS revenue FROM sales_rollup_hourly {where(clauses)} GROUP BY 1 ORDER BY 1"
+        else:
+            clauses, params = self._order_filters()
+            bucket = bucket_template.format(col="o.order_date")
+            sql = f"SELECT {bucket} AS period, SUM(o.total_amount) AS revenue FROM orders o {where(clauses)} GROUP BY 1 ORDER BY 1"
+        return sql, tuple(params)
+
+    def revenue_by_status(self):
+        """Rows of (status, revenue)."""
+        if self.uses_rollups:
+            clauses, params = self._date_filters("hour_start")
+            sql = f"SELECT status, SUM(revenue) AS revenue FROM sales_rollup_hourly {where(clauses)} GROUP BY status"
+        else:
+            clauses, params = self._order_filters()
+            sql = f"SELECT o.status, SUM(o.total_amount) AS revenue FROM orders o {where(clauses)} GROUP BY o.status"
+        return sql, tuple(params)
+
+    def revenue_by_product(self):
+        """Rows of (meal_name, quantity, revenue), highest revenue first."""
+        if self.uses_rollups:
+            clauses, params = self._date_filters("hour_start")
+            sql = (
+                f"SELECT MAX(meal_name) AS meal_name, SUM(quantity) AS quantity, SUM(revenue) AS revenue "
+                f"FROM meal_rollup_hourly {where(clauses)} GROUP BY meal_id ORDER BY revenue DESC"
+            )
+        else:
+            clauses, params = self._item_filters()
+            sql = (
+                f"SELECT oi.meal_name, SUM(oi.quantity) AS quantity, SUM(oi.quantity * oi.price_per_item) AS revenue "
+                f"FROM order_items oi JOIN orders o ON o.order_id = oi.order_id {where(clauses)} "
+                f"GROUP BY oi.meal_name ORDER BY revenue DESC"
+            )
+        return sql, tuple(params)
+
+    def repeat_customers(self):
+        """Rows of (user_email, order_count) for customers with more than one order, most orders first."""
+        if self.uses_rollups:
+            clauses, params = self._date_filters("hour_start")
+            sql = (
+                f"SELECT user_email, SUM(order_count) AS order_count FROM customer_rollup_hourly {where(clauses)} "
+                f"GROUP BY user_email HAVING SUM(order_count) > 1 ORDER BY order_count DESC"
+            )
+        else:
+            clauses, params = self._order_filters()
+            sql = (
+                f"SELECT o.user_email, COUNT(*) AS order_count FROM orders o {where(clauses)} "
+                f"GROUP BY o.user_email HAVING COUNT(*) > 1 ORDER BY order_count DESC"
+            )
+        return sql, tuple(params)
+
+    def sales_rows(self):
+        """The raw order item rows matching the selection, for export."""
+        clauses, params = self._item_filters()
+        sql = (
+            f"SELECT oi.order_id, oi.meal_id, oi.meal_name, oi.quantity, oi.price_per_item, "
+            f"o.order_date, o.user_email, o.total_amount, o.status, "
+            f"oi.quantity * oi.price_per_item AS item_total_price "
+            f"FROM order_items oi JOIN orders o ON o.order_id = oi.order_id {where(clauses)} ORDER BY o.order_date"
+        )
+        return sql, tuple(params)
+
+
+def product_options():
+    """Rows of meal_name: every product ordered so far, A to Z (for the product filter)."""
+    return "SELECT DISTINCT meal_name FROM order_items ORDER BY meal_name", ()
+
+
+def customer_options():
+    """Rows of user_email: every customer who has placed an order, A to Z (for the customer filter)."""
+    return "SELECT DISTINCT user_email FROM orders ORDER BY user_email", ()
+
+
+def run(conn, query):
+    """Runs a (sql, params) pair from DashboardQuery and returns a DataFrame."""
+    sql, params = query
+    return pd.read_sql(sql, conn, params=params)
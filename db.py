@@ -0,0 +1,173 @@
+# db.py
+# Shared MySQL connection pool used by the Streamlit app (Hotel.py) and the
+# M-Pesa callback handler. Connections are opened once per process and reused,
+# so a Streamlit rerun or a callback no longer pays a TCP + auth handshake.
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+import mysql.connector
+from mysql.connector import pooling
+from decouple import config
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (in seconds) of the checkout-wait histogram buckets.
+WAIT_BUCKETS = (0.001, 0.01, 0.1, 1.0, float("inf"))
+
+
+class PoolTimeoutError(mysql.connector.errors.PoolError):
+    """Raised when no pooled connection became free within the checkout timeout."""
+
+
+class ConnectionPool:
+    """A MySQL connection pool with checkout waiting, health checks and wait metrics.
+
+    mysql.connector's own pool raises immediately when it is exhausted; this
+    wrapper waits up to `checkout_timeout` seconds for a connection to be
+    returned instead. Connections that have been idle for longer than
+    `health_check_interval` seconds are pinged (and reconnected) before they
+    are handed out. Calling `close()` on a checked-out connection returns it
+    to the pool.
+    """
+
+    def __init__(self, pool_name="hotel_pool", pool_size=5, checkout_timeout=5.0,
+                 health_check_interval=30.0, **connect_args):
+        self.pool_size = pool_size
+        self.checkout_timeout = checkout_timeout
+        self.health_check_interval = health_check_interval
+        self._pool = pooling.MySQLConnectionPool(
+            pool_name=pool_name,
+            pool_size=pool_size,
+            pool_reset_session=True,
+            **connect_args
+        )
+        self._lock = threading.Lock()
+        self._last_checkout = {}  # id(raw connection) -> time of last checkout
+        self._stats = {
+            "checkouts": 0,
+            "timeouts": 0,
+            "health_check_failures": 0,
+            "wait_total_seconds": 0.0,
+            "wait_max_seconds": 0.0,
+            "wait_histogram": [0] * len(WAIT_BUCKETS),
+        }
+
+    def get_connection(self, timeout=None):
+        """Checks out a healthy connection, waiting up to `timeout` seconds for one to free up."""
+        timeout = self.checkout_timeout if timeout is None else timeout
+        started = time.monotonic()
+        delay = 0.005
+        while True:
+            try:
+                conn = self._pool.get_connection()
+            except mysql.connector.errors.PoolError:
+                pass  # Exhausted: wait for a connection to be returned
+            except mysql.connector.errors.InterfaceError as err:
+                # The pool could not reconnect an idle connection (it keeps it queued)
+                logger.warning(f"Could not reconnect a pooled connection: {err}")
+            else:
+                if self._is_healthy(conn):
+                    self._record_checkout(time.monotonic() - started)
+                    return conn
+                # The ping already tried to reconnect, so the connection is down.
+                # close() puts it back in the pool as it is; the pool reconnects
+                # a disconnected connection when it is next checked out.
+                try:
+                    conn.close()
+                except mysql.connector.Error:
+                    pass  # Resetting the dead session failed, but it was still re-queued
+
+            waited = time.monotonic() - started
+            if waited >= timeout:
+                with self._lock:
+                    self._stats["timeouts"] += 1
+                raise PoolTimeoutError(
+                    f"No healthy database connection available after {waited:.2f}s "
+                    f"(pool size {self.pool_size})."
+                )
+            time.sleep(min(delay, timeout - waited))
+            delay = min(delay * 2, 0.1)
+
+    def _is_healthy(self, conn):
+        """Pings connections that have been idle for a while, reconnecting if needed."""
+        key = id(getattr(conn, "_cnx", conn))
+        now = time.monotonic()
+        with self._lock:
+            last = self._last_checkout.get(key)
+            self._last_checkout[key] = now
+        if last is not None and now - last < self.health_check_interval:
+            return True
+        try:
+            conn.ping(reconnect=True, attempts=1, delay=0)
+            return True
+        except mysql.connector.Error as err:
+            logger.warning(f"Pooled connection failed health check: {err}")
+            with self._lock:
+                self._stats["health_check_failures"] += 1
+                self._last_checkout.pop(key, None)
+            return False
+
+    def _record_checkout(self, waited):
+        with self._lock:
+            stats = self._stats
+            stats["checkouts"] += 1
+            stats["wait_total_seconds"] += waited
+            stats["wait_max_seconds"] = max(stats["wait_max_seconds"], waited)
+            for i, bound in enumerate(WAIT_BUCKETS):
+                if waited <= bound:
+                    stats["wait_histogram"][i] += 1
+                    break
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """Context manager that checks out a connection and always returns it to the pool."""
+        conn = self.get_connection(timeout)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def stats(self):
+        """Returns a snapshot of the checkout metrics."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["wait_histogram"] = {
+                (f"le_{bound}" if bound != float("inf") else "le_inf"): count
+                for bound, count in zip(WAIT_BUCKETS, self._stats["wait_histogram"])
+            }
+        stats["pool_size"] = self.pool_size
+        stats["wait_avg_seconds"] = (
+            stats["wait_total_seconds"] / stats["checkouts"] if stats["checkouts"] else 0.0
+        )
+        return stats
+
+
+_default_pool = None
+_default_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Returns the process-wide pool, creating it from the .env settings on first use."""
+    global _default_pool
+    if _default_pool is None:
+        with _default_pool_lock:
+            if _default_pool is None:
+                _default_pool = ConnectionPool(
+                    pool_name="hotel_app_db",
+                    pool_size=config("DB_POOL_SIZE", default=5, cast=int),
+                    checkout_timeout=config("DB_POOL_TIMEOUT", default=5.0, cast=float),
+                    health_check_interval=config("DB_POOL_HEALTH_CHECK_INTERVAL", default=30.0, cast=float),
+                    host=config("DB_HOST"),
+                    user=config("DB_USER"),
+                    password=config("DB_PASSWORD"),
+                    database=config("DB_NAME"),
+                    port=config("DB_PORT", default=3306, cast=int),
+                )
+    return _default_pool
+
+
+def get_connection(timeout=None):
+    """Checks out a connection from the process-wide pool. Call close() to return it."""
+    return get_pool().get_connection(timeout)
@@ -31,51 +31,14 @@ CREATE TABLE IF NOT EXISTS order_items (
     price_per_item DECIMAL(10, 2) NOT NULL,
     FOREIGN KEY (order_id) REFERENCES orders(order_id)
 );
-ALTER TABLE orders
-ADD COLUMN checkout_request_id VARCHAR(255) UNIQUE NULL AFTER status;
 
-ALTER TABLE orders
-ADD COLUMN mpesa_receipt_number VARCHAR(255) NULL AFTER checkout_request_id;
+-- Schema changes (roles, M-Pesa columns, indexes, ...) are no longer run by hand.
+-- They live in migrations/ and are applied in order with:
+--     python migrate.py
+-- If you already ran the old ALTER scripts from this file, record them as applied
+-- instead of re-running them:
+--     python migrate.py baseline 2
 
-ALTER TABLE orders
-ADD COLUMN mpesa_transaction_date DATETIME NULL AFTER mpesa_receipt_number;
-
-USE hotel_app_db;
-
--- 1. Add the 'role' column to the 'users' table
--- This column is crucial for Role-Based Access Control (RBAC).
--- It will store 'user' or 'admin'.
--- Run this ONLY if the 'role' column does not exist in your 'users' table.
-ALTER TABLE users
-ADD COLUMN role VARCHAR(50) NOT NULL DEFAULT 'user';
-
--- Optional: Update existing users to 'user' role if they were created before this column was added.
--- If you have an existing 'admin@kitchen.com' user, you'll need to manually set their role to 'admin'
--- after adding the column, as the `create_user` function in the Streamlit app will handle this for new registrations.
--- For example:
--- UPDATE users SET role = 'admin' WHERE email = 'admin@kitchen.com';
-
-
--- M-Pesa Callback Related Columns for 'orders' table
--- These should already exist if your M-Pesa integration was set up previously.
--- Run these ONLY if the respective columns do not exist in your 'orders' table.
-
--- Add 'checkout_request_id' to track M-Pesa STK Push requests
-ALTER TABLE orders
-ADD COLUMN checkout_request_id VARCHAR(255) UNIQUE NULL AFTER status;
-
--- Add 'mpesa_receipt_number' to store the unique M-Pesa transaction ID
-ALTER TABLE orders
-ADD COLUMN mpesa_receipt_number VARCHAR(255) NULL AFTER checkout_request_id;
-
--- Add 'mpesa_transaction_date' to record when the M-Pesa payment occurred
-ALTER TABLE orders
-ADD COLUMN mpesa_transaction_date DATETIME NULL AFTER mpesa_receipt_number;
-
--- Modify the default status for new orders (if not already set)
--- This updates existing orders' status if you ran this before, but primarily affects new inserts.
-ALTER TABLE orders
-MODIFY COLUMN status VARCHAR(50) DEFAULT 'Pending Payment Confirmation';
 
 ---
 
@@ -2,6 +2,8 @@ CREATE DATABASE IF NOT EXISTS hotel_app_db;
 
 USE hotel_app_db;
 
+-- Base schema only. Later changes live in migrations/ (python migrate.py).
+
 -- Users table (for basic login, still not fully secure without hashing)
 CREATE TABLE IF NOT EXISTS users (
     id INT AUTO_INCREMENT PRIMARY KEY,
@@ -0,0 +1,248 @@
+# hotel_db.py
+# Database functions of the Streamlit app (Hotel.py).
+#
+# They live in their own module so they are defined once per process instead
+# of on every Streamlit rerun, and can be reused outside Streamlit. Errors are
+# logged and, if an error reporter is set (Hotel.py uses st.error), also shown
+# to the user. record_payment_request() runs on a background thread, where
+# st.error can't be called, so it raises instead.
+import logging
+import uuid
+from datetime import datetime
+
+import mysql.connector
+
+import db
+from order_events import make_event, publish_order_events
+from order_read_model import ORDER_DETAILS_SQL, create_order_cache, order_from_rows
+from payments import apply_parked_updates
+
+logger = logging.getLogger(__name__)
+
+_error_reporter = None
+
+# Orders read by get_order_details(), dropped by update_order_status()
+order_cache = create_order_cache()
+
+
+def set_error_reporter(report):
+    """Sets a callable that receives user-facing error messages, e.g. st.error."""
+    global _error_reporter
+    _error_reporter = report
+
+
+def report_error(message):
+    logger.error(message)
+    if _error_reporter is not None:
+        _error_reporter(message)
+
+# ==== Database Functions ====
+
+def get_db_connection():
+    """Checks out a connection from the shared pool. Closing it returns it to the pool."""
+    try:
+        return db.get_connection()
+    except mysql.connector.Error as err:
+        report_error(f"Database connection error: {err}")
+        return None
+
+def create_user(email, password):
+    """Creates a new user in the database."""
+    conn = get_db_connection()
+    if conn:
+        cursor = conn.cursor()
+        try:
+            # Check if user already exists
+            cursor.execute("SELECT * FROM users WHERE email = %s", (email,))
+            if cursor.fetchone():
+                return False, "User with this email already exists."
+
+            cursor.execute("INSERT INTO users (email, password) VALUES (%s, %s)", (email, password))
+            conn.commit()
+            return True, "User registered successfully!"
+        except mysql.connector.Error as err:
+            report_error(f"Error creating user: {err}")
+            return False, f"Error registering user: {err}"
+        finally:
+            cursor.close()
+            conn.close()
+    return False, "Database connection failed."
+
+def verify_user(email, password):
+    """Verifies user credentials against the database."""
+    conn = get_db_connection()
+    if conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT * FROM users WHERE email = %s AND password = %s", (email, password))
+            user = cursor.fetchone()
+            return user is not None
+        except mysql.connector.Error as err:
+            report_error(f"Error verifying user: {err}")
+            return False
+        finally:
+            cursor.close()
+            conn.close()
+    return False
+
+def save_order(user_email, cart_items, total_amount, personalization_data=None, checkout_request_id=None):
+    """Saves an order and its items to the database."""
+    conn = get_db_connection()
+    if conn:
+        cursor = conn.cursor()
+        try:
+            order_id = str(uuid.uuid4())
+            order_date = datetime.now()
+            status = "Pending Payment Confirmation" # Initial status for orders awaiting payment
+
+            # The order and all its items commit together, or not at all
+            conn.start_transaction()
+
+            # Save order details
+            cursor.execute(
+                "INSERT INTO orders (order_id, user_email, order_date, total_amount, status, personalization_name, personalization_phone, personalization_message, checkout_request_id) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)",
+                (order_id, user_email, order_date, total_amount, status,
+                 personalization_data.get('name') if personalization_data else None,
+                 personalization_data.get('phone') if personalization_data else None,
+                 personalization_data.get('message') if personalization_data else None,
+                 checkout_request_id) # Add checkout_request_id here
+            )
+
+            # Save order items. executemany() sends a single multi-row INSERT, so
+            # large group orders take one round trip instead of one per line.
+            cursor.executemany(
+                "INSERT INTO order_items (order_id, meal_id, meal_name, quantity, price_per_item) VALUES (%s, %s, %s, %s, %s)",
+                [(order_id, item['id'], item['name'], item['quantity'], item['price']) for item in cart_items]
+            )
+            conn.commit()
+            return True, order_id
+        except mysql.connector.Error as err:
+            report_error(f"Error saving order: {err}")
+            conn.rollback()
+            return False, f"Error saving order: {err}"
+        finally:
+            cursor.close()
+            conn.close()
+    return False, "Database connection failed."
+
+def get_user_orders_with_items(user_email, limit=10, before=None):
+    """Retrieves one page of a user's orders (newest first) with their items attached.
+
+    Uses two queries per page: one for the orders and one for all of their items,
+    which are grouped in Python under each order's 'items' key. `before` is the
+    keyset cursor (order_date, order_id) of the last order on the previous page.
+    Returns (orders, next_cursor); next_cursor is None on the last page.
+    """
+    conn = get_db_connection()
+    orders = []
+    next_cursor = None
+    if conn:
+        cursor = conn.cursor(dictionary=True)
+        try:
+            if before:
+                before_date, before_id = before
+                cursor.execute(
+                    "SELECT * FROM orders WHERE user_email = %s AND (order_date < %s OR (order_date = %s AND order_id < %s)) "
+                    "ORDER BY order_date DESC, order_id DESC LIMIT %s",
+                    (user_email, before_date, before_date, before_id, limit + 1)
+                )
+            else:
+                cursor.execute(
+                    "SELECT * FROM orders WHERE user_email = %s ORDER BY order_date DESC, order_id DESC LIMIT %s",
+                    (user_email, limit + 1)
+                )
+            orders = cursor.fetchall()
+
+            # Fetching one extra row tells us whether there is another page
+            if len(orders) > limit:
+                orders = orders[:limit]
+                next_cursor = (orders[-1]['order_date'], orders[-1]['order_id'])
+
+            if orders:
+                items_by_order = {order['order_id']: [] for order in orders}
+                placeholders = ", ".join(["%s"] * len(items_by_order))
+                cursor.execute(
+                    f"SELECT * FROM order_items WHERE order_id IN ({placeholders}) ORDER BY id",
+                    tuple(items_by_order)
+                )
+                for item in cursor.fetchall():
+                    items_by_order[item['order_id']].append(item)
+                for order in orders:
+                    order['items'] = items_by_order[order['order_id']]
+        except mysql.connector.Error as err:
+            report_error(f"Error fetching user orders: {err}")
+            orders, next_cursor = [], None
+        finally:
+            cursor.close()
+            conn.close()
+    return orders, next_cursor
+
+def get_order_details(order_id):
+    """Retrieves details for a specific order and its items, in one query.
+
+    Recently read orders are served from a per-process cache (order_read_model.py);
+    treat the returned dicts as read-only.
+    """
+    cached = order_cache.get(order_id)
+    if cached is not None:
+        return cached[1]
+    conn = get_db_connection()
+    order = None
+    items = []
+    if conn:
+        cursor = conn.cursor(dictionary=True)
+        try:
+            cursor.execute(ORDER_DETAILS_SQL, (order_id,))
+            order, items = order_from_rows(cursor.fetchall())
+            if order:
+                order_cache.put(order_id, order['status'], None, (order, items))
+        except mysql.connector.Error as err:
+            report_error(f"Error fetching order details: {err}")
+        finally:
+            cursor.close()
+            conn.close()
+    return order, items
+
+def update_order_status(order_id, new_status):
+    """Updates the status of an order in the database."""
+    conn = get_db_connection()
+    if conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute("UPDATE orders SET status = %s WHERE order_id = %s", (new_status, order_id))
+            conn.commit()
+            order_cache.invalidate(order_id)
+            publish_order_events([make_event(order_id, new_status)])
+            return True
+        except mysql.connector.Error as err:
+            report_error(f"Error updating order status: {err}")
+            conn.rollback()
+            return False
+        finally:
+            cursor.close()
+            conn.close()
+    return False
+
+def record_payment_request(order_id, checkout_request_id):
+    """Records how an order's STK Push went: links the order to its CheckoutRequestID,
+    so the M-Pesa callback can find it, or marks it "Payment Failed" if there is none.
+
+    Raises mysql.connector.Error instead of reporting it, so it can run off the
+    Streamlit script thread (mpesa.request_order_payment).
+    """
+    with db.get_pool().connection() as conn:
+        cursor = conn.cursor()
+        try:
+            if checkout_request_id:
+                cursor.execute("UPDATE orders SET checkout_request_id = %s WHERE order_id = %s", (checkout_request_id, order_id))
+            else:
+                cursor.execute("UPDATE orders SET status = %s WHERE order_id = %s", ("Payment Failed", order_id))
+            conn.commit()
+        finally:
+            cursor.close()
+    order_cache.invalidate(order_id)
+    if checkout_request_id:
+        # The callback may have arrived before the link, and been parked
+        apply_parked_updates([checkout_request_id])
+    else:
+        publish_order_events([make_event(order_id, "Payment Failed")])
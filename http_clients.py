@@ -0,0 +1,189 @@
+# http_clients.py
+# Shared HTTP clients for the external APIs we call (Daraja, Zoho).
+#
+# Each upstream gets one requests.Session per process with a pool of keep-alive
+# connections, so repeated calls skip the TCP + TLS handshake. Every request
+# gets connect/read timeouts, transient failures are retried a bounded number
+# of times with jittered exponential backoff, and the latency of each endpoint
+# is recorded in a histogram (see ApiClient.stats()).
+import logging
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from decouple import config
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (in seconds) of the request latency histogram buckets.
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, float("inf"))
+
+# Statuses worth retrying: rate limiting and gateway/server hiccups.
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+def _build_retry(total, backoff_factor, backoff_jitter, retry_methods):
+    """Builds the urllib3 retry policy.
+
+    Requests that never reached the server (connect errors) are retried for
+    any method. Read errors and RETRY_STATUSES are only retried for
+    `retry_methods`, since re-sending e.g. an STK push could charge twice.
+    """
+    options = dict(
+        total=total,
+        connect=total,
+        read=total,
+        status=total,
+        backoff_factor=backoff_factor,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset(retry_methods),
+        respect_retry_after_header=True,
+        raise_on_status=False,  # Hand the last response back so callers see the real status
+    )
+    try:
+        return Retry(backoff_jitter=backoff_jitter, **options)
+    except TypeError:
+        # urllib3 < 2 has no jitter; plain exponential backoff it is
+        return Retry(**options)
+
+
+class ApiClient:
+    """A pooled, retrying HTTP client for one upstream API.
+
+    `path` arguments are joined to `base_url`; absolute URLs are used as-is.
+    Latency is recorded per "METHOD path" (query strings excluded), including
+    retries and backoff.
+    """
+
+    def __init__(self, name, base_url, pool_size=10, connect_timeout=3.05, read_timeout=20.0,
+                 retries=3, backoff_factor=0.5, backoff_jitter=0.5, retry_methods=("GET",)):
+        self.name = name
+        self.base_url = base_url.rstrip("/")
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=pool_size,
+            max_retries=_build_retry(retries, backoff_factor, backoff_jitter, retry_methods)
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def request(self, method, path, **kwargs):
+        """Sends a request. Raises requests.exceptions.RequestException on network errors."""
+        url = path if path.startswith(("http://", "https://")) else f"{self.base_url}/{path.lstrip('/')}"
+        kwargs.setdefault("timeout", self.timeout)
+        started = time.monotonic()
+        status = None
+        try:
+            response = self.session.request(method, url, **kwargs)
+            status = response.status_code
+            return response
+        finally:
+            self._record(f"{method.upper()} {path.split('?')[0]}", time.monotonic() - started, status)
+
+    def get(self, path, **kwargs):
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request("POST", path, **kwargs)
+
+    def _record(self, endpoint, elapsed, status):
+        with self._lock:
+            stats = self._endpoints.get(endpoint)
+            if stats is None:
+                stats = self._endpoints[endpoint] = {
+                    "requests": 0,
+                    "errors": 0,
+                    "latency_total_seconds": 0.0,
+                    "latency_max_seconds": 0.0,
+                    "latency_histogram": [0] * len(LATENCY_BUCKETS),
+                }
+            stats["requests"] += 1
+            if status is None or status >= 400:
+                stats["errors"] += 1
+            stats["latency_total_seconds"] += elapsed
+            stats["latency_max_seconds"] = max(stats["latency_max_seconds"], elapsed)
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if elapsed <= bound:
+                    stats["latency_histogram"][i] += 1
+                    break
+
+    def stats(self):
+        """Returns per-endpoint request counts, error counts and latency histograms."""
+        with self._lock:
+            return {
+                "base_url": self.base_url,
+                "latency_buckets": [str(b) for b in LATENCY_BUCKETS],
+                "endpoints": {
+                    endpoint: dict(stats, latency_histogram=list(stats["latency_histogram"]))
+                    for endpoint, stats in self._endpoints.items()
+                },
+            }
+
+
+class RateLimiter:
+    """A token bucket allowing `rate` calls per `per` seconds, shared between threads.
+
+    acquire() blocks until a call is allowed. Bursts of up to `rate` calls go
+    through immediately after an idle period.
+    """
+
+    def __init__(self, rate, per=60.0):
+        self.rate = rate
+        self.per = per
+        self._tokens = float(rate)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.rate, self._tokens + (now - self._updated) * self.rate / self.per)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) * self.per / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """Empties the bucket so nobody calls for `seconds`, e.g. after an HTTP 429."""
+        with self._lock:
+            self._tokens = min(self._tokens, 0) - seconds * self.rate / self.per
+            self._updated = time.monotonic()
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(name, base_url, **options):
+    """Returns the process-wide ApiClient called `name`, creating it on first use.
+
+    Timeouts and retry counts can be tuned per upstream through the environment,
+    e.g. HTTP_DARAJA_READ_TIMEOUT or HTTP_ZOHO_BOOKS_RETRIES; `options` give the
+    defaults.
+    """
+    with _clients_lock:
+        client = _clients.get(name)
+        if client is None:
+            prefix = f"HTTP_{name.upper()}_"
+            options["connect_timeout"] = config(prefix + "CONNECT_TIMEOUT", default=options.get("connect_timeout", 3.05), cast=float)
+            options["read_timeout"] = config(prefix + "READ_TIMEOUT", default=options.get("read_timeout", 20.0), cast=float)
+            options["retries"] = config(prefix + "RETRIES", default=options.get("retries", 3), cast=int)
+            options["pool_size"] = config(prefix + "POOL_SIZE", default=options.get("pool_size", 10), cast=int)
+            client = _clients[name] = ApiClient(name, base_url, **options)
+        return client
+
+
+def all_stats():
+    """Returns stats() for every client created in this process, keyed by name."""
+    with _clients_lock:
+        clients = list(_clients.values())
+    return {client.name: client.stats() for client in clients}
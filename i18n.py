@@ -0,0 +1,150 @@
+# i18n.py
+# UI translations for Hotel.py and prototype.py, loaded from locales/<code>.json.
+#
+# Each catalog is read once per process into a flat key -> text table per
+# language, with English filling in keys a language lacks. Templates such as
+# "➕ Add {meal_name} to Cart" are parsed once at load time, so rendering one
+# is a join over pre-split pieces rather than a fresh str.format() parse.
+#
+#   python i18n.py --check    # report missing keys and mismatched placeholders
+import argparse
+import json
+import os
+import re
+import string
+import sys
+from functools import lru_cache
+
+LOCALES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "locales")
+DEFAULT_LANGUAGE = "English"
+
+# Language names used in the UI -> catalog file names
+LANGUAGES = {
+    "English": "en",
+    "Chinese": "zh",
+    "Kiswahili": "sw",
+    "French": "fr",
+}
+
+# Apps whose t["key"] / t.format("key", ...) lookups --check verifies
+APP_FILES = ("Hotel.py", "prototype.py")
+KEY_USE_RE = re.compile(r"""\bt(?:\[|\.format\()\s*["'](\w+)["']""")
+
+_formatter = string.Formatter()
+
+
+def compile_template(text):
+    """Splits a format string into [(literal, field name)] pieces.
+
+    Returns None if the text has no fields, and False if it has to go through
+    str.format() (a field with a conversion or format spec, e.g. {amount:.2f}).
+    """
+    pieces = []
+    for literal, field, spec, conversion in _formatter.parse(text):
+        if field is None:
+            pieces.append((literal, None))
+            continue
+        if spec or conversion or not field.isidentifier():
+            return False
+        pieces.append((literal, field))
+    return pieces if any(field for _, field in pieces) else None
+
+
+class Translator:
+    """The UI texts of one language. t["key"] returns a text; t.format("key", **values) fills a template."""
+
+    __slots__ = ("language", "_texts", "_templates")
+
+    def __init__(self, language, texts):
+        self.language = language
+        self._texts = texts
+        self._templates = {}
+        for key, text in texts.items():
+            compiled = compile_template(text)
+            if compiled is not None:
+                self._templates[key] = compiled
+
+    def __getitem__(self, key):
+        return self._texts[key]
+
+    def __contains__(self, key):
+        return key in self._texts
+
+    def format(self, key, **values):
+        pieces = self._templates.get(key)
+        if pieces is None:
+            return self._texts[key]
+        if pieces is False:
+            return self._texts[key].format(**values)
+        return "".join(literal + (str(values[field]) if field else "") for literal, field in pieces)
+
+
+def read_catalog(language):
+    """Reads one language's catalog file. Returns {} if it doesn't exist."""
+    try:
+        with open(os.path.join(LOCALES_DIR, f"{LANGUAGES[language]}.json"), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+@lru_cache(maxsize=None)
+def translator(language):
+    """Returns the process-wide Translator for `language` (English for unknown languages)."""
+    if language not in LANGUAGES:
+        language = DEFAULT_LANGUAGE
+    texts = dict(read_catalog(DEFAULT_LANGUAGE))
+    if language != DEFAULT_LANGUAGE:
+        texts.update(read_catalog(language))
+    return Translator(language, texts)
+
+
+def check():
+    """Compares every catalog with the English one, and checks the keys used by APP_FILES exist.
+
+    Returns a list of problems.
+    """
+    problems = []
+    reference = read_catalog(DEFAULT_LANGUAGE)
+    base_dir = os.path.dirname(LOCALES_DIR)
+    for filename in APP_FILES:
+        with open(os.path.join(base_dir, filename), encoding="utf-8") as f:
+            for key in sorted(set(KEY_USE_RE.findall(f.read()))):
+                if key not in reference:
+                    problems.append(f"{filename}: uses key '{key}', which is not in the English catalog")
+    reference_fields = {
+        key: {field for _, field, _, _ in _formatter.parse(text) if field} for key, text in reference.items()
+    }
+    for language, code in LANGUAGES.items():
+        texts = read_catalog(language)
+        if not texts:
+            problems.append(f"{language}: locales/{code}.json is missing or empty")
+            continue
+        for key in reference:
+            if key not in texts:
+                problems.append(f"{language}: missing key '{key}'")
+                continue
+            try:
+                fields = {field for _, field, _, _ in _formatter.parse(texts[key]) if field}
+            except ValueError as e:
+                problems.append(f"{language}: '{key}' is not a valid template: {e}")
+                continue
+            if fields != reference_fields[key]:
+                problems.append(f"{language}: '{key}' uses placeholders {sorted(fields)}, English uses {sorted(reference_fields[key])}")
+        for key in texts:
+            if key not in reference:
+                problems.append(f"{language}: key '{key}' is not in the English catalog")
+    return problems
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect the UI translation catalogs.")
+    parser.add_argument("--check", action="store_true", help="report missing keys and mismatched placeholders")
+    args = parser.parse_args()
+    if args.check:
+        problems = check()
+        for problem in problems:
+            print(problem)
+        print("Translation catalogs are complete." if not problems else f"{len(problems)} problem(s) found.")
+        sys.exit(1 if problems else 0)
+    parser.print_help()
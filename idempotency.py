@@ -0,0 +1,136 @@
+# idempotency.py
+# Recognizes duplicate M-Pesa callbacks. Daraja retries callbacks it did not see
+# acknowledged in time, and each retry would otherwise re-run the orders UPDATE.
+#
+# Two layers, keyed on CheckoutRequestID (and MpesaReceiptNumber when present):
+#   - a bounded in-memory LRU of recently applied results, checked before any DB work
+#   - the mpesa_callbacks_seen table (unique on checkout_request_id), checked and
+#     written in the same transaction as the orders update, so it stays correct
+#     across restarts and processes
+# Only results that updated an order are recorded in either. A callback can
+# arrive before its order has the CheckoutRequestID; that result stays unseen
+# and is parked (or requeued) until the order is linked, see payments.py. A payment the
+# reconciler confirmed has no receipt number, so the callback arriving later
+# is let through once, to fill the receipt in.
+import threading
+from collections import OrderedDict
+
+
+class CallbackDeduplicator:
+    """Tracks which payment results have already been applied, with duplicate-rate metrics.
+
+    Each layer reports its own rate: the LRU over the callbacks it was asked
+    about (seen_recently), the seen table over every result checked against it
+    (filter_new, from callbacks, the queue workers and the reconciler alike).
+    """
+
+    def __init__(self, capacity=10000):
+        self.capacity = capacity
+        self._recent = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"received": 0, "duplicates_in_memory": 0, "checked_in_db": 0, "duplicates_in_db": 0}
+
+    @staticmethod
+    def _keys(update):
+        keys = []
+        # A paid result without a receipt still lets the callback with the receipt through
+        if update.get('mpesa_receipt_number') or update['status'] != "Paid":
+            keys.append(("checkout", update['checkout_request_id']))
+        if update.get('mpesa_receipt_number'):
+            keys.append(("receipt", update['mpesa_receipt_number']))
+        return keys
+
+    def seen_recently(self, update):
+        """Counts an incoming callback and returns True if the LRU already knows its result."""
+        with self._lock:
+            self._stats["received"] += 1
+            for key in self._keys(update):
+                if key in self._recent:
+                    self._recent.move_to_end(key)
+                    self._stats["duplicates_in_memory"] += 1
+                    return True
+        return False
+
+    def filter_new(self, cursor, updates):
+        """Returns (new_updates, receipt_fills) for the updates not applied yet.
+
+        new_updates are results not in mpesa_callbacks_seen. receipt_fills are
+        paid results with a receipt number for a payment seen as paid without
+        one (confirmed by the reconciler); they only fill the receipt in. Run
+        it inside the transaction that applies them, then claim() the new
+        updates and claim_receipts() the fills that were actually applied.
+        """
+        if not updates:
+            return [], []
+        checkout_ids = [u['checkout_request_id'] for u in updates]
+        receipts = [u['mpesa_receipt_number'] for u in updates if u.get('mpesa_receipt_number')]
+        sql = f"SELECT checkout_request_id, mpesa_receipt_number, status FROM mpesa_callbacks_seen WHERE checkout_request_id IN ({', '.join(['%s'] * len(checkout_ids))})"
+        params = list(checkout_ids)
+        if receipts:
+            sql += f" OR mpesa_receipt_number IN ({', '.join(['%s'] * len(receipts))})"
+            params += receipts
+        cursor.execute(sql, tuple(params))
+        seen_checkouts, seen_receipts, awaiting_receipt = set(), set(), set()
+        for checkout_request_id, receipt, status in cursor.fetchall():
+            seen_checkouts.add(checkout_request_id)
+            if receipt:
+                seen_receipts.add(receipt)
+            elif status == "Paid":
+                awaiting_receipt.add(checkout_request_id)
+
+        new_updates, receipt_fills = [], []
+        for u in updates:
+            if u.get('mpesa_receipt_number') in seen_receipts:
+                continue
+            if u['checkout_request_id'] not in seen_checkouts:
+                new_updates.append(u)
+            elif u['checkout_request_id'] in awaiting_receipt and u['status'] == "Paid" and u.get('mpesa_receipt_number'):
+                receipt_fills.append(u)
+        with self._lock:
+            self._stats["checked_in_db"] += len(updates)
+            self._stats["duplicates_in_db"] += len(updates) - len(new_updates) - len(receipt_fills)
+        return new_updates, receipt_fills
+
+    def claim(self, cursor, updates):
+        """Records applied updates in mpesa_callbacks_seen.
+
+        Must run inside the transaction that applies them, so a rollback also
+        forgets them. A concurrent duplicate makes the INSERT fail with an
+        IntegrityError, which rolls the batch back for a retry.
+        """
+        if updates:
+            cursor.executemany(
+                "INSERT INTO mpesa_callbacks_seen (checkout_request_id, mpesa_receipt_number, status) VALUES (%s, %s, %s)",
+                [(u['checkout_request_id'], u.get('mpesa_receipt_number'), u['status']) for u in updates]
+            )
+
+    def claim_receipts(self, cursor, updates):
+        """Records the receipt numbers of applied receipt_fills from filter_new(), in the same transaction."""
+        if updates:
+            cursor.executemany(
+                "UPDATE mpesa_callbacks_seen SET mpesa_receipt_number = %s "
+                "WHERE checkout_request_id = %s AND mpesa_receipt_number IS NULL",
+                [(u['mpesa_receipt_number'], u['checkout_request_id']) for u in updates]
+            )
+
+    def remember(self, updates):
+        """Adds applied results to the LRU, evicting the oldest beyond capacity. Call it after the commit."""
+        with self._lock:
+            for update in updates:
+                for key in self._keys(update):
+                    self._recent[key] = True
+                    self._recent.move_to_end(key)
+            while len(self._recent) > self.capacity:
+                self._recent.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["lru_size"] = len(self._recent)
+        stats["duplicate_rate_in_memory"] = (
+            stats["duplicates_in_memory"] / stats["received"] if stats["received"] else 0.0
+        )
+        stats["duplicate_rate_in_db"] = (
+            stats["duplicates_in_db"] / stats["checked_in_db"] if stats["checked_in_db"] else 0.0
+        )
+        return stats
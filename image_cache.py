@@ -0,0 +1,199 @@
+# image_cache.py
+# Local thumbnails of the menu photos.
+#
+# The menu images live on GitHub as full-size JPEGs behind a redirect. This
+# module downloads each one once, writes WebP versions at a few widths to a
+# local directory under content-hashed names, and maps menu image URLs to
+# them. The app then shows the small thumbnail instead of the full-size photo.
+#
+# Where the browser gets it from depends on IMAGE_BASE_URL:
+#   - set to the root of the image server below (e.g. http://localhost:5001),
+#     images are <IMAGE_BASE_URL>/images/<hash>-<width>.webp, sent with
+#     year-long cache headers since a hashed name never changes content
+#   - unset, Streamlit serves the local file through its media endpoint, which
+#     sends no long-lived Cache-Control, so browsers fetch it again per session
+#
+#   python image_cache.py prefetch              # fetch and resize every menu image
+#   python image_cache.py serve --port 5001     # serve the thumbnails over HTTP
+#   IMAGE_BASE_URL=http://localhost:5001 streamlit run Hotel.py
+import argparse
+import hashlib
+import io
+import json
+import logging
+import os
+import threading
+import time
+
+from decouple import config
+
+import http_clients
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+IMAGE_CACHE_DIR = config("IMAGE_CACHE_DIR", default=".image_cache")
+IMAGE_BASE_URL = config("IMAGE_BASE_URL", default="").rstrip("/")
+IMAGE_ROUTE = "/images"  # Where create_app() serves the thumbnails, under IMAGE_BASE_URL
+THUMBNAIL_WIDTHS = (320, 640)
+MANIFEST = "manifest.json"
+
+
+class ImageCache:
+    """Content-hashed WebP thumbnails of remote images, on local disk.
+
+    manifest.json maps each source URL to the hash of its bytes; thumbnails
+    are named <hash>-<width>.webp. Lookups never touch the network; the
+    manifest is re-read at most every `reload_interval` seconds if it changed,
+    so a prefetch run from the command line is picked up without a restart.
+    """
+
+    def __init__(self, cache_dir=IMAGE_CACHE_DIR, widths=THUMBNAIL_WIDTHS, quality=80, base_url=IMAGE_BASE_URL,
+                 reload_interval=30.0):
+        self.cache_dir = cache_dir
+        self.widths = tuple(sorted(widths))
+        self.quality = quality
+        self.base_url = base_url
+        self.reload_interval = reload_interval
+        self._lock = threading.Lock()
+        self._manifest_mtime = None
+        self._last_check = time.monotonic()
+        self._manifest = self._read_manifest()
+        if self._manifest and not self.base_url:
+            logger.info(
+                "IMAGE_BASE_URL is not set: thumbnails go through Streamlit's media server without long-lived "
+                "cache headers. Run `python image_cache.py serve` and set IMAGE_BASE_URL to cache them in browsers."
+            )
+
+    def _read_manifest(self):
+        path = os.path.join(self.cache_dir, MANIFEST)
+        try:
+            self._manifest_mtime = os.path.getmtime(path)
+            with open(path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _reload_if_changed(self):
+        if time.monotonic() - self._last_check < self.reload_interval:
+            return
+        self._last_check = time.monotonic()
+        try:
+            changed = os.path.getmtime(os.path.join(self.cache_dir, MANIFEST)) != self._manifest_mtime
+        except OSError:
+            changed = False
+        if changed:
+            self._manifest = self._read_manifest()
+
+    def _write_manifest(self):
+        tmp_path = os.path.join(self.cache_dir, f"{MANIFEST}.{os.getpid()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._manifest, f, indent=1)
+        os.replace(tmp_path, os.path.join(self.cache_dir, MANIFEST))
+
+    def prefetch(self, urls):
+        """Downloads and resizes every URL not cached yet. Returns the number of images added.
+
+        Failures are logged and skipped; those images keep their remote URL.
+        """
+        if Image is None:
+            raise RuntimeError("Pillow is required to build image thumbnails (pip install Pillow).")
+        os.makedirs(self.cache_dir, exist_ok=True)
+        client = http_clients.get_client("images", "https://github.com", read_timeout=60.0)
+        added = 0
+        for url in urls:
+            if url in self._manifest:
+                continue
+            try:
+                response = client.get(url)
+                response.raise_for_status()
+                digest = hashlib.sha256(response.content).hexdigest()[:16]
+                self._write_thumbnails(digest, response.content)
+            except Exception as e:
+                logger.warning(f"Could not cache image {url}: {e}")
+                continue
+            with self._lock:
+                self._manifest[url] = digest
+                self._write_manifest()
+            added += 1
+        return added
+
+    def _write_thumbnails(self, digest, data):
+        image = Image.open(io.BytesIO(data))
+        image = image.convert("RGBA" if image.mode in ("RGBA", "LA", "P") else "RGB")
+        for width in self.widths:
+            path = self._path(digest, width)
+            if os.path.exists(path):
+                continue  # Same picture under another URL
+            thumbnail = image
+            if image.width > width:
+                thumbnail = image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            thumbnail.save(tmp_path, "WEBP", quality=self.quality, method=6)
+            os.replace(tmp_path, path)
+
+    def _path(self, digest, width):
+        return os.path.join(self.cache_dir, f"{digest}-{width}.webp")
+
+    def source_for(self, url, width):
+        """Returns what to display for a menu image.
+
+        That is the smallest cached thumbnail at least `width` pixels wide (a
+        local path, or its URL on the image server at base_url), or `url`
+        itself if it isn't cached.
+        """
+        self._reload_if_changed()
+        digest = self._manifest.get(url)
+        if digest is None:
+            return url
+        chosen = next((w for w in self.widths if w >= width), self.widths[-1])
+        if self.base_url:
+            return f"{self.base_url}{IMAGE_ROUTE}/{digest}-{chosen}.webp"
+        path = self._path(digest, chosen)
+        return path if os.path.exists(path) else url
+
+
+def create_app(cache_dir=IMAGE_CACHE_DIR):
+    """A Flask app serving the thumbnails at IMAGE_ROUTE/<hash>-<width>.webp."""
+    from flask import Flask, abort, send_from_directory
+
+    app = Flask(__name__)
+
+    @app.route(f'{IMAGE_ROUTE}/<name>', methods=['GET'])
+    def image(name):
+        if not name.endswith(".webp"):
+            abort(404)
+        response = send_from_directory(os.path.abspath(cache_dir), name, mimetype="image/webp", max_age=31536000)
+        response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        return response
+
+    return app
+
+
+def menu_image_urls():
+    """Returns the image URLs of every dish on the menu, including unavailable ones."""
+    import db
+    from menu_catalog import MenuCatalog
+
+    catalog = MenuCatalog(db.get_connection)
+    return list(dict.fromkeys(meal['image'] for meal in catalog.meals(include_unavailable=True)))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Cache menu images as local WebP thumbnails.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("prefetch", help="fetch and resize every menu image not cached yet")
+    serve_parser = subparsers.add_parser("serve", help="serve the thumbnails with long-lived cache headers")
+    serve_parser.add_argument("--port", type=int, default=5001)
+    args = parser.parse_args()
+
+    if args.command == "prefetch":
+        added = ImageCache().prefetch(menu_image_urls())
+        logger.info(f"Cached {added} new image(s) in {IMAGE_CACHE_DIR}.")
+    else:
+        create_app().run(host='0.0.0.0', port=args.port)
@@ -3,6 +3,8 @@ import json
 import datetime
 import os
 from dotenv import load_dotenv # Import load_dotenv
+import http_clients
+from token_store import TokenStore
 
 # Load environment variables from .env file
 load_dotenv()
@@ -23,10 +25,25 @@ ZOHO_ACCOUNTS_PAYABLE_ACCOUNT_ID = os.getenv("ZOHO_ACCOUNTS_PAYABLE_ACCOUNT_ID")
 ZOHO_EDMUND_OPIYO_OWNERS_EQUITY_ACCOUNT_ID = os.getenv("ZOHO_EDMUND_OPIYO_OWNERS_EQUITY_ACCOUNT_ID")
 ZOHO_DEFAULT_CURRENCY_ID = os.getenv("ZOHO_DEFAULT_CURRENCY_ID") # e.g., for KES
 
+# Accounts for customer (M-Pesa) sales entries. Only needed when posting paid
+# orders, which `python outbox_relay.py` does.
+ZOHO_MPESA_ACCOUNT_ID = os.getenv("ZOHO_MPESA_ACCOUNT_ID") # Asset account receiving M-Pesa payments
+ZOHO_SALES_ACCOUNT_ID = os.getenv("ZOHO_SALES_ACCOUNT_ID") # Income account for meal sales
+
 # --- API Endpoints ---
 ZOHO_OAUTH_URL = "https://accounts.zoho.com/oauth/v2/token"
 ZOHO_BOOKS_API_BASE_URL = "https://books.zoho.com/api/v3"
 
+# Pooled keep-alive sessions with timeouts and retries (see http_clients.py).
+# Refreshing a token is safe to repeat, so it is also retried on 5xx/429;
+# journal entries are only retried when the request never reached Zoho.
+zoho_accounts = http_clients.get_client("zoho_accounts", ZOHO_OAUTH_URL, retry_methods=("GET", "POST"))
+zoho_books = http_clients.get_client("zoho_books", ZOHO_BOOKS_API_BASE_URL)
+
+# Access tokens last an hour; they are cached on disk and shared between
+# processes instead of being refreshed for every payment (see token_store.py).
+token_store = TokenStore(os.getenv("ZOHO_TOKEN_STORE_PATH", "zoho_tokens.sqlite3"))
+
 # --- Validation for critical environment variables ---
 # It's good practice to ensure critical variables are loaded.
 if not all([ZOHO_CLIENT_ID, ZOHO_CLIENT_SECRET, ZOHO_ORGANIZATION_ID, ZOHO_REFRESH_TOKEN,
@@ -38,8 +55,25 @@ if not all([ZOHO_CLIENT_ID, ZOHO_CLIENT_SECRET, ZOHO_ORGANIZATION_ID, ZOHO_REFRE
     print("and ZOHO_DEFAULT_CURRENCY_ID are set in your .env file or environment.")
     exit(1) # Exit if essential variables are not set
 
-def refresh_access_token(refresh_token):
-    """Refreshes the Zoho Books access token using the refresh token."""
+class ZohoAuthError(Exception):
+    """Raised when Zoho Books rejects the access token (HTTP 401); refresh it and retry."""
+
+class ZohoRateLimitError(Exception):
+    """Raised when Zoho Books throttles us (HTTP 429); retry after `retry_after` seconds."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Rate limited by Zoho Books; retry after {retry_after}s")
+        self.retry_after = retry_after
+
+class ZohoLookupError(Exception):
+    """Raised when Zoho Books could not tell whether a journal entry already exists."""
+
+def request_access_token(refresh_token):
+    """
+    Requests a new Zoho Books access token using the refresh token.
+
+    Returns (access_token, expires_in_seconds), or (None, None) if it failed.
+    """
     print("Attempting to refresh access token...")
     payload = {
         'refresh_token': refresh_token,
@@ -48,8 +82,9 @@ def refresh_access_token(refresh_token):
         'redirect_uri': ZOHO_REDIRECT_URI,
         'grant_type': 'refresh_token',
     }
+    response = None
     try:
-        response = requests.post(ZOHO_OAUTH_URL, data=payload)
+        response = zoho_accounts.post(ZOHO_OAUTH_URL, data=payload)
         response.raise_for_status() # Raise an exception for bad status codes
         token_data = response.json()
         new_access_token = token_data.get('access_token')
@@ -57,14 +92,32 @@ def refresh_access_token(refresh_token):
 
         if new_access_token:
             print(f"Access token refreshed successfully. Expires in {new_expires_in} seconds.")
-            return new_access_token
+            return new_access_token, int(new_expires_in or 3600)
         else:
             print(f"Access token not found in response: {token_data}")
-            return None
+            return None, None
     except requests.exceptions.RequestException as e:
         print(f"Error refreshing access token: {e}")
-        print(f"Response: {response.text if response else 'No response'}")
-        return None
+        print(f"Response: {response.text if response is not None else 'No response'}")
+        return None, None
+
+def refresh_access_token(refresh_token):
+    """Refreshes the Zoho Books access token using the refresh token."""
+    return request_access_token(refresh_token)[0]
+
+def get_access_token():
+    """
+    Returns a valid Zoho Books access token from the shared token store.
+
+    The token is only refreshed when it is close to expiry, and the refreshed
+    token is reused by every process sharing ZOHO_TOKEN_STORE_PATH.
+    Returns None if a refresh was needed and failed.
+    """
+    return token_store.get("zoho_books", lambda: request_access_token(ZOHO_REFRESH_TOKEN))
+
+def invalidate_access_token(stale_token):
+    """Replaces an access token that Zoho rejected (HTTP 401). Returns the new token or None."""
+    return token_store.invalidate("zoho_books", stale_token, lambda: request_access_token(ZOHO_REFRESH_TOKEN))
 
 def create_journal_entry_in_zoho_books(access_token, payment_data):
     """
@@ -82,8 +135,6 @@ def create_journal_entry_in_zoho_books(access_token, payment_data):
     Returns:
         dict: The response from Zoho Books if successful, None otherwise.
     """
-    journal_entry_url = f"{ZOHO_BOOKS_API_BASE_URL}/journalentries"
-    
     amount = payment_data['amount']
     vendor_name = payment_data['vendor_name']
     bill_reference = payment_data.get('bill_reference', 'N/A')
@@ -129,15 +180,76 @@ def create_journal_entry_in_zoho_books(access_token, payment_data):
         ]
     }
 
+    print(f"Sending journal entry request to Zoho Books for amount: {amount}...")
+    return post_journal_entry(access_token, payload)
+
+def sales_reference_number(order_id):
+    """Returns the reference number of an order's sales journal entry (one entry per order)."""
+    return f"ORD-{order_id}"
+
+def create_sales_journal_entry_in_zoho_books(access_token, order):
+    """
+    Creates a journal entry in Zoho Books for a paid customer order.
+
+    Args:
+        access_token (str): The current valid Zoho Books API access token.
+        order (dict): A dictionary containing order details like:
+                      - 'order_id': str
+                      - 'amount': float
+                      - 'user_email': str
+                      - 'mpesa_receipt_number': str (optional)
+                      - 'payment_date': str (YYYY-MM-DD)
+    Returns:
+        dict: The response from Zoho Books if successful, None otherwise.
+    """
+    if not (ZOHO_MPESA_ACCOUNT_ID and ZOHO_SALES_ACCOUNT_ID):
+        print("Error: ZOHO_MPESA_ACCOUNT_ID and ZOHO_SALES_ACCOUNT_ID must be set to post sales entries.")
+        return None
+
+    amount = float(order['amount'])
+    receipt = order.get('mpesa_receipt_number') or 'N/A'
+    payload = {
+        "journal_date": order['payment_date'],
+        "currency_id": ZOHO_DEFAULT_CURRENCY_ID,
+        "reference_number": sales_reference_number(order['order_id']),
+        "notes": f"M-Pesa payment {receipt} for order {order['order_id']} by {order['user_email']}. Amount: {amount:.2f}",
+        "line_items": [
+            {
+                "account_id": ZOHO_MPESA_ACCOUNT_ID,
+                "debit": amount,
+                "description": f"M-Pesa receipt {receipt}"
+            },
+            {
+                "account_id": ZOHO_SALES_ACCOUNT_ID,
+                "credit": amount,
+                "description": f"Meal sales, order {order['order_id']}"
+            }
+        ]
+    }
+
+    print(f"Sending sales journal entry for order {order['order_id']} to Zoho Books...")
+    return post_journal_entry(access_token, payload)
+
+def post_journal_entry(access_token, payload):
+    """
+    Posts a journal entry payload to Zoho Books.
+
+    Returns the response from Zoho Books if successful, None otherwise. Raises
+    ZohoAuthError if the access token was rejected and ZohoRateLimitError if
+    the request was throttled, since both are worth retrying.
+    """
     headers = {
         "Authorization": f"Zoho-oauthtoken {access_token}",
         "X-Crm-Org-Id": ZOHO_ORGANIZATION_ID,
         "Content-Type": "application/json"
     }
 
-    print(f"Sending journal entry request to Zoho Books for amount: {amount}...")
     try:
-        response = requests.post(journal_entry_url, headers=headers, data=json.dumps(payload))
+        response = zoho_books.post("/journalentries", headers=headers, data=json.dumps(payload))
+        if response.status_code == 401:
+            raise ZohoAuthError(f"Access token rejected: {response.text}")
+        if response.status_code == 429:
+            raise ZohoRateLimitError(float(response.headers.get("Retry-After") or 60))
         response.raise_for_status() # Raise HTTPError for bad responses (4xx or 5xx)
 
         journal_entry_response = response.json()
@@ -157,23 +269,61 @@ def create_journal_entry_in_zoho_books(access_token, payment_data):
         print(f"Request Error creating journal entry: {e}")
         return None
 
+def find_journal_entry(access_token, reference_number):
+    """
+    Looks up the journal entry posted under `reference_number`.
+
+    Returns its journal ID, or None if there is no such entry. Raises
+    ZohoAuthError and ZohoRateLimitError like post_journal_entry(), and
+    ZohoLookupError if Zoho Books could not be asked.
+    """
+    headers = {
+        "Authorization": f"Zoho-oauthtoken {access_token}",
+        "X-Crm-Org-Id": ZOHO_ORGANIZATION_ID
+    }
+
+    try:
+        response = zoho_books.get("/journalentries", headers=headers, params={"reference_number": reference_number})
+        if response.status_code == 401:
+            raise ZohoAuthError(f"Access token rejected: {response.text}")
+        if response.status_code == 429:
+            raise ZohoRateLimitError(float(response.headers.get("Retry-After") or 60))
+        response.raise_for_status()
+        entries = response.json().get('journalentries') or []
+    except (requests.exceptions.RequestException, ValueError) as e:
+        raise ZohoLookupError(f"Could not look up journal entry {reference_number}: {e}") from e
+
+    # The filter may also match longer reference numbers; only an exact match counts
+    for entry in entries:
+        if entry.get('reference_number') == reference_number and entry.get('journal_id'):
+            return entry['journal_id']
+    return None
+
 # --- Main Automation Logic ---
 def automate_payment_journal_entry(payment_details):
     """
     Orchestrates the automation process for a single payment.
     """
-    # In a real system, the refresh token would be loaded from secure storage
-    # and potentially updated if Zoho issues a new one (though less common for refresh tokens).
-    current_refresh_token = ZOHO_REFRESH_TOKEN 
-
-    # 1. Get/Refresh Access Token
-    current_access_token = refresh_access_token(current_refresh_token)
+    # 1. Get the cached access token (refreshed only when near expiry)
+    current_access_token = get_access_token()
     if not current_access_token:
         print("Failed to get access token. Cannot proceed with journal entry.")
         return False
 
     # 2. Create Journal Entry
-    journal_entry_result = create_journal_entry_in_zoho_books(current_access_token, payment_details)
+    try:
+        try:
+            journal_entry_result = create_journal_entry_in_zoho_books(current_access_token, payment_details)
+        except ZohoAuthError:
+            # The token was revoked before its expiry; refresh it once and retry
+            current_access_token = invalidate_access_token(current_access_token)
+            journal_entry_result = (
+                create_journal_entry_in_zoho_books(current_access_token, payment_details)
+                if current_access_token else None
+            )
+    except (ZohoAuthError, ZohoRateLimitError) as e:
+        print(f"Error creating journal entry: {e}")
+        journal_entry_result = None
 
     if journal_entry_result:
         journal_id = journal_entry_result['journalentry']['journal_id']
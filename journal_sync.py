@@ -0,0 +1,170 @@
+# journal_sync.py
+# Batch mode for posting journal entries to Zoho Books.
+#
+# Posts many entries in one run instead of one automate_payment_journal_entry()
+# call per payment: all entries share the cached access token from
+# journal_entry.get_access_token() (refreshed once if Zoho rejects it),
+# entries are posted by a small thread pool that stays under Zoho's
+# per-minute API limit, and every posted entry is recorded in a checkpoint
+# file so a rerun skips what already went through.
+#
+# Paid orders are not posted from here: outbox_relay.py posts each one's sales
+# entry as it is paid.
+#
+#   python journal_sync.py payments.json            # vendor payments (JSON list or CSV)
+import argparse
+import csv
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import journal_entry
+from http_clients import RateLimiter
+
+# Zoho Books allows 100 API calls per minute per organization
+ZOHO_RATE_LIMIT_PER_MINUTE = int(os.getenv("ZOHO_RATE_LIMIT_PER_MINUTE", "90"))
+MAX_ATTEMPTS = 3
+
+
+class Checkpoint:
+    """An append-only log of posted entries: one JSON line per {key, journal_id}.
+
+    Each line is flushed and fsynced before the entry counts as done. An entry
+    posted right before a crash (but not yet recorded) will be posted again by
+    the rerun, so check the log for the run's last few references if it died.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.done = set()
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        self.done.add(json.loads(line)["key"])
+                    except (ValueError, KeyError):
+                        pass  # A torn last line from a crash; that entry is simply retried
+        self._file = open(path, "a", encoding="utf-8")
+
+    def record(self, key, journal_id):
+        with self._lock:
+            self._file.write(json.dumps({"key": key, "journal_id": journal_id}) + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self.done.add(key)
+
+    def close(self):
+        self._file.close()
+
+
+# ==== Loading Entries ====
+# Each entry is (checkpoint key, posting function, data for that function).
+
+def load_payments_file(path):
+    """Reads vendor payments (the payment_data dicts of journal_entry.py) from a JSON list or CSV file."""
+    if path.lower().endswith(".csv"):
+        with open(path, newline="", encoding="utf-8") as f:
+            payments = list(csv.DictReader(f))
+        for payment in payments:
+            payment['amount'] = float(payment['amount'])
+            payment['is_accounts_payable_payment'] = str(payment.get('is_accounts_payable_payment', 'true')).lower() in ("1", "true", "yes")
+            payment['direct_expense_account_id'] = payment.get('direct_expense_account_id') or None
+    else:
+        with open(path, encoding="utf-8") as f:
+            payments = json.load(f)
+
+    entries = []
+    for i, payment in enumerate(payments):
+        key = f"PAY-{payment.get('bill_reference') or f'{os.path.basename(path)}:{i}'}"
+        entries.append((key, journal_entry.create_journal_entry_in_zoho_books, payment))
+    return entries
+
+
+# ==== Posting ====
+
+def post_entry(limiter, post, data):
+    """Posts one entry, refreshing the token on 401 and backing off on 429. Returns the journal ID or None."""
+    access_token = journal_entry.get_access_token()
+    for _ in range(MAX_ATTEMPTS):
+        if not access_token:
+            return None
+        limiter.acquire()
+        try:
+            result = post(access_token, data)
+        except journal_entry.ZohoAuthError:
+            access_token = journal_entry.invalidate_access_token(access_token)
+            continue
+        except journal_entry.ZohoRateLimitError as e:
+            limiter.pause(e.retry_after)
+            continue
+        return result['journalentry']['journal_id'] if result else None
+    return None
+
+
+def find_entry(limiter, reference_number):
+    """Returns the journal ID already posted under `reference_number`, or None if there is none.
+
+    Refreshes the token on 401 and backs off on 429 like post_entry(). Raises
+    journal_entry.ZohoLookupError if Zoho could not be asked.
+    """
+    access_token = journal_entry.get_access_token()
+    for _ in range(MAX_ATTEMPTS):
+        if not access_token:
+            break
+        limiter.acquire()
+        try:
+            return journal_entry.find_journal_entry(access_token, reference_number)
+        except journal_entry.ZohoAuthError:
+            access_token = journal_entry.invalidate_access_token(access_token)
+        except journal_entry.ZohoRateLimitError as e:
+            limiter.pause(e.retry_after)
+    raise journal_entry.ZohoLookupError(f"Could not look up journal entry {reference_number}")
+
+
+def sync(entries, checkpoint, workers=4):
+    """Posts all entries not in the checkpoint. Returns (posted, skipped, failed)."""
+    pending = [entry for entry in entries if entry[0] not in checkpoint.done]
+    skipped = len(entries) - len(pending)
+    limiter = RateLimiter(ZOHO_RATE_LIMIT_PER_MINUTE, per=60.0)
+    posted = failed = 0
+
+    def run(entry):
+        key, post, data = entry
+        journal_id = post_entry(limiter, post, data)
+        if journal_id:
+            checkpoint.record(key, journal_id)
+        return key, journal_id
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for key, journal_id in executor.map(run, pending):
+            if journal_id:
+                posted += 1
+            else:
+                failed += 1
+                print(f"Failed to post {key}; it will be retried on the next run.")
+    return posted, skipped, failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Post journal entries to Zoho Books in bulk.")
+    parser.add_argument("payments_file", help="JSON list or CSV of vendor payments")
+    parser.add_argument("--workers", type=int, default=4, help="concurrent requests to Zoho (default 4)")
+    parser.add_argument("--checkpoint", help="checkpoint file (default: derived from the source)")
+    args = parser.parse_args()
+
+    entries = load_payments_file(args.payments_file)
+    checkpoint_path = args.checkpoint or f"{args.payments_file}.checkpoint"
+
+    checkpoint = Checkpoint(checkpoint_path)
+    started = time.monotonic()
+    try:
+        posted, skipped, failed = sync(entries, checkpoint, workers=args.workers)
+    finally:
+        checkpoint.close()
+    print(f"\nPosted {posted}, skipped {skipped} already posted, failed {failed} "
+          f"in {time.monotonic() - started:.1f}s. Checkpoint: {checkpoint_path}")
+    if failed:
+        exit(1)
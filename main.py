@@ -3,6 +3,9 @@ import pandas as pd
 import mysql.connector
 from datetime import datetime, timedelta
 import plotly.express as px
+from rollups import compact
+from dashboard_queries import DashboardQuery, customer_options, product_options, run
+from db import ConnectionPool
 
 # --- App configuration ---
 st.set_page_config(page_title="Hotel Financial Reporting Dashboard", layout="wide")
@@ -53,62 +56,60 @@ DB_USER = "Mokereri"
 DB_PASSWORD = "Kay@2030"
 DB_NAME = "hotel_app_db"
 
-# Function to load data from database
-@st.cache_data(ttl=60) # Cache data for 60 seconds
-def load_data():
-    """Loads data from MySQL database tables (users, orders, order_items)."""
-    try:
-        conn = mysql.connector.connect(
-            host=DB_HOST,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            database=DB_NAME
-        )
-        if not conn.is_connected():
-            st.error("Failed to connect to the database. Please check your MySQL server and credentials.")
-            return pd.DataFrame(), pd.DataFrame(), pd.DataFrame()
-
-        # Fetch users
-        users_df = pd.read_sql("SELECT * FROM users", conn)
-
-        # Fetch orders and items, then join them in pandas for 'sales' view
-        orders_df = pd.read_sql("SELECT * FROM orders", conn)
-        order_items_df = pd.read_sql("SELECT * FROM order_items", conn)
-
-        # Merge order items with orders to get a 'sales-like' view
-        if not orders_df.empty and not order_items_df.empty:
-            sales_data_df = pd.merge(
-                order_items_df,
-                orders_df[['order_id', 'order_date', 'user_email', 'total_amount', 'status']],
-                on='order_id',
-                how='left'
-            )
-            # Calculate total_price per item (already available as price_per_item * quantity)
-            sales_data_df['item_total_price'] = sales_data_df['price_per_item'] * sales_data_df['quantity']
-        else:
-            sales_data_df = pd.DataFrame(columns=[
-                'order_id', 'meal_id', 'meal_name', 'quantity', 'price_per_item',
-                'order_date', 'user_email', 'total_amount', 'status', 'item_total_price'
-            ])
-        
-        conn.close() # Close connection after fetching data
-        return users_df, sales_data_df, orders_df
-    except mysql.connector.Error as err:
-        st.error(f"Error connecting to database or fetching data: {err}. Please ensure your MySQL server is running and credentials are correct.")
-        return pd.DataFrame(), pd.DataFrame(), pd.DataFrame()
+# How often (in seconds) the dashboard re-reads its filter options and rollups
+REFRESH_INTERVAL_SECONDS = 60
+
+@st.cache_resource # One pool per process, shared by all dashboard sessions
+def get_db_pool():
+    """Returns the dashboard's MySQL connection pool."""
+    return ConnectionPool(
+        pool_name="dashboard",
+        pool_size=3,
+        host=DB_HOST,
+        user=DB_USER,
+        password=DB_PASSWORD,
+        database=DB_NAME
+    )
 
-# Load data
-users_df, sales_data_df, orders_df = load_data()
+@st.cache_data(ttl=REFRESH_INTERVAL_SECONDS)
+def compact_rollups():
+    """Compacts recent order changes into the hourly rollup tables.
 
-# Check if data was loaded successfully
-if users_df.empty and sales_data_df.empty and orders_df.empty:
+    Returns False if the rollups could not be brought up to date, in which
+    case the dashboard aggregates the raw tables instead.
+    """
+    try:
+        with get_db_pool().connection() as conn:
+            compact(conn)
+        return True
+    except mysql.connector.Error as err:
+        st.warning(f"Sales rollups unavailable, aggregating raw order data instead: {err}")
+        return False
+
+def run_query(query):
+    """Runs a (sql, params) pair built by DashboardQuery and returns the result as a DataFrame."""
+    with get_db_pool().connection() as conn:
+        return run(conn, query)
+
+@st.cache_data(ttl=REFRESH_INTERVAL_SECONDS)
+def load_filter_options():
+    """Returns the (meal names, customer emails) offered by the filter dropdowns, read with SELECT DISTINCT."""
+    products = run_query(product_options())['meal_name'].tolist()
+    customers = run_query(customer_options())['user_email'].tolist()
+    return products, customers
+
+# Load the filter options
+try:
+    product_names, customer_emails = load_filter_options()
+except mysql.connector.Error as err:
+    st.error(f"Error connecting to database or fetching data: {err}. Please ensure your MySQL server is running and credentials are correct.")
+    st.stop()
+
+# Check if there is any data to report on
+if not product_names and not customer_emails:
     st.warning("No data loaded from the database. Please ensure your MySQL server is running and tables exist.")
     st.stop() # Stop the execution if no data
 
-# Convert 'order_date' to datetime for sales_data_df and orders_df
-sales_data_df['order_date'] = pd.to_datetime(sales_data_df['order_date'])
-orders_df['order_date'] = pd.to_datetime(orders_df['order_date'])
-
 
 # --- Sidebar Filters ---
 st.sidebar.header("Dashboard Filters")
@@ -120,47 +121,51 @@ filter_type = st.sidebar.selectbox(
     index=1 # Default to day for better initial view
 )
 
+# Date range filter (leave empty for all time)
+date_range = st.sidebar.date_input("Filter by date range", value=())
+start_date = date_range[0] if len(date_range) > 0 else None
+end_date = date_range[1] if len(date_range) > 1 else start_date
+
 st.sidebar.markdown("---")
 st.sidebar.subheader("Product and Customer Filters")
 
 # Product filter
-# Get unique product names from sales_data_df, add 'All', and sort
-all_products = ['All'] + sorted(sales_data_df['meal_name'].unique().tolist())
+# Product names ordered so far (sorted by MySQL), with 'All' first
+all_products = ['All'] + product_names
 selected_product = st.sidebar.selectbox("Filter by Product", options=all_products)
 
 # Customer filter
-# Get unique customer emails from orders_df, add 'All', and sort
-all_customers = ['All'] + sorted(orders_df['user_email'].unique().tolist())
+# Emails of customers who have ordered (sorted by MySQL), with 'All' first
+all_customers = ['All'] + customer_emails
 selected_customer = st.sidebar.selectbox("Filter by Customer Email", options=all_customers)
 
 
-# --- Apply Filters to DataFrames ---
-# Create copies to avoid modifying the original loaded dataframes
-filtered_sales_data_df = sales_data_df.copy()
-filtered_orders_df = orders_df.copy()
-
-if selected_product != 'All':
-    # Filter sales data by selected product
-    filtered_sales_data_df = filtered_sales_data_df[filtered_sales_data_df['meal_name'] == selected_product]
-    # Filter orders data to include only orders that contain the selected product
-    filtered_orders_df = filtered_orders_df[filtered_orders_df['order_id'].isin(filtered_sales_data_df['order_id'])]
+# --- Build the filtered query ---
+# Filters are applied in MySQL; only the aggregates each chart needs are fetched.
+# Unfiltered views read the pre-aggregated rollups, product/customer drill-downs the raw tables.
+query = DashboardQuery(
+    product=None if selected_product == 'All' else selected_product,
+    customer=None if selected_customer == 'All' else selected_customer,
+    start_date=start_date,
+    end_date=end_date,
+    allow_rollups=compact_rollups()
+)
 
-if selected_customer != 'All':
-    # Filter orders data by selected customer
-    filtered_orders_df = filtered_orders_df[filtered_orders_df['user_email'] == selected_customer]
-    # Filter sales data to include only items from the selected customer's orders
-    filtered_sales_data_df = filtered_sales_data_df[filtered_sales_data_df['order_id'].isin(filtered_orders_df['order_id'])]
+try:
+    totals = run_query(query.totals()).iloc[0]
+    revenue_products = run_query(query.revenue_by_product())
+except mysql.connector.Error as err:
+    st.error(f"Error querying the database: {err}")
+    st.stop()
 
 # --- Top Metrics (using filtered data) ---
 st.subheader("Key Metrics")
 
-# Calculate metrics using the filtered dataframes
-total_revenue = filtered_orders_df['total_amount'].sum() if not filtered_orders_df.empty else 0
-total_orders = filtered_orders_df.shape[0] if not filtered_orders_df.empty else 0
-# Count unique customers from the filtered orders
-total_customers = filtered_orders_df['user_email'].nunique() if not filtered_orders_df.empty else 0
-# Find the top product based on quantity from filtered sales data
-top_product = filtered_sales_data_df.groupby('meal_name')['quantity'].sum().idxmax() if not filtered_sales_data_df.empty else "N/A"
+total_revenue = float(totals['revenue'])
+total_orders = int(totals['order_count'])
+total_customers = int(totals['customer_count'])
+# Find the top product based on quantity
+top_product = revenue_products.loc[revenue_products['quantity'].idxmax(), 'meal_name'] if not revenue_products.empty else "N/A"
 
 total_profit = total_revenue * ASSUMED_PROFIT_MARGIN_PERCENTAGE # Calculate total profit
 profit_margin_percentage = (total_profit / total_revenue * 100) if total_revenue != 0 else 0 # Calculate profit margin %
@@ -185,63 +190,39 @@ with col6:
 
 ## 📈 Sales Trends Over Time (using filtered data)
 st.subheader("Sales Trends Over Time")
-if not filtered_orders_df.empty:
-    # Group data based on selected time granularity
-    if filter_type == "hour":
-        orders_trend = filtered_orders_df.groupby(filtered_orders_df['order_date'].dt.to_period("H")).sum(numeric_only=True)['total_amount']
-    elif filter_type == "day":
-        orders_trend = filtered_orders_df.groupby(filtered_orders_df['order_date'].dt.to_period("D")).sum(numeric_only=True)['total_amount']
-    elif filter_type == "week":
-        orders_trend = filtered_orders_df.groupby(filtered_orders_df['order_date'].dt.to_period("W")).sum(numeric_only=True)['total_amount']
-    elif filter_type == "month":
-        orders_trend = filtered_orders_df.groupby(filtered_orders_df['order_date'].dt.to_period("M")).sum(numeric_only=True)['total_amount']
-    elif filter_type == "year":
-        orders_trend = filtered_orders_df.groupby(filtered_orders_df['order_date'].dt.to_period("Y")).sum(numeric_only=True)['total_amount']
-    else: # Default to day if something unexpected happens
-        orders_trend = filtered_orders_df.groupby(filtered_orders_df['order_date'].dt.to_period("D")).sum(numeric_only=True)['total_amount']
-
-    orders_trend.index = orders_trend.index.astype(str) # Convert PeriodIndex to string for plotting
-    fig4 = px.line(x=orders_trend.index, y=orders_trend.values, labels={'x':f'{filter_type.capitalize()} of Order', 'y':'Total Revenue (Ksh)'}, title=f"Total Revenue per {filter_type.capitalize()}")
+orders_trend = run_query(query.revenue_trend(filter_type))
+if not orders_trend.empty:
+    orders_trend['period'] = orders_trend['period'].astype(str) # Convert periods to strings for plotting
+    fig4 = px.line(x=orders_trend['period'], y=orders_trend['revenue'], labels={'x':f'{filter_type.capitalize()} of Order', 'y':'Total Revenue (Ksh)'}, title=f"Total Revenue per {filter_type.capitalize()}")
     st.plotly_chart(fig4, use_container_width=True)
 else:
     st.info("No order data available for sales trends with the current filters.")
 
 ## ⏳ Sales Performance: This Week vs. Last Week (using filtered data)
 st.subheader("Sales Performance: This Week vs. Last Week")
-if not filtered_orders_df.empty:
-    # Get current date and calculate start of this week and last week
-    today = datetime.now()
-    # Assuming week starts on Monday (weekday() returns 0 for Monday)
-    this_week_start = today - timedelta(days=today.weekday())
-    last_week_start = this_week_start - timedelta(weeks=1)
-
-    # Filter data for this week and last week
-    this_week_orders = filtered_orders_df[
-        (filtered_orders_df['order_date'] >= this_week_start) &
-        (filtered_orders_df['order_date'] < today + timedelta(days=1)) # Include today
-    ]
-    last_week_orders = filtered_orders_df[
-        (filtered_orders_df['order_date'] >= last_week_start) &
-        (filtered_orders_df['order_date'] < this_week_start)
-    ]
-
-    # Group by day of the week for comparison
-    # Create a full date range to ensure all days are present, even if no sales
-    all_dates = pd.date_range(start=last_week_start, end=today + timedelta(days=1), freq='D')
-    daily_sales_this_week = this_week_orders.groupby(this_week_orders['order_date'].dt.date)['total_amount'].sum().reindex(all_dates.date, fill_value=0)
-    daily_sales_last_week = last_week_orders.groupby(last_week_orders['order_date'].dt.date)['total_amount'].sum().reindex(all_dates.date, fill_value=0)
-
-    # For plotting, align dates to weekdays (e.g., Monday, Tuesday)
+# Get current date and calculate start of this week and last week
+today = datetime.now().date()
+# Assuming week starts on Monday (weekday() returns 0 for Monday)
+this_week_start = today - timedelta(days=today.weekday())
+last_week_start = this_week_start - timedelta(weeks=1)
+
+# Daily revenue over both weeks, aggregated in MySQL
+daily_revenue = run_query(query.with_dates(last_week_start, today).revenue_trend("day"))
+if not daily_revenue.empty:
+    daily_revenue = daily_revenue.set_index(pd.to_datetime(daily_revenue['period']).dt.date)['revenue']
+
+    # Align both weeks by day of the week, filling days without sales with 0
+    week_days = range(7)
+    daily_sales_this_week = [daily_revenue.get(this_week_start + timedelta(days=d), 0) for d in week_days]
+    daily_sales_last_week = [daily_revenue.get(last_week_start + timedelta(days=d), 0) for d in week_days]
     plot_df = pd.DataFrame({
-        'Date': daily_sales_this_week.index,
-        'This Week': daily_sales_this_week.values,
-        'Last Week': daily_sales_last_week.values
+        'Day': [(this_week_start + timedelta(days=d)).strftime('%A') for d in week_days],
+        'This Week': daily_sales_this_week,
+        'Last Week': daily_sales_last_week
     })
-    # Map dates to day names for better X-axis labels
-    plot_df['Day'] = plot_df['Date'].apply(lambda x: pd.to_datetime(x).strftime('%A'))
 
     # Melt DataFrame for Plotly Express
-    plot_melted_df = plot_df.melt(id_vars=['Date', 'Day'], var_name='Week', value_name='Revenue')
+    plot_melted_df = plot_df.melt(id_vars=['Day'], var_name='Week', value_name='Revenue')
 
     fig_weekly_compare = px.line(
         plot_melted_df,
@@ -258,8 +239,8 @@ if not filtered_orders_df.empty:
     st.plotly_chart(fig_weekly_compare, use_container_width=True)
 
     # Display comparison metrics
-    this_week_total = this_week_orders['total_amount'].sum()
-    last_week_total = last_week_orders['total_amount'].sum()
+    this_week_total = float(sum(daily_sales_this_week))
+    last_week_total = float(sum(daily_sales_last_week))
     growth = ((this_week_total - last_week_total) / last_week_total * 100) if last_week_total != 0 else (100 if this_week_total > 0 else 0)
 
     col_w1, col_w2, col_w3 = st.columns(3)
@@ -272,24 +253,12 @@ else:
 
 ## 🔁 Repeat Customers (using filtered data)
 st.subheader("Regular Customers")
-if not filtered_orders_df.empty:
-    customer_order_counts = filtered_orders_df.groupby('user_email')['order_id'].nunique().reset_index()
-    customer_order_counts.columns = ['user_email', 'order_count']
-
-    repeat_customers = customer_order_counts[customer_order_counts['order_count'] > 1]
+if total_orders > 0:
+    repeat_customers = run_query(query.repeat_customers())
 
     if not repeat_customers.empty:
         st.subheader("Customers with Multiple Orders")
-        # Merge with users_df to potentially get more user info if needed
-        repeat_customers_details = pd.merge(
-            repeat_customers,
-            users_df[['email']],
-            left_on='user_email',
-            right_on='email',
-            how='left'
-        ).drop(columns=['email'])
-
-        st.dataframe(repeat_customers_details.sort_values(by='order_count', ascending=False), use_container_width=True)
+        st.dataframe(repeat_customers, use_container_width=True)
 
         st.markdown(f"**Total Repeat Customers:** {repeat_customers.shape[0]}")
     else:
@@ -299,9 +268,10 @@ else:
 
 ## 💸 Profitability Insights (using filtered data)
 st.subheader("Profitability Insights")
-if not filtered_orders_df.empty:
+if total_orders > 0:
     # Profit margin breakdown by order status (example)
-    profit_by_status = filtered_orders_df.groupby('status')['total_amount'].sum() * ASSUMED_PROFIT_MARGIN_PERCENTAGE
+    revenue_by_status = run_query(query.revenue_by_status())
+    profit_by_status = revenue_by_status.set_index('status')['revenue'] * ASSUMED_PROFIT_MARGIN_PERCENTAGE
     if not profit_by_status.empty:
         fig_profit_status = px.pie(
             names=profit_by_status.index,
@@ -317,32 +287,31 @@ else:
 
 ## 💰 Revenue per Product (Treemap) (using filtered data)
 st.subheader("Revenue per Product")
-if not filtered_sales_data_df.empty:
-    revenue_products = filtered_sales_data_df.groupby('meal_name')['item_total_price'].sum().sort_values(ascending=False).reset_index()
-    if not revenue_products.empty:
-        fig_treemap = px.treemap(
-            revenue_products,
-            path=[px.Constant("All Meals"), 'meal_name'], # Create a hierarchy for the treemap
-            values='item_total_price',
-            color='item_total_price',
-            hover_data=['item_total_price'],
-            title="Revenue per Product (Treemap)"
-        )
-        fig_treemap.update_layout(margin = dict(t=50, l=25, r=25, b=25)) # Adjust margins for better display
-        st.plotly_chart(fig_treemap, use_container_width=True)
-    else:
-        st.info("No revenue data available for treemap visualization with the current filters.")
+if not revenue_products.empty:
+    fig_treemap = px.treemap(
+        revenue_products,
+        path=[px.Constant("All Meals"), 'meal_name'], # Create a hierarchy for the treemap
+        values='revenue',
+        color='revenue',
+        hover_data=['revenue'],
+        title="Revenue per Product (Treemap)"
+    )
+    fig_treemap.update_layout(margin = dict(t=50, l=25, r=25, b=25)) # Adjust margins for better display
+    st.plotly_chart(fig_treemap, use_container_width=True)
 else:
     st.info("No sales data available for treemap visualization with the current filters.")
 
 
 ## ⬇️ Download Data (using filtered data)
 st.subheader("Download Data")
-if not filtered_sales_data_df.empty:
-    csv = filtered_sales_data_df.to_csv(index=False)
-    st.download_button("Download Filtered Data", csv, "filtered_order_items_data.csv", "text/csv")
-else:
-    st.info("No order items data available to download with the current filters.")
+# Raw rows are only fetched when an export is requested
+if st.button("Prepare Filtered Data for Download"):
+    export_df = run_query(query.sales_rows())
+    if not export_df.empty:
+        csv = export_df.to_csv(index=False)
+        st.download_button("Download Filtered Data", csv, "filtered_order_items_data.csv", "text/csv")
+    else:
+        st.info("No order items data available to download with the current filters.")
 
 # --- Data Sync Options ---
 # Initialize autosync state
@@ -358,7 +327,8 @@ with st.sidebar:
     st.session_state.autosync_enabled = st.checkbox("Enable Auto-Sync (Every Minute)", value=st.session_state.autosync_enabled)
 
     if st.button("🔄 Sync Data Now"):
-        st.cache_data.clear() # Clear the cache to force data reload
+        load_filter_options.clear() # Re-read the filter options on the next run
+        compact_rollups.clear() # Re-compact the rollups on the next run
         st.session_state.last_sync_time = datetime.now() # Update last sync time
         st.success("Data synced successfully! Dashboard will refresh.")
         st.rerun() # Use st.rerun() to immediately trigger a reload of data
@@ -368,6 +338,7 @@ with st.sidebar:
 
         # Check if 1 minute has passed since last sync
         if (datetime.now() - st.session_state.last_sync_time).total_seconds() >= 60:
-            st.cache_data.clear()
+            load_filter_options.clear()
+            compact_rollups.clear()
             st.session_state.last_sync_time = datetime.now()
             st.rerun()
@@ -0,0 +1,136 @@
+# menu_catalog.py
+# The menu (migrations/0008_menu_catalog.sql), served from an in-process cache.
+#
+# The whole menu is small, so it is loaded once per process and kept as ready
+# to render per-language lists. Reruns read the cache; at most every
+# `check_interval` seconds one process-wide query reads menu_version (a single
+# primary-key row) and the menu is only reloaded if the version changed.
+# Admin edits bump the version in the same transaction, so every worker picks
+# up a new price or a sold-out dish within `check_interval` seconds.
+import logging
+import threading
+import time
+
+import mysql.connector
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LANGUAGE = "English"
+
+
+class MenuCatalog:
+    """Cached menu, reloaded when menu_version changes.
+
+    `connect` is a callable returning a DB-API connection; it is closed after
+    each use. Meals are returned as dicts with 'id', 'name', 'description'
+    (in the requested language, falling back to English), 'canonical_name'
+    (the English name, used for order records), 'price', 'image' and
+    'available'. Treat them as read-only; they are shared between sessions.
+    """
+
+    def __init__(self, connect, check_interval=5.0):
+        self.connect = connect
+        self.check_interval = check_interval
+        self.version = None
+        self._by_language = {}
+        self._last_check = None
+        self._lock = threading.Lock()
+
+    def meals(self, language=DEFAULT_LANGUAGE, include_unavailable=False):
+        """Returns the menu in `language`, in display order.
+
+        Raises mysql.connector.Error only if the menu has never been loaded;
+        afterwards a failed version check keeps serving the cached menu.
+        """
+        self._refresh_if_due()
+        meals = self._by_language.get(language) or self._by_language.get(DEFAULT_LANGUAGE, [])
+        return meals if include_unavailable else [meal for meal in meals if meal['available']]
+
+    def invalidate(self):
+        """Forces a version check on the next read."""
+        self._last_check = None
+
+    def _refresh_if_due(self):
+        if self._last_check is not None and time.monotonic() - self._last_check < self.check_interval:
+            return
+        with self._lock:
+            if self._last_check is not None and time.monotonic() - self._last_check < self.check_interval:
+                return  # Another session just checked
+            try:
+                conn = self.connect()
+                try:
+                    cursor = conn.cursor(dictionary=True)
+                    try:
+                        cursor.execute("SELECT version FROM menu_version WHERE id = 1")
+                        row = cursor.fetchone()
+                        version = row['version'] if row else 0
+                        if version != self.version or not self._by_language:
+                            self._load(cursor)
+                            self.version = version
+                    finally:
+                        cursor.close()
+                finally:
+                    conn.close()
+            except mysql.connector.Error as err:
+                if not self._by_language:
+                    raise
+                logger.warning(f"Menu version check failed; serving cached menu version {self.version}: {err}")
+            self._last_check = time.monotonic()
+
+    def _load(self, cursor):
+        cursor.execute(
+            "SELECT m.id, m.price, m.image_url, m.available, t.language, t.name, t.description "
+            "FROM meals m JOIN meal_translations t ON t.meal_id = m.id "
+            "ORDER BY m.sort_order, m.id"
+        )
+        rows = cursor.fetchall()
+        english = {row['id']: row for row in rows if row['language'] == DEFAULT_LANGUAGE}
+        by_language = {}
+        for row in rows:
+            by_language.setdefault(row['language'], {})[row['id']] = row
+
+        meal_ids = list(dict.fromkeys(row['id'] for row in rows))
+        self._by_language = {
+            language: [
+                self._meal(translations.get(meal_id) or english[meal_id], english.get(meal_id))
+                for meal_id in meal_ids if meal_id in translations or meal_id in english
+            ]
+            for language, translations in by_language.items()
+        }
+        logger.info(f"Loaded menu: {len(meal_ids)} meals in {len(self._by_language)} languages.")
+
+    @staticmethod
+    def _meal(row, english_row):
+        return {
+            'id': row['id'],
+            'name': row['name'],
+            'description': row['description'],
+            'canonical_name': (english_row or row)['name'],
+            'price': float(row['price']),
+            'image': row['image_url'],
+            'available': bool(row['available']),
+        }
+
+    # ==== Admin Edits ====
+
+    def _edit(self, sql, params):
+        """Runs one meals UPDATE and bumps the menu version in the same transaction."""
+        conn = self.connect()
+        cursor = conn.cursor()
+        try:
+            cursor.execute(sql, params)
+            cursor.execute("UPDATE menu_version SET version = version + 1 WHERE id = 1")
+            conn.commit()
+        except mysql.connector.Error:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+            conn.close()
+        self.invalidate()
+
+    def set_price(self, meal_id, price):
+        self._edit("UPDATE meals SET price = %s WHERE id = %s", (price, meal_id))
+
+    def set_available(self, meal_id, available):
+        self._edit("UPDATE meals SET available = %s WHERE id = %s", (bool(available), meal_id))
@@ -0,0 +1,226 @@
+# migrate.py
+# Versioned schema migrations for hotel_app_db.
+#
+# Each file in migrations/ is named NNNN_description.sql and is applied once, in
+# order. Applied versions are recorded in the schema_migrations table.
+#
+#   python migrate.py              # apply all pending migrations
+#   python migrate.py status       # list applied and pending migrations
+#   python migrate.py baseline 2   # mark 0001-0002 as applied (databases set up by hand)
+#   python migrate.py check        # EXPLAIN the hot queries and fail on full table scans
+import argparse
+import os
+import re
+import sys
+
+import mysql.connector
+
+import db
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+MIGRATION_FILE_RE = re.compile(r"^(\d{4})_(\w+)\.sql$")
+
+# The queries the app runs on every page load, with representative parameters.
+# `check` fails if MySQL would answer any of them with a full table scan.
+CHECKED_QUERIES = {
+    "order history page": (
+        "SELECT * FROM orders WHERE user_email = %s ORDER BY order_date DESC, order_id DESC LIMIT 11",
+        ("customer@example.com",),
+    ),
+    "order history items": (
+        "SELECT * FROM order_items WHERE order_id IN (%s, %s) ORDER BY id",
+        ("order-1", "order-2"),
+    ),
+    "order lookup": (
+        "SELECT * FROM orders WHERE order_id = %s",
+        ("order-1",),
+    ),
+    "order details": (
+        "SELECT o.*, i.id FROM orders o LEFT JOIN order_items i ON i.order_id = o.order_id "
+        "WHERE o.order_id = %s ORDER BY i.id",
+        ("order-1",),
+    ),
+    "payment callback update": (
+        "SELECT order_id FROM orders WHERE checkout_request_id = %s",
+        ("ws_CO_000000000000000000",),
+    ),
+    "orders by status": (
+        "SELECT * FROM orders WHERE status = %s ORDER BY order_date",
+        ("Pending Payment Confirmation",),
+    ),
+    "orders by date range": (
+        "SELECT * FROM orders WHERE order_date >= %s AND order_date < %s",
+        ("2025-01-01", "2025-02-01"),
+    ),
+    "stale pending orders": (
+        "SELECT o.order_id FROM orders o LEFT JOIN payment_reconciliation r ON r.order_id = o.order_id "
+        "WHERE o.status = %s AND o.order_date >= %s AND o.order_date < %s "
+        "AND (r.next_check_at IS NULL OR r.next_check_at <= NOW()) ORDER BY o.order_date, o.order_id LIMIT 50",
+        ("Pending Payment Confirmation", "2025-01-01", "2025-01-02"),
+    ),
+    "menu version check": (
+        "SELECT version FROM menu_version WHERE id = 1",
+        (),
+    ),
+    "accounting outbox batch": (
+        "SELECT id, order_id FROM accounting_outbox "
+        "WHERE processed_at IS NULL AND available_at <= NOW() ORDER BY id LIMIT 50",
+        (),
+    ),
+    "dashboard product options": (
+        "SELECT DISTINCT meal_name FROM order_items ORDER BY meal_name",
+        (),
+    ),
+    "dashboard customer options": (
+        "SELECT DISTINCT user_email FROM orders ORDER BY user_email",
+        (),
+    ),
+}
+
+
+def discover_migrations():
+    """Returns [(version, name, path)] for every migration file, sorted by version."""
+    migrations = []
+    for filename in os.listdir(MIGRATIONS_DIR):
+        match = MIGRATION_FILE_RE.match(filename)
+        if match:
+            migrations.append((int(match.group(1)), match.group(2), os.path.join(MIGRATIONS_DIR, filename)))
+    migrations.sort()
+    versions = [version for version, _, _ in migrations]
+    if len(versions) != len(set(versions)):
+        raise ValueError("Duplicate migration version numbers in migrations/.")
+    return migrations
+
+
+def split_statements(sql):
+    """Splits a migration file into statements, dropping comment-only lines."""
+    lines = [line for line in sql.splitlines() if not line.strip().startswith("--")]
+    return [statement.strip() for statement in "\n".join(lines).split(";") if statement.strip()]
+
+
+def ensure_migrations_table(cursor):
+    cursor.execute(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        " version INT PRIMARY KEY,"
+        " name VARCHAR(255) NOT NULL,"
+        " applied_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP"
+        ")"
+    )
+
+
+def applied_versions(cursor):
+    cursor.execute("SELECT version FROM schema_migrations")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def migrate(conn):
+    """Applies all pending migrations in order. Returns the versions applied.
+
+    MySQL commits DDL implicitly, so a migration that fails part-way is not
+    rolled back; fix the database by hand and re-run (or baseline past it).
+    """
+    cursor = conn.cursor()
+    try:
+        ensure_migrations_table(cursor)
+        done = applied_versions(cursor)
+        applied = []
+        for version, name, path in discover_migrations():
+            if version in done:
+                continue
+            print(f"Applying {version:04d}_{name}...")
+            with open(path, encoding="utf-8") as f:
+                for statement in split_statements(f.read()):
+                    cursor.execute(statement)
+            cursor.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", (version, name))
+            conn.commit()
+            applied.append(version)
+        return applied
+    finally:
+        cursor.close()
+
+
+def baseline(conn, up_to_version):
+    """Records migrations up to `up_to_version` as applied without running them."""
+    cursor = conn.cursor()
+    try:
+        ensure_migrations_table(cursor)
+        rows = [(version, name) for version, name, _ in discover_migrations() if version <= up_to_version]
+        cursor.executemany("INSERT IGNORE INTO schema_migrations (version, name) VALUES (%s, %s)", rows)
+        conn.commit()
+        return [version for version, _ in rows]
+    finally:
+        cursor.close()
+
+
+def status(conn):
+    """Returns [(version, name, applied)] for every known migration."""
+    cursor = conn.cursor()
+    try:
+        ensure_migrations_table(cursor)
+        done = applied_versions(cursor)
+        return [(version, name, version in done) for version, name, _ in discover_migrations()]
+    finally:
+        cursor.close()
+
+
+def check_query_plans(conn):
+    """EXPLAINs CHECKED_QUERIES. Returns a list of problems; empty means every query uses an index.
+
+    A full scan with no usable index is an error. A full scan where MySQL had a
+    usable index but preferred scanning (common on near-empty tables) is only
+    reported as a warning.
+    """
+    problems = []
+    cursor = conn.cursor(dictionary=True)
+    try:
+        for label, (query, params) in CHECKED_QUERIES.items():
+            cursor.execute("EXPLAIN " + query, params)
+            for row in cursor.fetchall():
+                if row.get("type") != "ALL":
+                    continue
+                if row.get("possible_keys"):
+                    print(f"Warning: '{label}' scans {row['table']} although {row['possible_keys']} could be used "
+                          f"(the table may be too small for the optimizer to bother).")
+                else:
+                    problems.append(f"'{label}' does a full table scan of {row['table']}: {query}")
+    finally:
+        cursor.close()
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Apply and verify hotel_app_db schema migrations.")
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.add_parser("up", help="apply pending migrations (default)")
+    subparsers.add_parser("status", help="list applied and pending migrations")
+    baseline_parser = subparsers.add_parser("baseline", help="mark migrations as applied without running them")
+    baseline_parser.add_argument("version", type=int)
+    subparsers.add_parser("check", help="fail if a hot query falls back to a full table scan")
+    args = parser.parse_args(argv)
+
+    try:
+        with db.get_pool().connection() as conn:
+            if args.command == "status":
+                for version, name, is_applied in status(conn):
+                    print(f"{version:04d}_{name}: {'applied' if is_applied else 'pending'}")
+            elif args.command == "baseline":
+                versions = baseline(conn, args.version)
+                print(f"Marked {len(versions)} migration(s) as applied.")
+            elif args.command == "check":
+                problems = check_query_plans(conn)
+                for problem in problems:
+                    print(f"Error: {problem}")
+                if problems:
+                    return 1
+                print("All checked queries use an index.")
+            else:
+                applied = migrate(conn)
+                print(f"Applied {len(applied)} migration(s)." if applied else "Database is up to date.")
+    except mysql.connector.Error as err:
+        print(f"Database error: {err}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
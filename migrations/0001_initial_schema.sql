@@ -0,0 +1,31 @@
+-- Base tables, as originally defined in hotel_app_db.sql.
+
+-- Users table (for basic login, still not fully secure without hashing)
+CREATE TABLE IF NOT EXISTS users (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    email VARCHAR(255) UNIQUE NOT NULL,
+    password VARCHAR(255) NOT NULL -- In a real app, hash this password!
+);
+
+-- Orders table
+CREATE TABLE IF NOT EXISTS orders (
+    order_id VARCHAR(255) PRIMARY KEY,
+    user_email VARCHAR(255) NOT NULL,
+    order_date DATETIME NOT NULL,
+    total_amount DECIMAL(10, 2) NOT NULL,
+    status VARCHAR(50) NOT NULL DEFAULT 'Pending',
+    personalization_name VARCHAR(255),
+    personalization_phone VARCHAR(255),
+    personalization_message TEXT
+);
+
+-- Order Items table
+CREATE TABLE IF NOT EXISTS order_items (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    order_id VARCHAR(255) NOT NULL,
+    meal_id INT NOT NULL,
+    meal_name VARCHAR(255) NOT NULL,
+    quantity INT NOT NULL,
+    price_per_item DECIMAL(10, 2) NOT NULL,
+    FOREIGN KEY (order_id) REFERENCES orders(order_id)
+);
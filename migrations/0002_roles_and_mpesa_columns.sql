@@ -0,0 +1,23 @@
+-- The ALTER scripts that used to be run by hand from edgewood.sql.
+
+-- 'role' column for Role-Based Access Control ('user' or 'admin').
+-- Existing admins need their role set manually, e.g.:
+-- UPDATE users SET role = 'admin' WHERE email = 'admin@kitchen.com';
+ALTER TABLE users
+ADD COLUMN role VARCHAR(50) NOT NULL DEFAULT 'user';
+
+-- Track M-Pesa STK Push requests
+ALTER TABLE orders
+ADD COLUMN checkout_request_id VARCHAR(255) UNIQUE NULL AFTER status;
+
+-- Unique M-Pesa transaction ID
+ALTER TABLE orders
+ADD COLUMN mpesa_receipt_number VARCHAR(255) NULL AFTER checkout_request_id;
+
+-- When the M-Pesa payment occurred
+ALTER TABLE orders
+ADD COLUMN mpesa_transaction_date DATETIME NULL AFTER mpesa_receipt_number;
+
+-- New orders wait for the M-Pesa callback before they are considered paid
+ALTER TABLE orders
+MODIFY COLUMN status VARCHAR(50) DEFAULT 'Pending Payment Confirmation';
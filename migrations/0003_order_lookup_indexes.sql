@@ -0,0 +1,13 @@
+-- Indexes for the hot lookup paths.
+
+-- Order history: WHERE user_email = ? ORDER BY order_date DESC, order_id DESC
+CREATE INDEX idx_orders_user_date ON orders (user_email, order_date, order_id);
+
+-- Dashboard and admin views: WHERE status = ? (optionally within a date range)
+CREATE INDEX idx_orders_status_date ON orders (status, order_date);
+
+-- Dashboard date-range scans across all customers
+CREATE INDEX idx_orders_order_date ON orders (order_date);
+
+-- Item lookups by order; also covers the order_items -> orders foreign key
+CREATE INDEX idx_order_items_order_meal ON order_items (order_id, meal_id);
@@ -0,0 +1,6 @@
+-- Change tracking for incremental dashboard loads: every INSERT or UPDATE of an
+-- order (including status changes) bumps updated_at.
+ALTER TABLE orders
+ADD COLUMN updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP;
+
+CREATE INDEX idx_orders_updated_at ON orders (updated_at);
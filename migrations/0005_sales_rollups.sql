@@ -0,0 +1,36 @@
+-- Pre-aggregated sales rollups for the financial dashboard, maintained by rollups.py.
+
+-- Revenue and order count per hour and order status
+CREATE TABLE IF NOT EXISTS sales_rollup_hourly (
+    hour_start DATETIME NOT NULL,
+    status VARCHAR(50) NOT NULL,
+    revenue DECIMAL(14, 2) NOT NULL,
+    order_count INT NOT NULL,
+    PRIMARY KEY (hour_start, status)
+);
+
+-- Quantity, revenue and order count per hour and meal
+CREATE TABLE IF NOT EXISTS meal_rollup_hourly (
+    hour_start DATETIME NOT NULL,
+    meal_id INT NOT NULL,
+    meal_name VARCHAR(255) NOT NULL,
+    quantity INT NOT NULL,
+    revenue DECIMAL(14, 2) NOT NULL,
+    order_count INT NOT NULL,
+    PRIMARY KEY (hour_start, meal_id)
+);
+
+-- Revenue and order count per hour and customer
+CREATE TABLE IF NOT EXISTS customer_rollup_hourly (
+    hour_start DATETIME NOT NULL,
+    user_email VARCHAR(255) NOT NULL,
+    revenue DECIMAL(14, 2) NOT NULL,
+    order_count INT NOT NULL,
+    PRIMARY KEY (hour_start, user_email)
+);
+
+-- How far the compactor has got, as an orders.updated_at high-water mark
+CREATE TABLE IF NOT EXISTS rollup_state (
+    name VARCHAR(64) PRIMARY KEY,
+    high_water_mark DATETIME NULL
+);
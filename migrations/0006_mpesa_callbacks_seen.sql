@@ -0,0 +1,9 @@
+-- Payment results that have already been applied to orders, so retried
+-- M-Pesa callbacks can be recognized and skipped (see idempotency.py).
+CREATE TABLE IF NOT EXISTS mpesa_callbacks_seen (
+    checkout_request_id VARCHAR(255) PRIMARY KEY,
+    mpesa_receipt_number VARCHAR(255) NULL,
+    status VARCHAR(50) NOT NULL,
+    first_seen_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_callbacks_seen_receipt (mpesa_receipt_number)
+);
@@ -0,0 +1,18 @@
+-- Accounting events waiting to be posted to Zoho Books. Rows are written in the
+-- same transaction as the order change that caused them (see
+-- apply_payment_updates() in mpesa_callback_handler.py) and drained by outbox_relay.py.
+CREATE TABLE IF NOT EXISTS accounting_outbox (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    event_type VARCHAR(50) NOT NULL,
+    order_id VARCHAR(255) NOT NULL,
+    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    available_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    attempts INT NOT NULL DEFAULT 0,
+    processed_at DATETIME NULL,
+    journal_id VARCHAR(100) NULL,
+    last_error TEXT NULL,
+    -- One event of each type per order, so re-applied updates don't post twice
+    UNIQUE KEY uq_outbox_event (event_type, order_id),
+    INDEX idx_outbox_pending (processed_at, available_at, id),
+    FOREIGN KEY (order_id) REFERENCES orders(order_id)
+);
@@ -0,0 +1,77 @@
+-- The menu, editable without a redeploy (see menu_catalog.py). Seeded with the
+-- dishes that used to be hardcoded in Hotel.py and prototype.py.
+CREATE TABLE IF NOT EXISTS meals (
+    id INT PRIMARY KEY,
+    price DECIMAL(10, 2) NOT NULL,
+    image_url VARCHAR(512) NOT NULL,
+    available BOOLEAN NOT NULL DEFAULT TRUE,
+    sort_order INT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+);
+
+-- Dish names and descriptions per language ('English', 'Kiswahili', 'Chinese', 'French')
+CREATE TABLE IF NOT EXISTS meal_translations (
+    meal_id INT NOT NULL,
+    language VARCHAR(20) NOT NULL,
+    name VARCHAR(255) NOT NULL,
+    description TEXT NOT NULL,
+    PRIMARY KEY (meal_id, language),
+    FOREIGN KEY (meal_id) REFERENCES meals(id)
+) DEFAULT CHARSET = utf8mb4;
+
+-- Bumped on every menu edit; app processes poll it to know when to reload their cached menu
+CREATE TABLE IF NOT EXISTS menu_version (
+    id TINYINT PRIMARY KEY,
+    version BIGINT NOT NULL
+);
+
+INSERT IGNORE INTO menu_version (id, version) VALUES (1, 1);
+
+INSERT IGNORE INTO meals (id, price, image_url, sort_order) VALUES
+    (1, 90.00, 'https://raw.githubusercontent.com/Mokereri/webpage/refs/heads/main/Assets/images/Chapati_beans.jpeg', 1),
+    (2, 20.00, 'https://github.com/Mokereri/webpage/blob/main/Assets/images/cup%20of%20chai.jpeg?raw=true', 2),
+    (3, 100.00, 'https://github.com/Mokereri/webpage/blob/main/Assets/images/ugali-omena.jpeg?raw=true', 3),
+    (4, 100.00, 'https://github.com/Mokereri/webpage/blob/main/Assets/images/rice_beans.jpeg?raw=true', 4),
+    (5, 170.00, 'https://github.com/Mokereri/webpage/blob/main/Assets/images/rice_beef.jpeg?raw=true', 5),
+    (6, 140.00, 'https://github.com/Mokereri/webpage/blob/main/Assets/images/ugali_matumbo.jpeg?raw=true', 6),
+    (7, 320.00, 'https://github.com/Mokereri/webpage/blob/main/Assets/images/Chicken_masala.jpeg?raw=true', 7),
+    (8, 280.00, 'https://github.com/Mokereri/webpage/blob/main/Assets/images/beef_stew.jpeg?raw=true', 8),
+    (9, 350.00, 'https://github.com/Mokereri/webpage/blob/main/Assets/images/chicken%20pasta.jpeg?raw=true', 9);
+
+INSERT IGNORE INTO meal_translations (meal_id, language, name, description) VALUES
+    (1, 'English', 'Chapati Beans', 'Served with steamed vegetables'),
+    (1, 'Kiswahili', 'Chapati Maharagwe', 'Imetolewa na mboga zilizopikwa'),
+    (1, 'Chinese', '豆饼', '配蒸蔬菜'),
+    (1, 'French', 'Chapati Haricots', 'Servi avec des légumes vapeur'),
+    (2, 'English', 'Cup of Tea', 'Milk tea with sugar'),
+    (2, 'Kiswahili', 'Kikombe cha Chai', 'Chai ya maziwa na sukari'),
+    (2, 'Chinese', '一杯茶', '加糖奶茶'),
+    (2, 'French', 'Tasse de thé', 'Thé au lait sucré'),
+    (3, 'English', 'Ugali Omena', 'Served with fresh vegetables'),
+    (3, 'Kiswahili', 'Ugali na Omena', 'Imetolewa na mboga mbichi'),
+    (3, 'Chinese', '玉米粥配银鱼', '配新鲜蔬菜'),
+    (3, 'French', 'Ugali Omena', 'Servi avec des légumes frais'),
+    (4, 'English', 'Rice Beans', 'Steamed rice with seasoned beans'),
+    (4, 'Kiswahili', 'Mchele Maharagwe', 'Mchele na maharagwe yaliyopikwa vizuri'),
+    (4, 'Chinese', '米饭和豆类', '蒸米配调味豆'),
+    (4, 'French', 'Riz Haricots', 'Riz vapeur avec haricots assaisonnés'),
+    (5, 'English', 'Rice Beef', 'Spiced rice served with beef stew'),
+    (5, 'Kiswahili', 'Mchele Nyama', 'Mchele wa viungo na mchuzi wa nyama'),
+    (5, 'Chinese', '米饭和牛肉', '香料米饭配炖牛肉'),
+    (5, 'French', 'Riz Bœuf', 'Riz épicé avec ragoût de bœuf'),
+    (6, 'English', 'Ugali Matumbo', 'Tender beef tripe served with ugali'),
+    (6, 'Kiswahili', 'Ugali na Matumbo', 'Matumbo laini na ugali'),
+    (6, 'Chinese', '玉米粥和牛肚', '嫩牛肚配玉米粥'),
+    (6, 'French', 'Ugali Matumbo', 'Tripes tendres avec ugali'),
+    (7, 'English', 'Chicken Masala', 'Deliciously spiced chicken in a creamy masala sauce'),
+    (7, 'Kiswahili', 'Kuku Masala', 'Kuku ya viungo kwenye mchuzi wa krimu'),
+    (7, 'Chinese', '马萨拉鸡', '香料鸡配奶油酱'),
+    (7, 'French', 'Poulet Masala', 'Poulet épicé dans une sauce masala crémeuse'),
+    (8, 'English', 'Beef Stew', 'Tender beef chunks in a rich stew sauce'),
+    (8, 'Kiswahili', 'Mchuzi wa Nyama', 'Vipande vya nyama kwenye mchuzi'),
+    (8, 'Chinese', '炖牛肉', '嫩牛肉配浓郁酱'),
+    (8, 'French', 'Ragoût de bœuf', 'Morceaux de bœuf dans une sauce riche'),
+    (9, 'English', 'Chicken Pasta', 'Creamy pasta tossed with grilled chicken'),
+    (9, 'Kiswahili', 'Pasta ya Kuku', 'Pasta ya krimu na kuku wa kuchoma'),
+    (9, 'Chinese', '鸡肉意面', '奶油意面配烤鸡'),
+    (9, 'French', 'Pâtes au poulet', 'Pâtes crémeuses au poulet grillé');
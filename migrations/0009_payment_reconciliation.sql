@@ -0,0 +1,10 @@
+-- Pending orders the reconciler (reconciler.py) has asked Daraja about without
+-- getting a final answer, and when to ask again. Kept apart from orders so the
+-- checks don't bump orders.updated_at; rows are deleted once an order is settled.
+CREATE TABLE IF NOT EXISTS payment_reconciliation (
+    order_id VARCHAR(255) PRIMARY KEY,
+    checks INT NOT NULL DEFAULT 0,
+    next_check_at DATETIME NOT NULL,
+    last_result VARCHAR(255) NULL,
+    FOREIGN KEY (order_id) REFERENCES orders(order_id)
+);
@@ -0,0 +1,3 @@
+-- Dashboard product filter: SELECT DISTINCT meal_name FROM order_items, and
+-- drill-downs matching order_items.meal_name, read this index instead of the table.
+CREATE INDEX idx_order_items_meal_name ON order_items (meal_name);
@@ -0,0 +1,11 @@
+-- Payment results that arrived before any order had their CheckoutRequestID
+-- (the callback beat the order's link to its STK push). Kept until the order
+-- is linked, then applied and deleted by payments.apply_parked_updates(), so
+-- the receipt number in the callback is not lost.
+CREATE TABLE IF NOT EXISTS mpesa_unmatched_callbacks (
+    checkout_request_id VARCHAR(255) PRIMARY KEY,
+    status VARCHAR(50) NOT NULL,
+    mpesa_receipt_number VARCHAR(255) NULL,
+    mpesa_transaction_date DATETIME NULL,
+    received_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+);
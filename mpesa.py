@@ -0,0 +1,103 @@
+# mpesa.py
+# M-Pesa STK Push for the Streamlit app (Hotel.py), defined once per process
+# rather than on every rerun. Failures are logged and returned as
+# {"error": ...} for the caller to show. request_order_payment() is what the
+# checkout runs on a background executor.
+import base64
+import logging
+from datetime import datetime
+
+import mysql.connector
+import requests
+from decouple import config
+
+import hotel_db
+import mpesa_auth
+
+logger = logging.getLogger(__name__)
+
+def get_access_token(consumer_key, consumer_secret):
+    """Returns the M-Pesa API access token, cached process-wide until shortly before it expires."""
+    try:
+        return mpesa_auth.get_access_token(consumer_key, consumer_secret)
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Error getting access token: {e}")
+        return None
+
+def stk_credentials():
+    """Returns (business_shortcode, password, timestamp) for an STK Push or STK Push Query request."""
+    timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+    business_shortcode = config("BUSINESS_SHORTCODE")
+    passkey = config("PASSKEY") # This is the raw passkey, not encoded yet
+    data_to_encode = business_shortcode + passkey + timestamp
+    password = base64.b64encode(data_to_encode.encode()).decode()
+    return business_shortcode, password, timestamp
+
+def stk_push_payload(phone_number, amount, account_reference, transaction_desc):
+    """Builds the STK Push request body, including the timestamped password."""
+    business_shortcode, password, timestamp = stk_credentials()
+    return {
+        "BusinessShortCode": business_shortcode,
+        "Password": password,
+        "Timestamp": timestamp,
+        "TransactionType": "CustomerPayBillOnline",
+        "Amount": amount,
+        "PartyA": phone_number,
+        "PartyB": business_shortcode,
+        "PhoneNumber": phone_number,
+        "CallBackURL": config("CALLBACK_URL"),
+        "AccountReference": account_reference, # Use order_id for reference
+        "TransactionDesc": transaction_desc
+    }
+
+def lipa_na_mpesa_online(phone_number, amount, account_reference, transaction_desc):
+    """Initiates an M-Pesa STK Push transaction."""
+    access_token = get_access_token(
+        config("CONSUMER_KEY"), config("CONSUMER_SECRET")
+    )
+    if not access_token:
+        return {"error": "Failed to get access token"}
+
+    payload = stk_push_payload(phone_number, amount, account_reference, transaction_desc)
+
+    headers = {
+        "Authorization": f"Bearer {access_token}",
+        "Content-Type": "application/json"
+    }
+
+    try:
+        response = mpesa_auth.daraja_client().post(
+            "/mpesa/stkpush/v1/processrequest",
+            json=payload,
+            headers=headers
+        )
+        if response.status_code == 401:
+            # The cached token was revoked early; fetch a fresh one next time
+            mpesa_auth.get_token_cache(config("CONSUMER_KEY"), config("CONSUMER_SECRET")).invalidate()
+        response.raise_for_status()
+        return response.json()
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Error during M-Pesa STK Push: {e}")
+        return {"error": f"Network or API error: {e}"}
+
+def request_order_payment(order_id, phone_number, amount, account_reference, transaction_desc):
+    """Sends the STK Push for an order already saved as pending, and records the outcome on it.
+
+    Meant to run on a background executor, so a slow Daraja response doesn't
+    hold up the page. If the push is accepted, the order is linked to its
+    CheckoutRequestID for the callback; otherwise it is marked "Payment Failed".
+    Returns the STK Push response (or {"error": ...}). Streamlit calls don't
+    work on this thread, so a database error is logged and returned as
+    "db_error" for the page to show.
+    """
+    try:
+        response = lipa_na_mpesa_online(phone_number, amount, account_reference, transaction_desc)
+    except Exception as e:
+        logger.exception(f"STK Push for order {order_id} failed")
+        response = {"error": str(e)}
+    try:
+        hotel_db.record_payment_request(order_id, response.get("CheckoutRequestID"))
+    except mysql.connector.Error as err:
+        logger.error(f"Error recording the payment request of order {order_id}: {err}")
+        response = {**response, "db_error": f"Error linking order to payment request: {err}"}
+    return response
@@ -0,0 +1,133 @@
+# mpesa_auth.py
+# Process-wide cache of Daraja OAuth access tokens.
+#
+# Fetching a token is a full HTTPS round trip to /oauth/v1/generate. Tokens are
+# valid for an hour (expires_in), so one is fetched once, shared by every
+# checkout in the process and refreshed in the background shortly before it
+# expires. Concurrent callers that find no valid token wait for a single fetch
+# instead of each calling the OAuth endpoint.
+import base64
+import logging
+import threading
+import time
+
+import requests
+from decouple import config
+
+import http_clients
+
+logger = logging.getLogger(__name__)
+
+# Point this at a local stub server to exercise the M-Pesa flow offline.
+DARAJA_BASE_URL = config("DARAJA_BASE_URL", default="https://sandbox.safaricom.co.ke").rstrip("/")
+
+
+def daraja_client():
+    """Returns the shared, pooled HTTP client for the Daraja API."""
+    return http_clients.get_client("daraja", DARAJA_BASE_URL)
+
+
+def fetch_access_token(consumer_key, consumer_secret):
+    """Requests a new access token from Daraja. Returns (token, expires_in_seconds).
+
+    Raises requests.exceptions.RequestException on network or HTTP errors.
+    """
+    auth_string = f"{consumer_key}:{consumer_secret}"
+    encoded = base64.b64encode(auth_string.encode()).decode()
+
+    response = daraja_client().get(
+        "/oauth/v1/generate",
+        headers={"Authorization": f"Basic {encoded}"},
+        params={"grant_type": "client_credentials"}
+    )
+    response.raise_for_status()
+    token_data = response.json()
+    token = token_data.get("access_token")
+    if not token:
+        raise requests.exceptions.RequestException(f"Access token not found in response: {token_data}")
+    return token, int(token_data.get("expires_in", 3599))
+
+
+class TokenCache:
+    """Caches one OAuth token, refreshing it before expiry.
+
+    `fetch` is a callable returning (token, expires_in_seconds). A background
+    refresh is scheduled `refresh_margin` seconds before the token expires; if
+    it fails, the current token is kept until it actually expires and the
+    refresh is retried.
+    """
+
+    def __init__(self, fetch, refresh_margin=120, retry_interval=15):
+        self.fetch = fetch
+        self.refresh_margin = refresh_margin
+        self.retry_interval = retry_interval
+        self._token = None
+        self._expires_at = 0.0
+        self._fetch_lock = threading.Lock()
+        self._timer = None
+        self.fetches = 0
+
+    def _valid(self):
+        return self._token is not None and time.monotonic() < self._expires_at
+
+    def get(self):
+        """Returns a valid token, fetching one if needed. Raises whatever `fetch` raises."""
+        if self._valid():
+            return self._token
+        # Single flight: the first caller fetches, the rest wait on the lock and
+        # then find the fresh token.
+        with self._fetch_lock:
+            if not self._valid():
+                self._refresh_locked()
+            return self._token
+
+    def peek(self):
+        """Returns the cached token if it is still valid, else None. Never fetches or blocks."""
+        token = self._token
+        return token if self._valid() else None
+
+    def invalidate(self):
+        """Drops the cached token, e.g. after the API rejected it with a 401."""
+        with self._fetch_lock:
+            self._token = None
+            self._expires_at = 0.0
+
+    def _refresh_locked(self):
+        token, expires_in = self.fetch()
+        self.fetches += 1
+        self._token = token
+        self._expires_at = time.monotonic() + expires_in
+        self._schedule(max(expires_in - self.refresh_margin, self.retry_interval))
+
+    def _schedule(self, delay):
+        if self._timer:
+            self._timer.cancel()
+        self._timer = threading.Timer(delay, self._background_refresh)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _background_refresh(self):
+        with self._fetch_lock:
+            try:
+                self._refresh_locked()
+            except Exception as e:
+                logger.warning(f"Background token refresh failed, retrying in {self.retry_interval}s: {e}")
+                self._schedule(self.retry_interval)
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_token_cache(consumer_key, consumer_secret):
+    """Returns the process-wide TokenCache for a pair of Daraja credentials."""
+    key = (consumer_key, consumer_secret)
+    with _caches_lock:
+        if key not in _caches:
+            _caches[key] = TokenCache(lambda: fetch_access_token(consumer_key, consumer_secret))
+        return _caches[key]
+
+
+def get_access_token(consumer_key, consumer_secret):
+    """Returns a cached (or freshly fetched) Daraja access token."""
+    return get_token_cache(consumer_key, consumer_secret).get()
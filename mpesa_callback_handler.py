@@ -2,8 +2,10 @@
 from flask import Flask, request, jsonify
 from decouple import config
 import mysql.connector
+import db
+from callback_queue import CallbackQueue, QueueWorkerPool
+from payments import apply_payment_updates, deduplicator
 from datetime import datetime
-import json
 import logging
 
 app = Flask(__name__)
@@ -14,49 +16,120 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 logger = logging.getLogger(__name__)
 
 # ==== Database Functions for Callback Handler ====
-# These functions interact with the MySQL database, using credentials from .env.
-# This is a shared resource between your Flask app and Streamlit app, which is intended.
-def get_db_connection():
-    """Establishes and returns a connection to the MySQL database."""
-    try:
-        conn = mysql.connector.connect(
-            host=config("DB_HOST"),        # Reads DB_HOST from .env
-            user=config("DB_USER"),        # Reads DB_USER from .env
-            password=config("DB_PASSWORD"), # Reads DB_PASSWORD from .env
-            database=config("DB_NAME")     # Reads DB_NAME from .env
-        )
-        return conn
-    except mysql.connector.Error as err:
-        logger.error(f"Database connection error in callback handler: {err}")
-        return None
-
+# Payment results are applied by payments.py, which the reconciler
+# (reconciler.py) shares. Connections come from the same pool module as the
+# Streamlit app (db.py), so each callback reuses an open connection instead of
+# reconnecting.
 def update_order_payment_status(checkout_request_id, new_status, mpesa_receipt_number=None, transaction_date=None):
     """Updates an order's status and M-Pesa details in the database."""
-    conn = get_db_connection()
-    if conn:
-        cursor = conn.cursor()
-        try:
-            if new_status == "Paid":
-                cursor.execute(
-                    "UPDATE orders SET status = %s, mpesa_receipt_number = %s, mpesa_transaction_date = %s WHERE checkout_request_id = %s",
-                    (new_status, mpesa_receipt_number, transaction_date, checkout_request_id)
-                )
-            else: # For failed payments
-                cursor.execute(
-                    "UPDATE orders SET status = %s WHERE checkout_request_id = %s",
-                    (new_status, checkout_request_id)
-                )
-            conn.commit()
+    try:
+        # A result whose order isn't linked yet is parked for when it is (payments.py)
+        applied, _ = apply_payment_updates([{
+            'checkout_request_id': checkout_request_id,
+            'status': new_status,
+            'mpesa_receipt_number': mpesa_receipt_number,
+            'mpesa_transaction_date': transaction_date,
+        }])
+        if applied:
             logger.info(f"Order {checkout_request_id} status updated to {new_status}.")
-            return True
-        except mysql.connector.Error as err:
-            logger.error(f"Error updating order payment status for {checkout_request_id}: {err}")
-            conn.rollback()
-            return False
-        finally:
-            cursor.close()
-            conn.close()
-    return False
+        return True
+    except mysql.connector.Error as err:
+        logger.error(f"Error updating order payment status for {checkout_request_id}: {err}")
+        return False
+
+# ==== Callback Parsing ====
+def parse_stk_callback(data):
+    """Validates an STK Push callback and extracts the payment update from it.
+
+    Returns a dict in the format taken by apply_payment_updates(). Raises
+    ValueError with a description if the payload is malformed.
+    """
+    # Extracting relevant parts from the M-Pesa callback structure
+    if not isinstance(data, dict) or 'Body' not in data or 'stkCallback' not in data['Body']:
+        raise ValueError("Invalid callback structure")
+
+    stk_callback = data['Body']['stkCallback']
+    checkout_request_id = stk_callback.get('CheckoutRequestID')
+    result_code = stk_callback.get('ResultCode')
+    if not checkout_request_id or result_code is None:
+        raise ValueError("Missing essential callback data")
+
+    if result_code != 0:
+        # Payment failed or was cancelled
+        logger.warning(f"Payment failed/cancelled for CheckoutRequestID {checkout_request_id}: {stk_callback.get('ResultDesc')}")
+        return {'checkout_request_id': checkout_request_id, 'status': "Payment Failed"}
+
+    # Payment was successful
+    mpesa_receipt_number = None
+    mpesa_transaction_date = None
+    callback_metadata = stk_callback.get('CallbackMetadata')
+    if callback_metadata and 'Item' in callback_metadata:
+        for item in callback_metadata['Item']:
+            if item.get('Name') == 'MpesaReceiptNumber':
+                mpesa_receipt_number = item.get('Value')
+            elif item.get('Name') == 'TransactionDate' and item.get('Value'):
+                # Convert M-Pesa timestamp to datetime object
+                # Format is YYYYMMDDHHmmss
+                try:
+                    mpesa_transaction_date = datetime.strptime(str(item['Value']), '%Y%m%d%H%M%S')
+                except ValueError:
+                    raise ValueError("Invalid TransactionDate in callback metadata")
+
+    logger.info(f"Successful payment: MpesaReceiptNumber={mpesa_receipt_number}, TransactionDate={mpesa_transaction_date}")
+    return {
+        'checkout_request_id': checkout_request_id,
+        'status': "Paid",
+        'mpesa_receipt_number': mpesa_receipt_number,
+        'mpesa_transaction_date': mpesa_transaction_date,
+    }
+
+# ==== Queued Callback Processing ====
+# With CALLBACK_QUEUE_ENABLED=True, callbacks are validated, written to a local
+# SQLite queue and acknowledged right away; worker threads then apply them to
+# MySQL in batches. This keeps callback bursts from timing out (and Daraja from
+# retrying) while the database is busy.
+CALLBACK_QUEUE_ENABLED = config("CALLBACK_QUEUE_ENABLED", default=False, cast=bool)
+
+def process_queued_updates(payloads):
+    """Applies a batch of queued payment updates. Raises on failure so the batch is retried.
+
+    Returns the positions of the updates no order is linked to yet; the
+    workers put them back in the queue to try again after a backoff.
+    """
+    updates = []
+    for payload in payloads:
+        update = dict(payload)
+        if update.get('mpesa_transaction_date'):
+            update['mpesa_transaction_date'] = datetime.fromisoformat(update['mpesa_transaction_date'])
+        updates.append(update)
+    _, unmatched = apply_payment_updates(updates, park_unmatched=False)
+    unmatched_ids = {update['checkout_request_id'] for update in unmatched}
+    return [i for i, update in enumerate(updates) if update['checkout_request_id'] in unmatched_ids]
+
+callback_queue = None
+queue_workers = None
+if CALLBACK_QUEUE_ENABLED:
+    callback_queue = CallbackQueue(config("CALLBACK_QUEUE_PATH", default="callback_queue.sqlite3"))
+    queue_workers = QueueWorkerPool(
+        callback_queue,
+        process_queued_updates,
+        workers=config("CALLBACK_QUEUE_WORKERS", default=2, cast=int),
+        batch_size=config("CALLBACK_QUEUE_BATCH_SIZE", default=50, cast=int),
+        # Database outages fail every item alike; retry those batches whole
+        transient_errors=(mysql.connector.errors.InterfaceError, mysql.connector.errors.OperationalError,
+                          mysql.connector.errors.PoolError)
+    )
+    queue_workers.start()
+
+# ==== Metrics Route ====
+# Exposes connection pool checkout metrics (wait times, timeouts, health checks),
+# duplicate-callback rates and, when enabled, the callback queue's depth and throughput.
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    stats = {"db_pool": db.get_pool().stats(), "callback_dedup": deduplicator.stats()}
+    if queue_workers:
+        stats["callback_queue"] = queue_workers.stats()
+    return jsonify(stats), 200
 
 # ==== M-Pesa Callback Route ====
 # This is the endpoint that M-Pesa's Daraja API will send payment notifications to.
@@ -64,57 +137,42 @@ def update_order_payment_status(checkout_request_id, new_status, mpesa_receipt_n
 # is what you set as CALLBACK_URL in your .env file, which your Streamlit app uses.
 @app.route('/mpesa_callback', methods=['POST'])
 def mpesa_callback():
-    logger.info("Received M-Pesa callback.")
     try:
-        data = request.get_json()
-        logger.info(f"Callback raw data: {json.dumps(data, indent=2)}")
-
-        # Extracting relevant parts from the M-Pesa callback structure
-        if 'Body' not in data or 'stkCallback' not in data['Body']:
-            logger.warning("Invalid M-Pesa callback structure: Missing Body or stkCallback.")
-            return jsonify({"ResultCode": 1, "ResultDesc": "Invalid callback structure"}), 400
-
-        stk_callback = data['Body']['stkCallback']
-        checkout_request_id = stk_callback.get('CheckoutRequestID')
-        result_code = stk_callback.get('ResultCode')
-        result_desc = stk_callback.get('ResultDesc')
-        merchant_request_id = stk_callback.get('MerchantRequestID')
-
-        if not checkout_request_id or result_code is None:
-            logger.warning(f"Missing essential data in callback: CheckoutRequestID={checkout_request_id}, ResultCode={result_code}")
-            return jsonify({"ResultCode": 1, "ResultDesc": "Missing essential callback data"}), 400
-
-        logger.info(f"Callback for CheckoutRequestID: {checkout_request_id}, ResultCode: {result_code}")
-
-        if result_code == 0:
-            # Payment was successful
-            callback_metadata = stk_callback.get('CallbackMetadata')
-            mpesa_receipt_number = None
-            mpesa_transaction_date = None
-
-            if callback_metadata and 'Item' in callback_metadata:
-                for item in callback_metadata['Item']:
-                    if item.get('Name') == 'MpesaReceiptNumber':
-                        mpesa_receipt_number = item.get('Value')
-                    elif item.get('Name') == 'TransactionDate':
-                        # Convert M-Pesa timestamp to datetime object
-                        # Format is YYYYMMDDHHmmss
-                        if item.get('Value'):
-                            mpesa_transaction_date = datetime.strptime(str(item['Value']), '%Y%m%d%H%M%S')
-
-            logger.info(f"Successful payment: MpesaReceiptNumber={mpesa_receipt_number}, TransactionDate={mpesa_transaction_date}")
-
-            update_order_payment_status(
-                checkout_request_id,
-                "Paid",
-                mpesa_receipt_number,
-                mpesa_transaction_date
-            )
-            # You might want to trigger notifications or further actions here
-        else:
-            # Payment failed or was cancelled
-            logger.warning(f"Payment failed/cancelled for CheckoutRequestID {checkout_request_id}: {result_desc}")
-            update_order_payment_status(checkout_request_id, "Payment Failed")
+        data = request.get_json(silent=True)
+        # The full payload is only logged at debug level; formatting it on every
+        # callback is wasted work under load.
+        logger.debug("Callback raw data: %s", data)
+
+        try:
+            update = parse_stk_callback(data)
+        except ValueError as e:
+            logger.warning(f"Rejected M-Pesa callback: {e}")
+            return jsonify({"ResultCode": 1, "ResultDesc": str(e)}), 400
+
+        logger.info(f"Callback for CheckoutRequestID: {update['checkout_request_id']}, status: {update['status']}")
+
+        if deduplicator.seen_recently(update):
+            logger.info(f"Duplicate callback for CheckoutRequestID {update['checkout_request_id']}; already applied.")
+            return jsonify({"ResultCode": 0, "ResultDesc": "Callback already processed"}), 200
+
+        if callback_queue:
+            # Durably queued; the workers will apply it. Dates are stored as ISO strings.
+            queued = dict(update)
+            if queued.get('mpesa_transaction_date'):
+                queued['mpesa_transaction_date'] = queued['mpesa_transaction_date'].isoformat()
+            callback_queue.enqueue(queued)
+            # Not remembered as seen yet: that happens once a worker has applied it.
+            # Retries arriving meanwhile are queued too; the workers' check of the
+            # seen table turns them into no-ops.
+            return jsonify({"ResultCode": 0, "ResultDesc": "Callback accepted"}), 200
+
+        update_order_payment_status(
+            update['checkout_request_id'],
+            update['status'],
+            update.get('mpesa_receipt_number'),
+            update.get('mpesa_transaction_date')
+        )
+        # You might want to trigger notifications or further actions here
 
         # M-Pesa expects a specific JSON response to acknowledge receipt of the callback
         return jsonify({"ResultCode": 0, "ResultDesc": "Callback processed successfully"}), 200
@@ -127,4 +185,4 @@ if __name__ == '__main__':
     # This block runs the Flask development server.
     # It listens on all available network interfaces (0.0.0.0) on port 5000.
     # This is the port that ngrok will tunnel to.
-    app.run(host='0.0.0.0', port=5000)
\ No newline at end of file
+    app.run(host='0.0.0.0', port=5000)
@@ -0,0 +1,186 @@
+# order_events.py
+# Order status changes, pushed to the customers and the kitchen as they happen.
+#
+# api_server.py streams events to browsers over server-sent events:
+# /orders/<order_id>/events for a customer tracking one order, /kitchen/events
+# for every order. Inside an API worker, EventBroker fans each event out to
+# that worker's open streams. Events are published in two ways:
+#
+#   * by api_server itself (an admin changing a status through the API);
+#   * by other processes, the M-Pesa callback handler and the Streamlit app,
+#     through publish_order_events(), which never blocks the caller.
+#
+# With ORDER_EVENTS_REDIS_URL set (pip install redis), events go through a
+# Redis pub/sub channel that every API worker listens to, so each subscriber
+# gets each event once however many workers there are. Without Redis, other
+# processes POST their events to the API at ORDER_EVENTS_URL (one worker only).
+import asyncio
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from decouple import config
+
+import http_clients
+
+try:
+    import redis
+    import redis.asyncio as redis_asyncio
+except ImportError:
+    redis = redis_asyncio = None
+
+logger = logging.getLogger(__name__)
+
+ORDER_EVENTS_REDIS_URL = config("ORDER_EVENTS_REDIS_URL", default="")
+ORDER_EVENTS_URL = config("ORDER_EVENTS_URL", default="").rstrip("/")
+# Shared with api_server's POST /order_events, which is refused while this is empty
+ORDER_EVENTS_SECRET = config("ORDER_EVENTS_SECRET", default="")
+SECRET_HEADER = "X-Order-Events-Secret"
+
+CHANNEL = "hotel:order_events"
+KITCHEN_TOPIC = "kitchen"
+
+
+def make_event(order_id, status):
+    return {"order_id": order_id, "status": status, "at": round(time.time(), 3)}
+
+
+def order_topic(order_id):
+    return f"order:{order_id}"
+
+
+class EventBroker:
+    """Fans events out to the asyncio subscribers of one process.
+
+    Each subscriber has a bounded queue. One that falls `queue_size` events
+    behind is sent None and dropped instead of stalling everyone else; its
+    stream then closes and the browser reconnects. Functions in `on_event`
+    are called with every event, e.g. to drop cached copies of the order.
+    """
+
+    def __init__(self, queue_size=100):
+        self.queue_size = queue_size
+        self.on_event = []
+        self._subscribers = {}  # topic -> set of queues
+        self._stats = {"published": 0, "delivered": 0, "dropped_subscribers": 0}
+
+    def subscribe(self, topic):
+        queue = asyncio.Queue(self.queue_size)
+        self._subscribers.setdefault(topic, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, topic, queue):
+        queues = self._subscribers.get(topic)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self._subscribers[topic]
+
+    def dispatch(self, event):
+        """Delivers one event to the subscribers of its order and of the kitchen."""
+        self._stats["published"] += 1
+        for callback in self.on_event:
+            try:
+                callback(event)
+            except Exception:
+                logger.exception("Order event callback failed")
+        for topic in (order_topic(event['order_id']), KITCHEN_TOPIC):
+            for queue in list(self._subscribers.get(topic, ())):
+                try:
+                    queue.put_nowait(event)
+                    self._stats["delivered"] += 1
+                except asyncio.QueueFull:
+                    self.unsubscribe(topic, queue)
+                    self._stats["dropped_subscribers"] += 1
+                    while not queue.empty():
+                        queue.get_nowait()
+                    queue.put_nowait(None)
+
+    def stats(self):
+        return dict(self._stats, subscribers=sum(len(queues) for queues in self._subscribers.values()))
+
+
+class OrderEvents:
+    """An EventBroker plus, if `redis_url` is set, the Redis channel that links the workers."""
+
+    def __init__(self, redis_url=ORDER_EVENTS_REDIS_URL, queue_size=100):
+        if redis_url and redis_asyncio is None:
+            raise RuntimeError("ORDER_EVENTS_REDIS_URL is set but the redis package is not installed (pip install redis).")
+        self.broker = EventBroker(queue_size)
+        self.redis_url = redis_url
+        self._redis = None
+        self._listener = None
+
+    async def start(self):
+        if self.redis_url:
+            self._redis = redis_asyncio.from_url(self.redis_url)
+            self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._listener:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+        if self._redis:
+            await self._redis.close()
+
+    async def publish(self, event):
+        if self._redis is None:
+            self.broker.dispatch(event)
+            return
+        # Delivered back to this worker by _listen(), like to every other one
+        await self._redis.publish(CHANNEL, json.dumps(event))
+
+    async def _listen(self):
+        delay = 1.0
+        while True:
+            try:
+                async with self._redis.pubsub() as pubsub:
+                    await pubsub.subscribe(CHANNEL)
+                    delay = 1.0
+                    async for message in pubsub.listen():
+                        if message['type'] == 'message':
+                            self.broker.dispatch(json.loads(message['data']))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Order event channel failed, reconnecting in {delay:.0f}s: {e}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30.0)
+
+
+# ==== Publishing From Other Processes ====
+# The callback handler and the Streamlit app are synchronous; their events are
+# sent from a background thread so a slow or missing API never holds them up.
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="order-events")
+_redis_client = None
+_redis_lock = threading.Lock()
+
+
+def _send(events):
+    global _redis_client
+    try:
+        if ORDER_EVENTS_REDIS_URL and redis is not None:
+            with _redis_lock:
+                if _redis_client is None:
+                    _redis_client = redis.Redis.from_url(ORDER_EVENTS_REDIS_URL)
+            for event in events:
+                _redis_client.publish(CHANNEL, json.dumps(event))
+        elif ORDER_EVENTS_URL:
+            client = http_clients.get_client("order_events", ORDER_EVENTS_URL, read_timeout=5.0, retries=1)
+            response = client.post("/order_events", json={"events": events},
+                                   headers={SECRET_HEADER: ORDER_EVENTS_SECRET})
+            response.raise_for_status()
+    except Exception as e:
+        logger.warning(f"Could not publish {len(events)} order event(s): {e}")
+
+
+def publish_order_events(events):
+    """Queues events for the API's subscribers. Returns immediately; failures are only logged."""
+    if events and (ORDER_EVENTS_REDIS_URL or ORDER_EVENTS_URL):
+        _executor.submit(_send, list(events))
@@ -0,0 +1,121 @@
+# order_read_model.py
+# Reads an order and its items in one query, and caches the result.
+#
+# Receipts and order tracking fetch the same order again and again, while an
+# order only changes a few times (payment, then kitchen status updates).
+# OrderCache keeps the most recently read orders in memory with an ETag, so a
+# repeat view is answered without the database, or with 304 Not Modified.
+# Writers call invalidate(order_id). Changes made by another process (the
+# M-Pesa callback handler, another API worker) are picked up when the entry
+# expires: quickly for orders still waiting for payment, later for the rest.
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from decouple import config
+
+PENDING_STATUS = "Pending Payment Confirmation"
+
+# Orders and their items, one row per item (a single row with NULL item
+# columns if the order has none). Served by the orders primary key and
+# idx_order_items_order_meal.
+ORDER_DETAILS_SQL = (
+    "SELECT o.*, i.id AS item_id, i.meal_id AS item_meal_id, i.meal_name AS item_meal_name, "
+    "i.quantity AS item_quantity, i.price_per_item AS item_price_per_item "
+    "FROM orders o LEFT JOIN order_items i ON i.order_id = o.order_id "
+    "WHERE o.order_id = %s ORDER BY i.id"
+)
+ITEM_COLUMNS = ("item_id", "item_meal_id", "item_meal_name", "item_quantity", "item_price_per_item")
+
+
+def order_from_rows(rows):
+    """Splits ORDER_DETAILS_SQL rows (as dicts) into (order, items). Returns (None, []) for no rows.
+
+    Items have the same keys as order_items rows.
+    """
+    if not rows:
+        return None, []
+    order = {key: value for key, value in rows[0].items() if key not in ITEM_COLUMNS}
+    items = [
+        {
+            'id': row['item_id'],
+            'order_id': order['order_id'],
+            'meal_id': row['item_meal_id'],
+            'meal_name': row['item_meal_name'],
+            'quantity': row['item_quantity'],
+            'price_per_item': row['item_price_per_item'],
+        }
+        for row in rows if row['item_id'] is not None
+    ]
+    return order, items
+
+
+def etag_for(body):
+    """A strong ETag for a response body (bytes)."""
+    return '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+
+
+class OrderCache:
+    """A bounded LRU cache of order reads, keyed by order id.
+
+    Values are whatever the caller stores (e.g. a rendered response body),
+    with the status of the order they describe: orders in PENDING_STATUS
+    expire after `pending_ttl` seconds, the rest after `ttl`.
+    """
+
+    def __init__(self, capacity=1000, ttl=60.0, pending_ttl=5.0):
+        self.capacity = capacity
+        self.ttl = ttl
+        self.pending_ttl = pending_ttl
+        self._entries = OrderedDict()  # order id -> (expires_at, etag, value)
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "invalidations": 0, "evictions": 0}
+
+    def get(self, order_id):
+        """Returns (etag, value) for a fresh entry, or None."""
+        with self._lock:
+            entry = self._entries.get(order_id)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[order_id]
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(order_id)
+            self._stats["hits"] += 1
+            return entry[1], entry[2]
+
+    def put(self, order_id, status, etag, value):
+        ttl = self.pending_ttl if status == PENDING_STATUS else self.ttl
+        with self._lock:
+            self._entries[order_id] = (time.monotonic() + ttl, etag, value)
+            self._entries.move_to_end(order_id)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def invalidate(self, *order_ids):
+        with self._lock:
+            for order_id in order_ids:
+                if self._entries.pop(order_id, None) is not None:
+                    self._stats["invalidations"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats, size=len(self._entries), capacity=self.capacity)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+
+def create_order_cache():
+    """An OrderCache sized by ORDER_CACHE_SIZE, ORDER_CACHE_TTL and ORDER_CACHE_PENDING_TTL."""
+    return OrderCache(
+        capacity=config("ORDER_CACHE_SIZE", default=1000, cast=int),
+        ttl=config("ORDER_CACHE_TTL", default=60.0, cast=float),
+        pending_ttl=config("ORDER_CACHE_PENDING_TTL", default=5.0, cast=float),
+    )
@@ -0,0 +1,152 @@
+# outbox_relay.py
+# Drains the accounting_outbox table (see migrations/0007_accounting_outbox.sql)
+# into Zoho Books, so every paid order gets its sales journal entry without a
+# manual bulk sync.
+#
+# An event is marked processed only after Zoho accepted the entry. Its attempt
+# is counted before posting, so an event seen again after a crash or a failed
+# post is first looked up in Zoho by reference number and only posted if the
+# entry is not there. Events are unique per (event_type, order_id), and only
+# one relay runs at a time (MySQL named lock), so the same order is never
+# posted concurrently. Failed posts are retried with exponential backoff.
+#
+#   python outbox_relay.py              # drain once
+#   python outbox_relay.py --loop 10    # keep draining, polling every 10 seconds
+import argparse
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import mysql.connector
+
+import db
+import journal_entry
+import journal_sync
+from http_clients import RateLimiter
+
+logger = logging.getLogger(__name__)
+
+LOCK_NAME = "hotel_accounting_outbox"
+MAX_BACKOFF_SECONDS = 3600
+
+# Journal entry builders per event type, with the reference number each entry is posted under
+POSTERS = {
+    "order_paid": (journal_entry.create_sales_journal_entry_in_zoho_books, journal_entry.sales_reference_number),
+}
+
+
+def fetch_batch(cursor, limit):
+    """Returns up to `limit` due events joined with their orders, oldest first."""
+    cursor.execute(
+        "SELECT ob.id, ob.event_type, ob.attempts, o.order_id, o.user_email, o.total_amount, "
+        "o.mpesa_receipt_number, o.order_date "
+        "FROM accounting_outbox ob JOIN orders o ON o.order_id = ob.order_id "
+        "WHERE ob.processed_at IS NULL AND ob.available_at <= NOW() ORDER BY ob.id LIMIT %s",
+        (limit,)
+    )
+    return cursor.fetchall()
+
+
+def post_event(limiter, event):
+    """Posts one event's journal entry, unless an earlier attempt did. Returns the Zoho journal ID or None."""
+    if event['event_type'] not in POSTERS:
+        logger.error(f"No journal entry poster for outbox event type {event['event_type']!r}")
+        return None
+    post, reference_number = POSTERS[event['event_type']]
+    if event['attempts']:
+        # An earlier attempt may have reached Zoho without being marked processed
+        try:
+            journal_id = journal_sync.find_entry(limiter, reference_number(event['order_id']))
+        except journal_entry.ZohoLookupError as e:
+            logger.warning(f"{e}; not posting order {event['order_id']} until it can be checked.")
+            return None
+        if journal_id:
+            logger.info(f"Order {event['order_id']} was already posted as journal {journal_id}.")
+            return journal_id
+    order = {
+        'order_id': event['order_id'],
+        'amount': float(event['total_amount']),
+        'user_email': event['user_email'],
+        'mpesa_receipt_number': event['mpesa_receipt_number'],
+        'payment_date': event['order_date'].strftime("%Y-%m-%d"),
+    }
+    return journal_sync.post_entry(limiter, post, order)
+
+
+def drain(conn, limiter, batch_size=50, workers=4):
+    """Posts due outbox events in batches until none are left.
+
+    Returns (posted, failed), or None if another relay holds the lock.
+    """
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute("SELECT GET_LOCK(%s, 0) AS acquired", (LOCK_NAME,))
+        if cursor.fetchone()['acquired'] != 1:
+            return None
+        posted = failed = 0
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                while True:
+                    events = fetch_batch(cursor, batch_size)
+                    conn.commit()  # End the read so the next batch sees new events
+                    if not events:
+                        break
+                    # Counted before posting, so after a crash these are looked up before being re-posted
+                    placeholders = ", ".join(["%s"] * len(events))
+                    cursor.execute(
+                        f"UPDATE accounting_outbox SET attempts = attempts + 1 WHERE id IN ({placeholders})",
+                        tuple(event['id'] for event in events)
+                    )
+                    conn.commit()
+                    journal_ids = list(executor.map(lambda event: post_event(limiter, event), events))
+                    done = [(journal_id, event['id']) for event, journal_id in zip(events, journal_ids) if journal_id]
+                    retry = [
+                        (min(2 ** event['attempts'] * 30, MAX_BACKOFF_SECONDS), event['id'])
+                        for event, journal_id in zip(events, journal_ids) if not journal_id
+                    ]
+                    if done:
+                        cursor.executemany(
+                            "UPDATE accounting_outbox SET processed_at = NOW(), journal_id = %s WHERE id = %s",
+                            done
+                        )
+                    if retry:
+                        cursor.executemany(
+                            "UPDATE accounting_outbox SET available_at = NOW() + INTERVAL %s SECOND, "
+                            "last_error = 'Journal entry was not created' WHERE id = %s",
+                            retry
+                        )
+                    conn.commit()
+                    posted += len(done)
+                    failed += len(retry)
+            return posted, failed
+        except mysql.connector.Error:
+            conn.rollback()
+            raise
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK(%s)", (LOCK_NAME,))
+            cursor.fetchone()
+    finally:
+        cursor.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Post accounting outbox events to Zoho Books.")
+    parser.add_argument("--loop", type=float, metavar="SECONDS", help="keep draining, polling every SECONDS seconds")
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--workers", type=int, default=4, help="concurrent requests to Zoho (default 4)")
+    args = parser.parse_args()
+    limiter = RateLimiter(journal_sync.ZOHO_RATE_LIMIT_PER_MINUTE, per=60.0)
+    while True:
+        try:
+            with db.get_pool().connection() as conn:
+                result = drain(conn, limiter, batch_size=args.batch_size, workers=args.workers)
+            if result is None:
+                logger.info("Another relay is running; skipped.")
+            elif any(result):
+                logger.info(f"Posted {result[0]} journal entries; {result[1]} failed and will be retried.")
+        except mysql.connector.Error as err:
+            logger.error(f"Error draining the accounting outbox: {err}")
+        if not args.loop:
+            break
+        time.sleep(args.loop)
@@ -0,0 +1,196 @@
+# payments.py
+# Applies M-Pesa payment results to orders.
+#
+# Used by the callback handler (mpesa_callback_handler.py), which receives the
+# results, and by the reconciler (reconciler.py), which asks Daraja for the
+# ones whose callback never arrived. Both go through the same bulk UPDATEs and
+# the same duplicate check, so a result is applied once whichever path sees it
+# first.
+#
+# A callback can arrive before its order is linked to the CheckoutRequestID,
+# which only happens once the STK push has returned. Such results are parked in
+# mpesa_unmatched_callbacks (migrations/0011) and applied by
+# apply_parked_updates() when the order is linked, or by the reconciler.
+import logging
+
+from decouple import config
+import mysql.connector
+
+import db
+from idempotency import CallbackDeduplicator
+from order_events import make_event, publish_order_events
+
+logger = logging.getLogger(__name__)
+
+# Recognizes retried callbacks so they are acknowledged without touching orders
+deduplicator = CallbackDeduplicator(capacity=config("CALLBACK_DEDUP_CACHE_SIZE", default=10000, cast=int))
+
+
+def apply_payment_updates(updates, park_unmatched=True):
+    """Applies a batch of payment results to the orders table in one transaction.
+
+    Each update is a dict with 'checkout_request_id' and 'status', plus
+    'mpesa_receipt_number' and 'mpesa_transaction_date' for "Paid" updates.
+    Results that were already applied (retried callbacks) are skipped. Results
+    for a CheckoutRequestID no order has yet are not recorded as seen; with
+    `park_unmatched` they are parked in mpesa_unmatched_callbacks, in the same
+    transaction, for apply_parked_updates(). A paid result
+    with a receipt number for an order the reconciler already marked paid
+    (without one) only fills in the receipt and transaction date. All
+    "Paid" updates go out as a single UPDATE, and failed payments as one
+    UPDATE per status. Newly paid orders also get an 'order_paid' event in
+    accounting_outbox, in the same transaction. Once committed, the status
+    changes are pushed to subscribed clients (order_events.py). Returns
+    (number of updates applied, the unmatched updates). Raises
+    mysql.connector.Error if the batch could not be applied (nothing is
+    committed in that case).
+    """
+    # If a batch holds several results for the same request, the last one wins
+    latest = {update['checkout_request_id']: update for update in updates}
+
+    conn = db.get_connection()
+    cursor = conn.cursor()
+    try:
+        new_updates, receipt_fills = deduplicator.filter_new(cursor, list(latest.values()))
+        order_ids = {}
+        if new_updates or receipt_fills:
+            placeholders = ", ".join(["%s"] * (len(new_updates) + len(receipt_fills)))
+            cursor.execute(
+                f"SELECT checkout_request_id, order_id FROM orders WHERE checkout_request_id IN ({placeholders}) FOR UPDATE",
+                tuple(update['checkout_request_id'] for update in new_updates + receipt_fills)
+            )
+            order_ids = dict(cursor.fetchall())
+        # The callback can beat the order to its CheckoutRequestID, which is only
+        # saved once the STK push has returned. Leave those unclaimed.
+        unmatched = [update for update in new_updates if update['checkout_request_id'] not in order_ids]
+        new_updates = [update for update in new_updates if update['checkout_request_id'] in order_ids]
+        receipt_fills = [update for update in receipt_fills if update['checkout_request_id'] in order_ids]
+        deduplicator.claim(cursor, new_updates)
+        deduplicator.claim_receipts(cursor, receipt_fills)
+        if park_unmatched and unmatched:
+            cursor.executemany(
+                "INSERT INTO mpesa_unmatched_callbacks "
+                "(checkout_request_id, status, mpesa_receipt_number, mpesa_transaction_date) VALUES (%s, %s, %s, %s) "
+                "ON DUPLICATE KEY UPDATE status = VALUES(status), "
+                "mpesa_receipt_number = VALUES(mpesa_receipt_number), "
+                "mpesa_transaction_date = VALUES(mpesa_transaction_date)",
+                [(u['checkout_request_id'], u['status'], u.get('mpesa_receipt_number'), u.get('mpesa_transaction_date'))
+                 for u in unmatched]
+            )
+        paid = [update for update in new_updates if update['status'] == "Paid"]
+        failed_by_status = {}
+        for update in new_updates:
+            if update['status'] != "Paid":
+                failed_by_status.setdefault(update['status'], []).append(update['checkout_request_id'])
+
+        if paid:
+            cases = " ".join(["WHEN %s THEN %s"] * len(paid))
+            placeholders = ", ".join(["%s"] * len(paid))
+            params = []
+            for update in paid:
+                params += [update['checkout_request_id'], update.get('mpesa_receipt_number')]
+            for update in paid:
+                params += [update['checkout_request_id'], update.get('mpesa_transaction_date')]
+            params += [update['checkout_request_id'] for update in paid]
+            cursor.execute(
+                f"UPDATE orders SET status = 'Paid', "
+                f"mpesa_receipt_number = CASE checkout_request_id {cases} END, "
+                f"mpesa_transaction_date = CASE checkout_request_id {cases} END "
+                f"WHERE checkout_request_id IN ({placeholders})",
+                tuple(params)
+            )
+            # Outbox events for the accounting sync (outbox_relay.py), committed
+            # together with the status change so none is lost or invented
+            cursor.execute(
+                f"INSERT INTO accounting_outbox (event_type, order_id) "
+                f"SELECT 'order_paid', order_id FROM orders WHERE checkout_request_id IN ({placeholders}) "
+                f"ON DUPLICATE KEY UPDATE accounting_outbox.id = accounting_outbox.id",
+                tuple(update['checkout_request_id'] for update in paid)
+            )
+        for status, checkout_request_ids in failed_by_status.items():
+            placeholders = ", ".join(["%s"] * len(checkout_request_ids))
+            cursor.execute(
+                f"UPDATE orders SET status = %s WHERE checkout_request_id IN ({placeholders})",
+                (status, *checkout_request_ids)
+            )
+        if receipt_fills:
+            cursor.executemany(
+                "UPDATE orders SET mpesa_receipt_number = %s, mpesa_transaction_date = %s "
+                "WHERE checkout_request_id = %s AND mpesa_receipt_number IS NULL",
+                [(update['mpesa_receipt_number'], update.get('mpesa_transaction_date'), update['checkout_request_id'])
+                 for update in receipt_fills]
+            )
+        conn.commit()
+        deduplicator.remember(new_updates + receipt_fills)
+        # A filled-in receipt is announced too, so cached copies of the order are dropped
+        publish_order_events([
+            make_event(order_ids[update['checkout_request_id']], update['status'])
+            for update in new_updates + receipt_fills
+        ])
+        if unmatched:
+            logger.warning(
+                f"No order has CheckoutRequestID {', '.join(u['checkout_request_id'] for u in unmatched)} yet; "
+                + (f"parked {len(unmatched)} payment update(s) until their order is linked."
+                   if park_unmatched else f"returned {len(unmatched)} payment update(s) to the caller.")
+            )
+        skipped = len(latest) - len(new_updates) - len(receipt_fills) - len(unmatched)
+        if skipped:
+            logger.info(f"Skipped {skipped} already-applied payment update(s).")
+        if receipt_fills:
+            logger.info(f"Filled in {len(receipt_fills)} receipt number(s) of reconciled payment(s).")
+        logger.info(f"Applied {len(new_updates)} payment update(s) ({len(paid)} paid).")
+        return len(new_updates) + len(receipt_fills), unmatched
+    except mysql.connector.Error:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def apply_parked_updates(checkout_request_ids=None):
+    """Applies the parked results whose order has been linked since, and deletes them.
+
+    Call it after linking orders to `checkout_request_ids`; without IDs, it
+    sweeps every parked result (the reconciler does). Returns the number of
+    updates applied. Raises mysql.connector.Error.
+    """
+    if checkout_request_ids is not None and not checkout_request_ids:
+        return 0
+    sql = (
+        "SELECT u.checkout_request_id, u.status, u.mpesa_receipt_number, u.mpesa_transaction_date "
+        "FROM mpesa_unmatched_callbacks u JOIN orders o ON o.checkout_request_id = u.checkout_request_id"
+    )
+    params = ()
+    if checkout_request_ids is not None:
+        sql += f" WHERE u.checkout_request_id IN ({', '.join(['%s'] * len(checkout_request_ids))})"
+        params = tuple(checkout_request_ids)
+    with db.get_pool().connection() as conn:
+        cursor = conn.cursor(dictionary=True)
+        try:
+            cursor.execute(sql, params)
+            parked = cursor.fetchall()
+            conn.commit()
+        finally:
+            cursor.close()
+    if not parked:
+        return 0
+    # Applying twice is harmless (the seen table skips it), so the rows go only once applied
+    applied, unmatched = apply_payment_updates(parked, park_unmatched=False)
+    unmatched_ids = {update['checkout_request_id'] for update in unmatched}
+    done = [update['checkout_request_id'] for update in parked if update['checkout_request_id'] not in unmatched_ids]
+    if not done:
+        return applied
+    with db.get_pool().connection() as conn:
+        cursor = conn.cursor()
+        try:
+            placeholders = ", ".join(["%s"] * len(done))
+            cursor.execute(
+                f"DELETE FROM mpesa_unmatched_callbacks WHERE checkout_request_id IN ({placeholders})",
+                tuple(done)
+            )
+            conn.commit()
+        finally:
+            cursor.close()
+    logger.info(f"Applied {applied} parked payment update(s).")
+    return applied
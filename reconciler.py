@@ -0,0 +1,310 @@
+# reconciler.py
+# Settles orders stuck in "Pending Payment Confirmation" because their M-Pesa
+# callback never arrived.
+#
+# Each run walks the pending orders placed between RECONCILE_MAX_AGE_HOURS and
+# RECONCILE_MIN_AGE_SECONDS ago, in batches along idx_orders_status_date, and
+# asks Daraja's STK Push Query API about each one, concurrently and within
+# DARAJA_QUERY_RATE_LIMIT_PER_MINUTE. Final answers are applied in bulk through
+# payments.apply_payment_updates(), exactly like callbacks. Orders Daraja still
+# reports as being processed are asked about again later, with exponential
+# backoff (payment_reconciliation table, migrations/0009). Orders that never
+# got a CheckoutRequestID can't be confirmed and are marked "Payment Failed".
+# So are pending orders older than the window, after one last query: those
+# Daraja reports as paid are marked "Paid" instead. This keeps the pending
+# range every run (and every "orders by status" query) reads small.
+#
+# Each run first applies callbacks parked because they beat their order's link
+# to the CheckoutRequestID (payments.apply_parked_updates), so their receipt
+# numbers are kept. Only one reconciler runs at a time (MySQL named lock). Point DARAJA_BASE_URL
+# at daraja_stub.py to try it without Safaricom.
+#
+#   python reconciler.py              # reconcile once
+#   python reconciler.py --loop 60    # keep reconciling, every 60 seconds
+import argparse
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import mysql.connector
+import requests
+from decouple import config
+
+import db
+import mpesa_auth
+from http_clients import RateLimiter
+from mpesa import stk_credentials
+from order_events import make_event, publish_order_events
+from payments import apply_parked_updates, apply_payment_updates
+
+logger = logging.getLogger(__name__)
+
+LOCK_NAME = "hotel_payment_reconciler"
+PENDING_STATUS = "Pending Payment Confirmation"
+FAILED_STATUS = "Payment Failed"
+
+RECONCILE_MIN_AGE_SECONDS = config("RECONCILE_MIN_AGE_SECONDS", default=120, cast=int)
+RECONCILE_MAX_AGE_HOURS = config("RECONCILE_MAX_AGE_HOURS", default=24, cast=float)
+DARAJA_QUERY_RATE_LIMIT_PER_MINUTE = config("DARAJA_QUERY_RATE_LIMIT_PER_MINUTE", default=60, cast=int)
+MAX_BACKOFF_SECONDS = 3600
+
+# Daraja's errorCode for a request the customer has not answered yet
+STILL_PROCESSING_ERROR = "500.001.1001"
+
+
+def query_payment(limiter, checkout_request_id):
+    """Asks the STK Push Query API how a payment request ended.
+
+    Returns ("paid" | "failed" | "pending", description). "pending" covers
+    requests still being processed as well as errors worth retrying later.
+    """
+    consumer_key, consumer_secret = config("CONSUMER_KEY"), config("CONSUMER_SECRET")
+    limiter.acquire()
+    try:
+        access_token = mpesa_auth.get_access_token(consumer_key, consumer_secret)
+        business_shortcode, password, timestamp = stk_credentials()
+        response = mpesa_auth.daraja_client().post(
+            "/mpesa/stkpushquery/v1/query",
+            json={
+                "BusinessShortCode": business_shortcode,
+                "Password": password,
+                "Timestamp": timestamp,
+                "CheckoutRequestID": checkout_request_id,
+            },
+            headers={"Authorization": f"Bearer {access_token}"}
+        )
+    except requests.exceptions.RequestException as e:
+        return "pending", f"Network or API error: {e}"
+
+    try:
+        body = response.json()
+    except ValueError:
+        body = {}
+    if response.status_code == 429:
+        limiter.pause(60)
+        return "pending", "Rate limited by Daraja"
+    if response.status_code == 401:
+        mpesa_auth.get_token_cache(consumer_key, consumer_secret).invalidate()
+        return "pending", "Access token rejected"
+    if response.status_code != 200:
+        if body.get("errorCode") == STILL_PROCESSING_ERROR:
+            return "pending", "Still being processed"
+        return "pending", f"HTTP {response.status_code}: {body.get('errorMessage') or response.text[:200]}"
+
+    result_code = str(body.get("ResultCode", ""))
+    if result_code == "0":
+        return "paid", body.get("ResultDesc", "")
+    if result_code:
+        return "failed", f"{result_code}: {body.get('ResultDesc', '')}"
+    return "pending", f"No result in response: {body}"
+
+
+def fetch_batch(cursor, oldest, newest, after, limit):
+    """Returns up to `limit` pending orders placed in [oldest, newest) that are due a check.
+
+    Ordered by (order_date, order_id), starting after the keyset `after`.
+    """
+    sql = (
+        "SELECT o.order_id, o.checkout_request_id, o.order_date, COALESCE(r.checks, 0) AS checks "
+        "FROM orders o LEFT JOIN payment_reconciliation r ON r.order_id = o.order_id "
+        "WHERE o.status = %s AND o.order_date >= %s AND o.order_date < %s "
+        "AND (r.next_check_at IS NULL OR r.next_check_at <= NOW()) "
+    )
+    params = [PENDING_STATUS, oldest, newest]
+    if after:
+        sql += "AND (o.order_date > %s OR (o.order_date = %s AND o.order_id > %s)) "
+        params += [after[0], after[0], after[1]]
+    sql += "ORDER BY o.order_date, o.order_id LIMIT %s"
+    cursor.execute(sql, tuple(params) + (limit,))
+    return cursor.fetchall()
+
+
+def close_orders(cursor, order_ids):
+    """Marks pending orders as FAILED_STATUS and forgets their checks. Returns the order IDs changed."""
+    if not order_ids:
+        return []
+    placeholders = ", ".join(["%s"] * len(order_ids))
+    cursor.execute(
+        f"SELECT order_id FROM orders WHERE order_id IN ({placeholders}) AND status = %s FOR UPDATE",
+        (*order_ids, PENDING_STATUS)
+    )
+    closing = [row['order_id'] for row in cursor.fetchall()]
+    if closing:
+        placeholders = ", ".join(["%s"] * len(closing))
+        cursor.execute(
+            f"UPDATE orders SET status = %s WHERE order_id IN ({placeholders})",
+            (FAILED_STATUS, *closing)
+        )
+    forget_checks(cursor, order_ids)
+    return closing
+
+
+def forget_checks(cursor, order_ids):
+    if order_ids:
+        placeholders = ", ".join(["%s"] * len(order_ids))
+        cursor.execute(f"DELETE FROM payment_reconciliation WHERE order_id IN ({placeholders})", tuple(order_ids))
+
+
+def paid_update(checkout_request_id):
+    """The apply_payment_updates() update for a payment the query API confirmed. It has no receipt number."""
+    return {
+        'checkout_request_id': checkout_request_id,
+        'status': "Paid",
+        'mpesa_receipt_number': None,
+        'mpesa_transaction_date': None,
+    }
+
+
+def expire_stale(conn, cursor, oldest, batch_size, query_all):
+    """Settles the pending orders placed before `oldest`, one batch at a time.
+
+    Orders with a CheckoutRequestID are asked about once more through
+    query_all(orders), which returns a query_payment() answer per order; the
+    ones Daraja reports as paid are marked "Paid". All others are marked
+    failed, as no later check will confirm them. Returns (paid, expired) counts.
+    """
+    paid = expired = 0
+    while True:
+        cursor.execute(
+            "SELECT order_id, checkout_request_id FROM orders WHERE status = %s AND order_date < %s "
+            "ORDER BY order_date LIMIT %s",
+            (PENDING_STATUS, oldest, batch_size)
+        )
+        orders = cursor.fetchall()
+        conn.commit()
+        if not orders:
+            return paid, expired
+        sent = [order for order in orders if order['checkout_request_id']]
+        updates = []
+        for order, (outcome, detail) in zip(sent, query_all(sent)):
+            if outcome == "paid":
+                updates.append(paid_update(order['checkout_request_id']))
+            elif outcome == "pending":
+                logger.info(f"Expiring order {order['order_id']} without a final answer from Daraja: {detail}")
+        if updates:
+            paid += apply_payment_updates(updates)[0]
+        # Orders just marked paid are no longer pending, so close_orders() leaves them alone
+        closed = close_orders(cursor, [order['order_id'] for order in orders])
+        conn.commit()
+        publish_order_events([make_event(order_id, FAILED_STATUS) for order_id in closed])
+        expired += len(closed)
+
+
+def reconcile(conn, limiter, batch_size=50, workers=4, min_age=RECONCILE_MIN_AGE_SECONDS,
+              max_age_hours=RECONCILE_MAX_AGE_HOURS):
+    """Settles the pending orders in the age window, then expires the older ones.
+
+    Returns a dict of counts, or None if another reconciler holds the lock.
+    Orders confirmed as paid here have no receipt number, as the query API
+    does not return one; a callback arriving later fills it in (payments.py).
+    """
+    def query_all(orders):
+        return list(executor.map(lambda order: query_payment(limiter, order['checkout_request_id']), orders))
+
+    now = datetime.now()
+    newest = now - timedelta(seconds=min_age)
+    oldest = now - timedelta(hours=max_age_hours)
+    summary = {"parked": 0, "checked": 0, "paid": 0, "failed": 0, "still_pending": 0, "expired": 0}
+
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute("SELECT GET_LOCK(%s, 0) AS acquired", (LOCK_NAME,))
+        if cursor.fetchone()['acquired'] != 1:
+            return None
+        try:
+            # Callbacks that came before their order was linked carry the receipt; apply them first
+            summary["parked"] = apply_parked_updates()
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                after = None
+                while True:
+                    orders = fetch_batch(cursor, oldest, newest, after, batch_size)
+                    conn.commit()  # End the read so the next batch sees fresh rows
+                    if not orders:
+                        break
+                    after = (orders[-1]['order_date'], orders[-1]['order_id'])
+
+                    # Without a CheckoutRequestID no STK push was ever accepted
+                    unsent = [order['order_id'] for order in orders if not order['checkout_request_id']]
+                    sent = [order for order in orders if order['checkout_request_id']]
+                    results = query_all(sent)
+
+                    updates, settled, retry = [], [], []
+                    for order, (outcome, detail) in zip(sent, results):
+                        if outcome == "pending":
+                            delay = min(2 ** order['checks'] * min_age, MAX_BACKOFF_SECONDS)
+                            retry.append((order['order_id'], delay, detail[:255]))
+                            continue
+                        if outcome == "paid":
+                            updates.append(paid_update(order['checkout_request_id']))
+                        else:
+                            updates.append({'checkout_request_id': order['checkout_request_id'], 'status': FAILED_STATUS})
+                        settled.append(order['order_id'])
+                        summary[outcome] += 1
+
+                    # Same bulk UPDATEs and duplicate check as callbacks, in their own transaction
+                    if updates:
+                        apply_payment_updates(updates)
+                    closed = close_orders(cursor, unsent)
+                    forget_checks(cursor, settled)
+                    if retry:
+                        cursor.executemany(
+                            "INSERT INTO payment_reconciliation (order_id, checks, next_check_at, last_result) "
+                            "VALUES (%s, 1, NOW() + INTERVAL %s SECOND, %s) "
+                            "ON DUPLICATE KEY UPDATE checks = checks + 1, "
+                            "next_check_at = VALUES(next_check_at), last_result = VALUES(last_result)",
+                            retry
+                        )
+                    conn.commit()
+                    publish_order_events([make_event(order_id, FAILED_STATUS) for order_id in closed])
+                    summary["checked"] += len(sent)
+                    summary["failed"] += len(closed)
+                    summary["still_pending"] += len(retry)
+
+                paid, summary["expired"] = expire_stale(conn, cursor, oldest, batch_size, query_all)
+                summary["paid"] += paid
+            # Checks of orders a late callback (or an admin) settled in the meantime
+            cursor.execute(
+                "DELETE r FROM payment_reconciliation r JOIN orders o ON o.order_id = r.order_id WHERE o.status <> %s",
+                (PENDING_STATUS,)
+            )
+            cursor.execute("SELECT COUNT(*) AS pending FROM orders WHERE status = %s", (PENDING_STATUS,))
+            summary["backlog"] = cursor.fetchone()['pending']
+            conn.commit()
+            return summary
+        except mysql.connector.Error:
+            conn.rollback()
+            raise
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK(%s)", (LOCK_NAME,))
+            cursor.fetchone()
+    finally:
+        cursor.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Settle orders whose M-Pesa callback never arrived.")
+    parser.add_argument("--loop", type=float, metavar="SECONDS", help="keep reconciling, every SECONDS seconds")
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--workers", type=int, default=4, help="concurrent queries to Daraja (default 4)")
+    args = parser.parse_args()
+    limiter = RateLimiter(DARAJA_QUERY_RATE_LIMIT_PER_MINUTE, per=60.0)
+    while True:
+        try:
+            with db.get_pool().connection() as conn:
+                result = reconcile(conn, limiter, batch_size=args.batch_size, workers=args.workers)
+            if result is None:
+                logger.info("Another reconciler is running; skipped.")
+            else:
+                logger.info(
+                    f"Applied {result['parked']} parked callback(s). "
+                    f"Checked {result['checked']} pending order(s): {result['paid']} paid, {result['failed']} failed, "
+                    f"{result['still_pending']} still pending; expired {result['expired']}. "
+                    f"{result['backlog']} order(s) awaiting payment."
+                )
+        except mysql.connector.Error as err:
+            logger.error(f"Error reconciling pending payments: {err}")
+        if not args.loop:
+            break
+        time.sleep(args.loop)
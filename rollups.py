@@ -0,0 +1,138 @@
+# rollups.py
+# Periodic compactor for the dashboard's sales rollup tables
+# (see migrations/0005_sales_rollups.sql).
+#
+# Each run finds the hours touched by orders created or changed since the last
+# run (via orders.updated_at) and recomputes just those hours in the per-hour,
+# per-meal and per-customer rollups. The first run builds them from scratch.
+# updated_at is stamped when a change is made, not when it commits, so each
+# run also re-reads the OVERLAP_SECONDS before the previous run started, to
+# catch transactions that were still open then.
+#
+#   python rollups.py              # compact once
+#   python rollups.py --loop 60    # compact every 60 seconds
+import argparse
+import logging
+import time
+from datetime import timedelta
+
+import mysql.connector
+
+import db
+
+logger = logging.getLogger(__name__)
+
+LOCK_NAME = "hotel_sales_rollups"
+STATE_NAME = "sales_rollups"
+ROLLUP_TABLES = ("sales_rollup_hourly", "meal_rollup_hourly", "customer_rollup_hourly")
+# Should exceed the longest transaction that writes orders
+OVERLAP_SECONDS = 120
+
+# Truncates orders.order_date to the start of its hour
+HOUR_START = "TIMESTAMP(DATE(o.order_date), MAKETIME(HOUR(o.order_date), 0, 0))"
+
+ROLLUP_INSERTS = {
+    "sales_rollup_hourly": (
+        f"INSERT INTO sales_rollup_hourly (hour_start, status, revenue, order_count) "
+        f"SELECT {HOUR_START}, o.status, SUM(o.total_amount), COUNT(*) "
+        f"FROM orders o {{where}} GROUP BY 1, 2"
+    ),
+    "meal_rollup_hourly": (
+        f"INSERT INTO meal_rollup_hourly (hour_start, meal_id, meal_name, quantity, revenue, order_count) "
+        f"SELECT {HOUR_START}, oi.meal_id, MAX(oi.meal_name), SUM(oi.quantity), "
+        f"SUM(oi.quantity * oi.price_per_item), COUNT(DISTINCT oi.order_id) "
+        f"FROM order_items oi JOIN orders o ON o.order_id = oi.order_id {{where}} GROUP BY 1, 2"
+    ),
+    "customer_rollup_hourly": (
+        f"INSERT INTO customer_rollup_hourly (hour_start, user_email, revenue, order_count) "
+        f"SELECT {HOUR_START}, o.user_email, SUM(o.total_amount), COUNT(*) "
+        f"FROM orders o {{where}} GROUP BY 1, 2"
+    ),
+}
+
+
+def hour_ranges(hours):
+    """Merges sorted hour starts into contiguous [start, end) ranges."""
+    ranges = []
+    for hour in hours:
+        if ranges and ranges[-1][1] == hour:
+            ranges[-1][1] = hour + timedelta(hours=1)
+        else:
+            ranges.append([hour, hour + timedelta(hours=1)])
+    return [tuple(r) for r in ranges]
+
+
+def compact(conn, overlap_seconds=OVERLAP_SECONDS):
+    """Brings the rollup tables up to date. Returns the number of hours recomputed, or None if
+    another compactor holds the lock."""
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT GET_LOCK(%s, 0)", (LOCK_NAME,))
+        if cursor.fetchone()[0] != 1:
+            return None
+        try:
+            # The next run starts from here, minus a margin for changes made
+            # before now that commit after this run has read the orders
+            cursor.execute("SELECT NOW() - INTERVAL %s SECOND", (overlap_seconds,))
+            next_mark = cursor.fetchone()[0]
+            cursor.execute("SELECT high_water_mark FROM rollup_state WHERE name = %s", (STATE_NAME,))
+            row = cursor.fetchone()
+            high_water_mark = row[0] if row else None
+
+            if high_water_mark is None:
+                # First run: rebuild everything
+                for table in ROLLUP_TABLES:
+                    cursor.execute(f"DELETE FROM {table}")
+                for sql in ROLLUP_INSERTS.values():
+                    cursor.execute(sql.format(where=""))
+                cursor.execute("SELECT COUNT(DISTINCT hour_start) FROM sales_rollup_hourly")
+                hours_recomputed = cursor.fetchone()[0]
+            else:
+                cursor.execute(
+                    f"SELECT DISTINCT {HOUR_START} AS hour_start FROM orders o "
+                    f"WHERE o.updated_at >= %s ORDER BY hour_start",
+                    (high_water_mark,)
+                )
+                hours = [r[0] for r in cursor.fetchall()]
+                for start, end in hour_ranges(hours):
+                    for table in ROLLUP_TABLES:
+                        cursor.execute(f"DELETE FROM {table} WHERE hour_start >= %s AND hour_start < %s", (start, end))
+                    for sql in ROLLUP_INSERTS.values():
+                        cursor.execute(sql.format(where="WHERE o.order_date >= %s AND o.order_date < %s"), (start, end))
+                hours_recomputed = len(hours)
+
+            cursor.execute(
+                "INSERT INTO rollup_state (name, high_water_mark) VALUES (%s, %s) "
+                "ON DUPLICATE KEY UPDATE high_water_mark = VALUES(high_water_mark)",
+                (STATE_NAME, next_mark)
+            )
+            conn.commit()
+            return hours_recomputed
+        except mysql.connector.Error:
+            conn.rollback()
+            raise
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK(%s)", (LOCK_NAME,))
+            cursor.fetchone()
+    finally:
+        cursor.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Compact recent order changes into the sales rollup tables.")
+    parser.add_argument("--loop", type=float, metavar="SECONDS", help="keep compacting every SECONDS seconds")
+    args = parser.parse_args()
+    while True:
+        try:
+            with db.get_pool().connection() as conn:
+                hours = compact(conn)
+            if hours is None:
+                logger.info("Another compactor is running; skipped.")
+            else:
+                logger.info(f"Recomputed {hours} hour(s) of rollups.")
+        except mysql.connector.Error as err:
+            logger.error(f"Error compacting rollups: {err}")
+        if not args.loop:
+            break
+        time.sleep(args.loop)
@@ -0,0 +1,59 @@
+# Shared fixtures: a local Daraja stub (daraja_stub.py) served on a free port,
+# with the Daraja HTTP client and token caches pointed at it.
+import threading
+
+import pytest
+from werkzeug.serving import make_server
+
+import daraja_stub
+import http_clients
+import mpesa_auth
+
+
+class DarajaServer:
+    """A daraja_stub app served in a background thread."""
+
+    def __init__(self, **options):
+        self.app = daraja_stub.create_app(**options)
+        self._server = make_server("127.0.0.1", 0, self.app, threaded=True)
+        self.base_url = f"http://127.0.0.1:{self._server.server_port}"
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stats(self):
+        """Returns the stub's call counts per API."""
+        return http_clients.get_client("daraja", self.base_url).get("/stub/stats").json()
+
+    def revoke_tokens(self):
+        http_clients.get_client("daraja", self.base_url).post("/stub/revoke_tokens").raise_for_status()
+
+    def stop(self):
+        self._server.shutdown()
+        self._thread.join()
+
+
+@pytest.fixture
+def start_daraja(monkeypatch):
+    """Returns a function starting a Daraja stub with the given create_app() options.
+
+    The process-wide Daraja client and token caches are swapped for fresh ones
+    pointing at the stub, and put back after the test.
+    """
+    monkeypatch.setenv("CONSUMER_KEY", "test-key")
+    monkeypatch.setenv("CONSUMER_SECRET", "test-secret")
+    monkeypatch.setenv("BUSINESS_SHORTCODE", "174379")
+    monkeypatch.setenv("PASSKEY", "test-passkey")
+    monkeypatch.setenv("CALLBACK_URL", "")  # The stub only sends callbacks when given a URL
+    monkeypatch.setattr(http_clients, "_clients", {})
+    monkeypatch.setattr(mpesa_auth, "_caches", {})
+    servers = []
+
+    def start(**options):
+        server = DarajaServer(**options)
+        monkeypatch.setattr(mpesa_auth, "DARAJA_BASE_URL", server.base_url)
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.stop()
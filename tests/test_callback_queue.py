@@ -0,0 +1,113 @@
+import time
+
+import pytest
+
+from callback_queue import CallbackQueue, QueueWorkerPool
+
+
+class DatabaseDown(Exception):
+    pass
+
+
+@pytest.fixture
+def queue_path(tmp_path):
+    return str(tmp_path / "callback_queue.sqlite3")
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("Timed out waiting for the queue workers")
+        time.sleep(0.01)
+
+
+def test_unacknowledged_item_is_leased_again_after_a_crash(queue_path):
+    queue = CallbackQueue(queue_path, lease_seconds=0.2)
+    item_id = queue.enqueue({"checkout_request_id": "ws_CO_1", "status": "Paid"})
+
+    assert queue.claim(10) == [(item_id, {"checkout_request_id": "ws_CO_1", "status": "Paid"})]
+    # Leased: nobody else gets it while the worker holding it may still ack it
+    assert queue.claim(10) == []
+
+    # The worker dies without acking; another process opens the same file
+    restarted = CallbackQueue(queue_path, lease_seconds=0.2)
+    time.sleep(0.25)
+    assert restarted.claim(10) == [(item_id, {"checkout_request_id": "ws_CO_1", "status": "Paid"})]
+    restarted.ack([item_id])
+    assert restarted.depth() == (0, 0)
+
+
+def test_poison_item_is_dead_lettered_while_the_rest_of_its_batch_applies(queue_path):
+    queue = CallbackQueue(queue_path, max_attempts=2)
+    applied = []
+
+    def handle_batch(payloads):
+        if any(payload["poison"] for payload in payloads):
+            raise ValueError("Malformed update")
+        applied.extend(payload["n"] for payload in payloads)
+
+    for n in range(8):
+        queue.enqueue({"n": n, "poison": n == 5})
+    pool = QueueWorkerPool(queue, handle_batch, workers=1, batch_size=8, poll_interval=0.01, retry_delay=0.01)
+    pool.start()
+    try:
+        wait_for(lambda: queue.depth() == (0, 1))
+    finally:
+        pool.stop()
+
+    assert sorted(applied) == [0, 1, 2, 3, 4, 6, 7]
+    stats = pool.stats()
+    assert stats["processed"] == 7
+    assert stats["failed_items"] == 2  # The poison item, once per attempt
+    assert stats["dead_letters"] == 1
+
+
+def test_transient_error_retries_the_whole_batch(queue_path):
+    queue = CallbackQueue(queue_path)
+    calls = []
+
+    def handle_batch(payloads):
+        calls.append(len(payloads))
+        if len(calls) == 1:
+            raise DatabaseDown("MySQL is down")
+
+    for n in range(4):
+        queue.enqueue({"n": n})
+    pool = QueueWorkerPool(queue, handle_batch, workers=1, batch_size=4, poll_interval=0.01, retry_delay=0.01,
+                           transient_errors=(DatabaseDown,))
+    pool.start()
+    try:
+        wait_for(lambda: queue.depth() == (0, 0))
+    finally:
+        pool.stop()
+
+    # Not bisected: the same four items, retried together
+    assert calls == [4, 4]
+
+
+def test_deferred_items_go_back_to_the_queue(queue_path):
+    queue = CallbackQueue(queue_path)
+    linked = set()
+    seen = []
+
+    def handle_batch(payloads):
+        seen.append([payload["checkout_request_id"] for payload in payloads])
+        # Items whose order is not linked yet are handed back
+        return [i for i, payload in enumerate(payloads) if payload["checkout_request_id"] not in linked]
+
+    queue.enqueue({"checkout_request_id": "ws_CO_linked"})
+    queue.enqueue({"checkout_request_id": "ws_CO_early"})
+    linked.add("ws_CO_linked")
+    pool = QueueWorkerPool(queue, handle_batch, workers=1, batch_size=10, poll_interval=0.01, retry_delay=0.05)
+    pool.start()
+    try:
+        wait_for(lambda: pool.stats()["deferred"] >= 1)
+        linked.add("ws_CO_early")
+        wait_for(lambda: queue.depth() == (0, 0))
+    finally:
+        pool.stop()
+
+    assert seen[0] == ["ws_CO_linked", "ws_CO_early"]
+    assert seen[-1] == ["ws_CO_early"]
+    assert pool.stats()["processed"] == 2
@@ -0,0 +1,113 @@
+import threading
+import time
+
+import pytest
+from flask import request
+
+import mpesa
+import mpesa_auth
+
+
+def stub_token_cache(**options):
+    return mpesa_auth.TokenCache(lambda: mpesa_auth.fetch_access_token("test-key", "test-secret"), **options)
+
+
+@pytest.fixture
+def caches():
+    """Collects the TokenCaches a test creates and stops their background refreshes afterwards."""
+    created = []
+    yield created
+    for cache in created:
+        if cache._timer:
+            cache._timer.cancel()
+
+
+def test_token_is_fetched_once_and_reused(start_daraja, caches):
+    daraja = start_daraja()
+    cache = stub_token_cache()
+    caches.append(cache)
+
+    token = cache.get()
+
+    assert token.startswith("stub-")
+    assert cache.get() == token
+    assert cache.peek() == token
+    assert daraja.stats()["oauth"] == 1
+
+
+def test_expired_token_is_fetched_again(start_daraja, caches):
+    daraja = start_daraja(token_lifetime=1)
+    # No background refresh before expiry: it is only scheduled retry_interval after the fetch
+    cache = stub_token_cache(refresh_margin=0, retry_interval=60)
+    caches.append(cache)
+    first = cache.get()
+
+    time.sleep(1.2)
+
+    assert cache.peek() is None
+    second = cache.get()
+    assert second != first
+    assert daraja.stats()["oauth"] == 2
+
+
+def test_token_is_refreshed_in_background_before_expiry(start_daraja, caches):
+    daraja = start_daraja(token_lifetime=3)
+    # Refreshed 2 seconds before the 3-second token expires
+    cache = stub_token_cache(refresh_margin=2, retry_interval=0.1)
+    caches.append(cache)
+    first = cache.get()
+
+    time.sleep(1.5)
+
+    refreshed = cache.peek()
+    assert refreshed is not None and refreshed != first
+    assert cache.get() == refreshed
+    assert daraja.stats()["oauth"] == 2
+
+
+def test_concurrent_callers_share_one_fetch(start_daraja, caches):
+    daraja = start_daraja()
+
+    @daraja.app.before_request
+    def slow_oauth():
+        if request.path == "/oauth/v1/generate":
+            time.sleep(0.3)  # Keeps the fetch in flight while every caller arrives
+
+    cache = stub_token_cache()
+    caches.append(cache)
+    callers = 16
+    barrier = threading.Barrier(callers)
+    tokens = []
+
+    def call():
+        barrier.wait()
+        tokens.append(cache.get())
+
+    threads = [threading.Thread(target=call) for _ in range(callers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(tokens) == callers
+    assert len(set(tokens)) == 1
+    assert daraja.stats()["oauth"] == 1
+
+
+def test_rejected_token_is_invalidated(start_daraja, caches):
+    daraja = start_daraja()
+    cache = mpesa_auth.get_token_cache("test-key", "test-secret")
+    caches.append(cache)
+
+    assert "CheckoutRequestID" in mpesa.lipa_na_mpesa_online("254700000000", 10, "order-1", "Test")
+    first = cache.peek()
+
+    # Daraja revokes the token before its expiry: the push fails and the token is dropped
+    daraja.revoke_tokens()
+    assert "error" in mpesa.lipa_na_mpesa_online("254700000000", 10, "order-2", "Test")
+    assert cache.peek() is None
+
+    # The next push fetches a fresh token and goes through
+    assert "CheckoutRequestID" in mpesa.lipa_na_mpesa_online("254700000000", 10, "order-3", "Test")
+    assert cache.peek() not in (None, first)
+    assert daraja.stats() == {"oauth": 2, "stk_push": 3, "stk_push_query": 0}
@@ -0,0 +1,129 @@
+import os
+import tempfile
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+# journal_entry exits at import without its Zoho settings; no request reaches Zoho in these tests
+for name in ("ZOHO_CLIENT_ID", "ZOHO_CLIENT_SECRET", "ZOHO_ORGANIZATION_ID", "ZOHO_REFRESH_TOKEN",
+             "ZOHO_ACCOUNTS_PAYABLE_ACCOUNT_ID", "ZOHO_EDMUND_OPIYO_OWNERS_EQUITY_ACCOUNT_ID",
+             "ZOHO_DEFAULT_CURRENCY_ID"):
+    os.environ.setdefault(name, "test")
+os.environ.setdefault("ZOHO_TOKEN_STORE_PATH", os.path.join(tempfile.mkdtemp(), "zoho_tokens.sqlite3"))
+
+import journal_entry  # noqa: E402
+import journal_sync  # noqa: E402
+import outbox_relay  # noqa: E402
+from http_clients import RateLimiter  # noqa: E402
+
+
+@pytest.fixture
+def zoho(monkeypatch):
+    """Records the lookups and posts the relay makes, in order, instead of calling Zoho Books."""
+    calls = []
+    entries = {}  # reference number -> journal ID already in Zoho
+
+    def find_entry(limiter, reference_number):
+        calls.append(("find", reference_number))
+        if entries.get(reference_number) == "unreachable":
+            raise journal_entry.ZohoLookupError("Zoho lookup failed")
+        return entries.get(reference_number)
+
+    def post_entry(limiter, post, order):
+        calls.append(("post", order['order_id']))
+        return f"journal-{order['order_id']}"
+
+    monkeypatch.setattr(journal_sync, "find_entry", find_entry)
+    monkeypatch.setattr(journal_sync, "post_entry", post_entry)
+    return calls, entries
+
+
+def event(order_id, attempts):
+    return {'id': 1, 'event_type': "order_paid", 'attempts': attempts, 'order_id': order_id,
+            'user_email': "customer@example.com", 'total_amount': Decimal("650.00"),
+            'mpesa_receipt_number': "RCPT0001", 'order_date': datetime(2026, 1, 1, 12, 0)}
+
+
+@pytest.fixture
+def limiter():
+    return RateLimiter(1000, per=60.0)
+
+
+def test_first_attempt_posts_without_lookup(zoho, limiter):
+    calls, _ = zoho
+    assert outbox_relay.post_event(limiter, event("order-1", 0)) == "journal-order-1"
+    assert calls == [("post", "order-1")]
+
+
+def test_retried_event_is_looked_up_before_it_is_posted(zoho, limiter):
+    calls, _ = zoho
+    reference = journal_entry.sales_reference_number("order-1")
+
+    assert outbox_relay.post_event(limiter, event("order-1", 1)) == "journal-order-1"
+    assert calls == [("find", reference), ("post", "order-1")]
+
+
+def test_retried_event_already_in_zoho_is_not_posted_again(zoho, limiter):
+    calls, entries = zoho
+    reference = journal_entry.sales_reference_number("order-1")
+    entries[reference] = "journal-earlier"
+
+    assert outbox_relay.post_event(limiter, event("order-1", 2)) == "journal-earlier"
+    assert calls == [("find", reference)]
+
+
+def test_retried_event_is_not_posted_while_the_lookup_fails(zoho, limiter):
+    calls, entries = zoho
+    entries[journal_entry.sales_reference_number("order-1")] = "unreachable"
+
+    assert outbox_relay.post_event(limiter, event("order-1", 1)) is None
+    assert [call for call in calls if call[0] == "post"] == []
+
+
+class FakeOutbox:
+    """Just enough of a MySQL connection and dict cursor for drain(), recording its statements."""
+
+    def __init__(self, events):
+        self.events = events
+        self.log = []
+        self._rows = []
+
+    def cursor(self, dictionary=False):
+        return self
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+    def execute(self, sql, params=()):
+        self.log.append(sql.split(" SET ")[0] if sql.startswith("UPDATE") else sql.split(" ")[0])
+        if "GET_LOCK" in sql:
+            self._rows = [{'acquired': 1}]
+        elif sql.startswith("SELECT ob.id"):
+            self._rows, self.events = self.events, []
+        elif sql.startswith("UPDATE accounting_outbox SET attempts"):
+            self.log[-1] = "count attempt"
+        else:
+            self._rows = [{}]
+
+    def executemany(self, sql, rows):
+        self.log.append("mark processed" if "processed_at" in sql else "reschedule")
+
+    def fetchall(self):
+        return self._rows
+
+    def fetchone(self):
+        return self._rows[0]
+
+
+def test_drain_counts_the_attempt_before_posting(zoho, limiter, monkeypatch):
+    calls, _ = zoho
+    outbox = FakeOutbox([event("order-1", 0)])
+    monkeypatch.setattr(journal_sync, "post_entry",
+                        lambda limiter, post, order: outbox.log.append("post") or "journal-1")
+
+    assert outbox_relay.drain(outbox, limiter) == (1, 0)
+    assert outbox.log.index("count attempt") < outbox.log.index("post") < outbox.log.index("mark processed")
@@ -0,0 +1,228 @@
+import threading
+import time
+from contextlib import contextmanager
+
+import pytest
+from werkzeug.serving import make_server
+
+import db
+import mpesa
+import mpesa_auth
+import mpesa_callback_handler
+import payments
+from idempotency import CallbackDeduplicator
+
+
+class FakePaymentsDB:
+    """Just enough of MySQL for apply_payment_updates() and apply_parked_updates()."""
+
+    def __init__(self):
+        self.orders = {}  # order_id -> row
+        self.seen = {}  # checkout_request_id -> (receipt, status)
+        self.unmatched = {}  # checkout_request_id -> parked update
+        self.outbox = []
+        self.order_updates = 0
+        self.lock = threading.Lock()
+
+    def add_order(self, order_id, checkout_request_id=None):
+        self.orders[order_id] = {'order_id': order_id, 'checkout_request_id': checkout_request_id,
+                                 'status': "Pending Payment Confirmation",
+                                 'mpesa_receipt_number': None, 'mpesa_transaction_date': None}
+
+    def by_checkout(self, checkout_request_id):
+        return next((o for o in self.orders.values() if o['checkout_request_id'] == checkout_request_id), None)
+
+    # Connection
+    def cursor(self, dictionary=False):
+        return FakeCursor(self, dictionary)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+    @contextmanager
+    def connection(self):
+        yield self
+
+
+class FakeCursor:
+    def __init__(self, db, dictionary):
+        self.db = db
+        self.dictionary = dictionary
+        self.rows = []
+
+    def execute(self, sql, params=()):
+        db, params = self.db, list(params)
+        with db.lock:
+            if sql.startswith("SELECT checkout_request_id, mpesa_receipt_number, status FROM mpesa_callbacks_seen"):
+                self.rows = [(c, receipt, status) for c, (receipt, status) in db.seen.items()
+                             if c in params or (receipt and receipt in params)]
+            elif sql.startswith("SELECT checkout_request_id, order_id FROM orders"):
+                self.rows = [(o['checkout_request_id'], o['order_id']) for o in db.orders.values()
+                             if o['checkout_request_id'] in params]
+            elif sql.startswith("UPDATE orders SET status = 'Paid'"):
+                n = len(params) // 5
+                for i, checkout_request_id in enumerate(params[-n:]):
+                    db.by_checkout(checkout_request_id).update(
+                        status="Paid", mpesa_receipt_number=params[2 * i + 1],
+                        mpesa_transaction_date=params[2 * n + 2 * i + 1])
+                db.order_updates += 1
+            elif sql.startswith("INSERT INTO accounting_outbox"):
+                db.outbox += [db.by_checkout(c)['order_id'] for c in params]
+            elif sql.startswith("UPDATE orders SET status = %s WHERE checkout_request_id IN"):
+                for checkout_request_id in params[1:]:
+                    db.by_checkout(checkout_request_id)['status'] = params[0]
+                db.order_updates += 1
+            elif sql.startswith("SELECT u.checkout_request_id"):
+                self.rows = [dict(u) for c, u in db.unmatched.items()
+                             if db.by_checkout(c) and (not params or c in params)]
+            elif sql.startswith("DELETE FROM mpesa_unmatched_callbacks"):
+                for checkout_request_id in params:
+                    db.unmatched.pop(checkout_request_id, None)
+            else:
+                raise AssertionError(f"Unexpected SQL: {sql}")
+
+    def executemany(self, sql, rows):
+        db = self.db
+        with db.lock:
+            for row in rows:
+                if sql.startswith("INSERT INTO mpesa_callbacks_seen"):
+                    assert row[0] not in db.seen, "claimed twice"
+                    db.seen[row[0]] = (row[1], row[2])
+                elif sql.startswith("INSERT INTO mpesa_unmatched_callbacks"):
+                    db.unmatched[row[0]] = dict(zip(
+                        ('checkout_request_id', 'status', 'mpesa_receipt_number', 'mpesa_transaction_date'), row))
+                elif sql.startswith("UPDATE mpesa_callbacks_seen SET mpesa_receipt_number"):
+                    receipt, checkout_request_id = row
+                    if db.seen[checkout_request_id][0] is None:
+                        db.seen[checkout_request_id] = (receipt, db.seen[checkout_request_id][1])
+                elif sql.startswith("UPDATE orders SET mpesa_receipt_number"):
+                    order = db.by_checkout(row[2])
+                    if order['mpesa_receipt_number'] is None:
+                        order.update(mpesa_receipt_number=row[0], mpesa_transaction_date=row[1])
+                else:
+                    raise AssertionError(f"Unexpected SQL: {sql}")
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    fake = FakePaymentsDB()
+    deduplicator = CallbackDeduplicator()
+    monkeypatch.setattr(db, "get_connection", lambda *args, **kwargs: fake)
+    monkeypatch.setattr(db, "get_pool", lambda: fake)
+    monkeypatch.setattr(payments, "deduplicator", deduplicator)
+    monkeypatch.setattr(mpesa_callback_handler, "deduplicator", deduplicator)
+    monkeypatch.setattr(payments, "publish_order_events", lambda events: None)
+    return fake
+
+
+def stk_callback(checkout_request_id, receipt="RCPT0001"):
+    return {"Body": {"stkCallback": {
+        "MerchantRequestID": "m-1", "CheckoutRequestID": checkout_request_id,
+        "ResultCode": 0, "ResultDesc": "The service request is processed successfully.",
+        "CallbackMetadata": {"Item": [
+            {"Name": "Amount", "Value": 650},
+            {"Name": "MpesaReceiptNumber", "Value": receipt},
+            {"Name": "TransactionDate", "Value": 20260101120000},
+            {"Name": "PhoneNumber", "Value": 254700000000},
+        ]},
+    }}}
+
+
+def test_duplicate_callback_is_skipped(fake_db, monkeypatch):
+    fake_db.add_order("order-1", "ws_CO_1")
+    client = mpesa_callback_handler.app.test_client()
+
+    first = client.post("/mpesa_callback", json=stk_callback("ws_CO_1"))
+    assert first.get_json()["ResultDesc"] == "Callback processed successfully"
+    assert fake_db.orders["order-1"]['status'] == "Paid"
+    assert fake_db.orders["order-1"]['mpesa_receipt_number'] == "RCPT0001"
+    assert fake_db.outbox == ["order-1"]
+
+    # Daraja's retry is caught by the in-memory LRU
+    retry = client.post("/mpesa_callback", json=stk_callback("ws_CO_1"))
+    assert retry.get_json()["ResultDesc"] == "Callback already processed"
+
+    # After a restart (empty LRU) the seen table catches it
+    fresh = CallbackDeduplicator()
+    monkeypatch.setattr(payments, "deduplicator", fresh)
+    monkeypatch.setattr(mpesa_callback_handler, "deduplicator", fresh)
+    assert client.post("/mpesa_callback", json=stk_callback("ws_CO_1")).status_code == 200
+    assert fake_db.order_updates == 1
+    assert fake_db.outbox == ["order-1"]
+    assert fresh.stats()["duplicates_in_db"] == 1
+
+
+def test_callback_before_the_order_is_linked_is_parked_then_applied(fake_db):
+    fake_db.add_order("order-1")
+    client = mpesa_callback_handler.app.test_client()
+
+    assert client.post("/mpesa_callback", json=stk_callback("ws_CO_early")).status_code == 200
+    assert fake_db.orders["order-1"]['status'] == "Pending Payment Confirmation"
+    assert "ws_CO_early" in fake_db.unmatched
+    assert "ws_CO_early" not in fake_db.seen
+
+    # The STK push returns and the order is linked (hotel_db.record_payment_request, api_server)
+    fake_db.orders["order-1"]['checkout_request_id'] = "ws_CO_early"
+    assert payments.apply_parked_updates(["ws_CO_early"]) == 1
+
+    assert fake_db.orders["order-1"]['status'] == "Paid"
+    assert fake_db.orders["order-1"]['mpesa_receipt_number'] == "RCPT0001"
+    assert fake_db.unmatched == {}
+
+
+def test_queue_worker_defers_callbacks_for_unlinked_orders(fake_db):
+    fake_db.add_order("order-1", "ws_CO_1")
+    payloads = [
+        {'checkout_request_id': "ws_CO_1", 'status': "Paid", 'mpesa_receipt_number': "R1",
+         'mpesa_transaction_date': "2026-01-01T12:00:00"},
+        {'checkout_request_id': "ws_CO_unlinked", 'status': "Payment Failed"},
+    ]
+
+    assert mpesa_callback_handler.process_queued_updates(payloads) == [1]
+    assert fake_db.orders["order-1"]['status'] == "Paid"
+    # Left to the queue's retry, not parked
+    assert fake_db.unmatched == {}
+
+
+@pytest.fixture
+def callback_server():
+    """Serves the callback handler on a free port; yields its /mpesa_callback URL."""
+    server = make_server("127.0.0.1", 0, mpesa_callback_handler.app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}/mpesa_callback"
+    server.shutdown()
+    thread.join()
+
+
+def test_stub_callback_marks_the_order_paid(start_daraja, fake_db, callback_server, monkeypatch):
+    start_daraja(processing_seconds=0.1, paid_ratio=1.0)
+    monkeypatch.setenv("CALLBACK_URL", callback_server)
+    fake_db.add_order("order-1")
+    try:
+        response = mpesa.lipa_na_mpesa_online("254700000000", 650, "ORDER-1", "Test")
+        fake_db.orders["order-1"]['checkout_request_id'] = response["CheckoutRequestID"]
+        payments.apply_parked_updates([response["CheckoutRequestID"]])
+
+        deadline = time.monotonic() + 5
+        while fake_db.orders["order-1"]['status'] != "Paid" and time.monotonic() < deadline:
+            time.sleep(0.02)
+    finally:
+        for cache in mpesa_auth._caches.values():
+            if cache._timer:
+                cache._timer.cancel()
+
+    assert fake_db.orders["order-1"]['status'] == "Paid"
+    assert fake_db.orders["order-1"]['mpesa_receipt_number'].startswith("STUB")
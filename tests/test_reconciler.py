@@ -0,0 +1,146 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import pytest
+
+import mpesa
+import mpesa_auth
+import reconciler
+from http_clients import RateLimiter
+from idempotency import CallbackDeduplicator
+
+
+@pytest.fixture
+def limiter():
+    return RateLimiter(1000, per=60.0)
+
+
+@pytest.fixture(autouse=True)
+def stop_token_refreshes():
+    """Stops the background refreshes of the token caches a test created."""
+    yield
+    for cache in mpesa_auth._caches.values():
+        if cache._timer:
+            cache._timer.cancel()
+
+
+class FakeOrders:
+    """Just enough of a MySQL connection and dict cursor for expire_stale() and close_orders()."""
+
+    def __init__(self, orders):
+        self.orders = {order['order_id']: dict(order, status=reconciler.PENDING_STATUS) for order in orders}
+        self._rows = []
+
+    # Connection
+    def commit(self):
+        pass
+
+    # Cursor
+    def execute(self, sql, params=()):
+        if sql.startswith("SELECT order_id, checkout_request_id FROM orders"):
+            status, oldest, limit = params
+            pending = [o for o in self.orders.values() if o['status'] == status and o['order_date'] < oldest]
+            self._rows = [{'order_id': o['order_id'], 'checkout_request_id': o['checkout_request_id']}
+                          for o in sorted(pending, key=lambda o: o['order_date'])[:limit]]
+        elif sql.startswith("SELECT order_id FROM orders WHERE order_id IN"):
+            *order_ids, status = params
+            self._rows = [{'order_id': i} for i in order_ids if self.orders[i]['status'] == status]
+        elif sql.startswith("UPDATE orders SET status"):
+            status, *order_ids = params
+            for order_id in order_ids:
+                self.orders[order_id]['status'] = status
+        elif not sql.startswith("DELETE FROM payment_reconciliation"):
+            raise AssertionError(f"Unexpected SQL: {sql}")
+
+    def fetchall(self):
+        return self._rows
+
+    def apply_payment_updates(self, updates):
+        by_checkout = {o['checkout_request_id']: o for o in self.orders.values()}
+        for update in updates:
+            by_checkout[update['checkout_request_id']]['status'] = update['status']
+        return len(updates), []
+
+
+def test_query_reports_processing_payment_as_pending(start_daraja, limiter):
+    start_daraja(processing_seconds=60)
+    checkout_request_id = mpesa.lipa_na_mpesa_online("254700000000", 10, "order-1", "Test")["CheckoutRequestID"]
+
+    assert reconciler.query_payment(limiter, checkout_request_id) == ("pending", "Still being processed")
+
+
+def test_query_reports_paid_payment(start_daraja, limiter):
+    start_daraja(processing_seconds=0, paid_ratio=1.0)
+    assert reconciler.query_payment(limiter, "ws_CO_paid")[0] == "paid"
+
+
+def test_query_reports_cancelled_payment_as_failed(start_daraja, limiter):
+    start_daraja(processing_seconds=0, paid_ratio=0.0)
+    outcome, detail = reconciler.query_payment(limiter, "ws_CO_cancelled")
+
+    assert outcome == "failed"
+    assert detail.startswith("1032:")
+
+
+def test_query_drops_rejected_token(start_daraja, limiter):
+    daraja = start_daraja(processing_seconds=0, paid_ratio=1.0)
+    assert reconciler.query_payment(limiter, "ws_CO_1")[0] == "paid"
+
+    daraja.revoke_tokens()
+    assert reconciler.query_payment(limiter, "ws_CO_2") == ("pending", "Access token rejected")
+
+    # The next query fetches a fresh token
+    assert reconciler.query_payment(limiter, "ws_CO_3")[0] == "paid"
+    assert daraja.stats() == {"oauth": 2, "stk_push": 0, "stk_push_query": 3}
+
+
+@pytest.mark.parametrize("paid_ratio, status", [(1.0, "Paid"), (0.0, reconciler.FAILED_STATUS)])
+def test_expired_orders_are_queried_once_before_failing(start_daraja, limiter, monkeypatch, paid_ratio, status):
+    daraja = start_daraja(processing_seconds=0, paid_ratio=paid_ratio)
+    old = datetime.now() - timedelta(days=2)
+    db = FakeOrders([
+        {'order_id': "sent", 'checkout_request_id': "ws_CO_old", 'order_date': old},
+        {'order_id': "unsent", 'checkout_request_id': None, 'order_date': old},
+    ])
+    monkeypatch.setattr(reconciler, "apply_payment_updates", db.apply_payment_updates)
+    monkeypatch.setattr(reconciler, "publish_order_events", lambda events: None)
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        def query_all(orders):
+            return list(executor.map(lambda o: reconciler.query_payment(limiter, o['checkout_request_id']), orders))
+
+        paid, expired = reconciler.expire_stale(db, db, datetime.now() - timedelta(days=1), 10, query_all)
+
+    assert db.orders["sent"]['status'] == status
+    assert db.orders["unsent"]['status'] == reconciler.FAILED_STATUS
+    assert (paid, expired) == ((1, 1) if status == "Paid" else (0, 2))
+    assert daraja.stats()["stk_push_query"] == 1
+
+
+class SeenCursor:
+    """A cursor whose SELECT returns the given mpesa_callbacks_seen rows."""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def execute(self, sql, params=()):
+        pass
+
+    def fetchall(self):
+        return self.rows
+
+
+def test_callback_fills_in_receipt_of_reconciled_payment():
+    deduplicator = CallbackDeduplicator()
+    callback = {'checkout_request_id': "ws_CO_1", 'status': "Paid",
+                'mpesa_receipt_number': "RCPT1", 'mpesa_transaction_date': datetime.now()}
+
+    # Confirmed by the reconciler: seen as paid, without a receipt
+    deduplicator.remember([reconciler.paid_update("ws_CO_1")])
+    assert not deduplicator.seen_recently(callback)
+    assert deduplicator.filter_new(SeenCursor([("ws_CO_1", None, "Paid")]), [callback]) == ([], [callback])
+
+    # Once the receipt is recorded, a retry of the callback is a duplicate
+    assert deduplicator.filter_new(SeenCursor([("ws_CO_1", "RCPT1", "Paid")]), [callback]) == ([], [])
+    failed = {'checkout_request_id': "ws_CO_1", 'status': "Payment Failed"}
+    assert deduplicator.filter_new(SeenCursor([("ws_CO_1", None, "Paid")]), [failed]) == ([], [])
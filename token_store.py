@@ -0,0 +1,88 @@
+# token_store.py
+# OAuth access tokens persisted in a local SQLite file, shared by every
+# process on the machine (the journal scripts, batch sync workers, ...).
+#
+# A token is reused until it is close to expiry, so posting many journal
+# entries costs one call to the token endpoint per hour instead of one per
+# entry. Refreshes are serialized across processes with SQLite's write lock:
+# whoever gets it first refreshes, the others wait and then read the new token.
+import sqlite3
+import threading
+import time
+
+
+class TokenStore:
+    """Access tokens keyed by name, with their expiry, in a SQLite file.
+
+    `refresh` callables passed to get()/invalidate() must return
+    (access_token, expires_in_seconds), or (None, None) if the refresh failed.
+    Tokens are refreshed once they are within `refresh_margin` seconds of expiry.
+    """
+
+    def __init__(self, path, refresh_margin=300):
+        self.path = path
+        self.refresh_margin = refresh_margin
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS tokens ("
+            " name TEXT PRIMARY KEY,"
+            " access_token TEXT NOT NULL,"
+            " expires_at REAL NOT NULL,"
+            " refreshed_at REAL NOT NULL)"
+        )
+
+    def _conn(self):
+        """Returns this thread's SQLite connection."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # The timeout covers waiting for another process's refresh
+            conn = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+            self._local.conn = conn
+        return conn
+
+    def _read(self, conn, name):
+        row = conn.execute("SELECT access_token, expires_at FROM tokens WHERE name = ?", (name,)).fetchone()
+        return row if row else (None, 0.0)
+
+    def _fresh(self, expires_at):
+        return time.time() < expires_at - self.refresh_margin
+
+    def get(self, name, refresh):
+        """Returns the stored token for `name`, refreshing it first if it is missing or near expiry.
+
+        Returns None if a refresh was needed and failed.
+        """
+        token, expires_at = self._read(self._conn(), name)
+        if token and self._fresh(expires_at):
+            return token
+        return self._refresh(name, refresh, lambda current, expiry: not (current and self._fresh(expiry)))
+
+    def invalidate(self, name, stale_token, refresh):
+        """Replaces `stale_token` after the API rejected it (HTTP 401). Returns the new token or None.
+
+        If another thread or process already replaced it, that token is returned
+        without refreshing again.
+        """
+        return self._refresh(name, refresh, lambda current, expiry: current is None or current == stale_token)
+
+    def _refresh(self, name, refresh, needs_refresh):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")  # Take the write lock: one refresher at a time
+        try:
+            token, expires_at = self._read(conn, name)
+            if needs_refresh(token, expires_at):
+                token, expires_in = refresh()
+                if token:
+                    now = time.time()
+                    conn.execute(
+                        "INSERT OR REPLACE INTO tokens (name, access_token, expires_at, refreshed_at) "
+                        "VALUES (?, ?, ?, ?)",
+                        (name, token, now + float(expires_in or 0), now)
+                    )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return token